@@ -1,5 +1,6 @@
-from flask import Flask
+from flask import Flask, g, request
 from logging.config import dictConfig
+import time
 
 # Configure logging
 dictConfig({
@@ -39,6 +40,8 @@ def create_app():
     )
 
     # Register blueprints
+    from app.metrics import REQUEST_SECONDS
+    from app.profiler import profiler
     from app.routes import main_bp
     app.register_blueprint(main_bp)
 
@@ -59,12 +62,31 @@ def create_app():
             'message': 'An unexpected error occurred. Please try again later.'
         }), 500
 
+    @app.before_request
+    def before_request():
+        """Start timing (and, when enabled, profiling) the request."""
+        g.request_start = time.perf_counter()
+        g.profile = profiler.start() if profiler is not None else None
+
     @app.after_request
     def after_request(response):
         """Add security headers to response."""
         response.headers["X-Frame-Options"] = "SAMEORIGIN"
         response.headers["X-Content-Type-Options"] = "nosniff"
         response.headers["X-XSS-Protection"] = "1; mode=block"
+
+        # Record the latency once the body is sent, so streamed responses count in full
+        if 'request_start' in g:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            labels = (route, request.method, str(response.status_code))
+            start, profile = g.request_start, g.profile
+
+            def request_finished():
+                REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
+                if profile is not None:
+                    profiler.finish(f"{labels[1]} {labels[0]}", profile)
+
+            response.call_on_close(request_finished)
         return response
 
     return app
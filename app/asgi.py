@@ -0,0 +1,255 @@
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.chatbot import preload, process_question, stream_question
+from app.metrics import REQUEST_SECONDS
+from app.profiler import profile_request
+from app.refresh import start_scheduler
+from app.routes import question_from_json, readiness, sse_event
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted, matching the Flask MAX_CONTENT_LENGTH
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+ERROR_MESSAGE = 'An error occurred while processing your request'
+
+# The security headers create_app adds to every Flask response
+SECURITY_HEADERS = [
+    (b'x-frame-options', b'SAMEORIGIN'),
+    (b'x-content-type-options', b'nosniff'),
+    (b'x-xss-protection', b'1; mode=block')
+]
+
+
+class AsyncChatApp:
+    """
+    ASGI application for high-concurrency deployments.
+
+    The chat, streaming, health and readiness endpoints are served natively:
+    connections wait on the event loop and only the blocking search runs on a
+    bounded thread pool, so idle keep-alive connections and open SSE streams
+    do not hold a thread each. Every other request (the page, static files,
+    batches) is handed to the Flask application on the same pool.
+
+    The index is built in the background at startup, so the server accepts
+    connections at once and /api/ready answers 503 until the index is loaded.
+    The documentation refresh scheduler is started too when configured.
+
+    Native endpoints record the same request latency metric as the Flask
+    application; the slow request profiler covers the blocking part of
+    /api/chat.
+    """
+
+    def __init__(self, wsgi_app, max_threads=8):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='cdp-asgi')
+        self.routes = {
+            ('GET', '/api/health'): self.health,
+            ('GET', '/api/ready'): self.ready,
+            ('POST', '/api/chat'): self.chat,
+            ('POST', '/api/chat/stream'): self.chat_stream
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            handler = self.routes.get((scope['method'], scope['path']))
+            if handler is None:
+                # Timed by the Flask application itself
+                await self.call_wsgi(scope, receive, send)
+            else:
+                await self.timed(handler, scope, receive, send)
+
+    @staticmethod
+    async def timed(handler, scope, receive, send):
+        """Serve a native endpoint, recording its latency and status."""
+        status = []
+
+        async def send_status(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await handler(scope, receive, send_status)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope['path'], scope['method'],
+                                    str(status[0] if status else 500))
+
+    async def run_blocking(self, func, *args):
+        """Run ``func(*args)`` on the thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                asyncio.get_running_loop().run_in_executor(self.executor, preload).add_done_callback(
+                    self._preload_done)
+                start_scheduler()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _preload_done(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Error loading the index: {str(future.exception())}")
+
+    @staticmethod
+    async def read_body(receive):
+        """Return the request body, or None when it exceeds MAX_BODY_BYTES."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_BYTES:
+                return None
+            if not message.get('more_body'):
+                return bytes(body)
+
+    async def read_question(self, receive):
+        """Return (question, None) for a valid chat request, else (None, error message)."""
+        body = await self.read_body(receive)
+        if body is None:
+            return None, 'Request body too large'
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None, 'Invalid JSON body'
+        try:
+            return question_from_json(data), None
+        except ValueError as e:
+            return None, str(e)
+
+    @staticmethod
+    async def send_json(send, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode('latin-1'))] + SECURITY_HEADERS
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def health(self, scope, receive, send):
+        await self.send_json(send, {'status': 'healthy', 'service': 'cdp-chatbot'})
+
+    async def ready(self, scope, receive, send):
+        # Cheap and non-blocking; on the pool it would queue behind the index build
+        payload, status = readiness()
+        await self.send_json(send, payload, status)
+
+    async def chat(self, scope, receive, send):
+        question, error = await self.read_question(receive)
+        if error:
+            await self.send_json(send, {'error': error}, 400)
+            return
+
+        try:
+            response = await self.run_blocking(self._profiled, 'POST /api/chat', process_question, question)
+        except Exception as e:
+            logger.error(f"Error processing chat request: {str(e)}")
+            await self.send_json(send, {'error': ERROR_MESSAGE}, 500)
+            return
+        await self.send_json(send, {'success': True, 'response': response})
+
+    @staticmethod
+    def _profiled(name, func, *args):
+        with profile_request(name):
+            return func(*args)
+
+    async def chat_stream(self, scope, receive, send):
+        question, error = await self.read_question(receive)
+        if error:
+            await self.send_json(send, {'error': error}, 400)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                        (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no')] + SECURITY_HEADERS
+        })
+        try:
+            # Each chunk is produced on the pool and sent as soon as it is ready
+            chunks = await self.run_blocking(stream_question, question)
+            while True:
+                chunk = await self.run_blocking(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': sse_event({'chunk': chunk}).encode('utf-8'),
+                            'more_body': True})
+            event = sse_event({'success': True}, event='done')
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            event = sse_event({'error': ERROR_MESSAGE}, event='error')
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8')})
+
+    async def call_wsgi(self, scope, receive, send):
+        """Serve the request with the Flask application on the thread pool."""
+        body = await self.read_body(receive)
+        if body is None:
+            await self.send_json(send, {'error': 'Request body too large'}, 413)
+            return
+
+        status, headers, content = await self.run_blocking(self._run_wsgi, scope, body)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    def _run_wsgi(self, scope, body):
+        """Call the WSGI application for ``scope`` and return (status, headers, body)."""
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
@@ -1,58 +1,62 @@
 from app.indexer import DocumentIndexer
+from app.intent import IntentAnalyzer
+from app.metrics import CHAT_STAGE_SECONDS, ERRORS, REGISTRY
+from app.registry import load_registry
+from app.response_cache import ResponseCache, SQLiteCacheBackend
+from app.scoring import create_scoring
+from app.shards import ShardPool
+from app.tokenizer import create_tokenizer
 import logging
+import os
 import re
+import threading
 
 logger = logging.getLogger(__name__)
 
+ERROR_RESPONSE = "I encountered an error while processing your question. Please try again."
+
 class CDPChatbot:
-    def __init__(self):
-        self.indexer = DocumentIndexer()
-        self.cdps = {
-            'segment': ['segment', 'segment.com'],
-            'mparticle': ['mparticle', 'mparticle.com'],
-            'lytics': ['lytics', 'lytics.com'],
-            'zeotap': ['zeotap', 'zeotap.com']
-        }
-        
+    def __init__(self, indexer=None):
+        # Platforms from the registry (data/cdps.json or CDP_REGISTRY), see app.registry
+        self.platforms = load_registry()
+        # Index over data/docs configured from the environment, unless one is given
+        self.indexer = indexer or DocumentIndexer(scoring=self._create_scoring(), tokenizer=self._create_tokenizer(),
+                                                  shards=self._create_shards(), precision=self._index_precision(),
+                                                  cdps=[platform.name for platform in self.platforms],
+                                                  section_cache_bytes=self._section_cache_bytes())
+        self.response_cache = self._create_response_cache()
+        self.cdps = {platform.name: platform.keywords for platform in self.platforms}
+        # Names shown in responses, e.g. 'mParticle' for 'mparticle'
+        self.titles = {platform.name: platform.title for platform in self.platforms}
+        self.intents = IntentAnalyzer(self.cdps)
+
+    @CHAT_STAGE_SECONDS.timed('intent')
+    def analyze_question(self, question):
+        """
+        Detect the mentioned CDPs and the kind of question in a single scan.
+        """
+        return self.intents.analyze(question)
+
     def detect_cdps(self, question):
         """
         Detect which CDP(s) are mentioned in the question.
         Returns a list of CDP names found in the question.
         """
-        question = question.lower()
-        mentioned_cdps = []
-        
-        for cdp, keywords in self.cdps.items():
-            if any(keyword in question for keyword in keywords):
-                mentioned_cdps.append(cdp)
-                
-        return mentioned_cdps or list(self.cdps.keys())  # If no CDP mentioned, search all
+        return self.analyze_question(question).cdps or list(self.cdps.keys())  # If no CDP mentioned, search all
 
     def is_comparison_question(self, question):
         """
         Determine if the question is asking for a comparison between CDPs.
         """
-        question = question.lower()
-        comparison_keywords = ['compare', 'comparison', 'versus', 'vs', 'difference', 'better', 'between']
-        return any(keyword in question for keyword in comparison_keywords)
+        return self.analyze_question(question).is_comparison
 
     def is_how_to_question(self, question):
         """
         Determine if the question is a how-to question.
         """
-        question = question.lower()
-        how_to_patterns = [
-            r'^how (do|can|to|would|should) (i|you|we)',
-            r'^what( is|\'s) the (best way|way) to',
-            r'^what are the steps to',
-            r'steps (for|to)',
-            r'guide (for|to)',
-            r'tutorial (for|on)',
-            r'process (of|for)',
-            r'procedure (for|to)'
-        ]
-        return any(re.search(pattern, question) for pattern in how_to_patterns)
+        return self.analyze_question(question).is_how_to
 
+    @CHAT_STAGE_SECONDS.timed('format')
     def format_comparison_response(self, question, responses):
         """
         Format a response for comparison questions.
@@ -62,7 +66,7 @@ class CDPChatbot:
 
         comparison = "Here's how different CDPs handle this:\n\n"
         for cdp, response in responses.items():
-            comparison += f"{cdp.capitalize()}:\n{response}\n\n"
+            comparison += f"{self.titles[cdp]}:\n{response}\n\n"
         
         return comparison.strip()
 
@@ -81,28 +85,60 @@ class CDPChatbot:
             return formatted_response
         return response
 
+    @CHAT_STAGE_SECONDS.timed('format')
+    def format_passage(self, passage):
+        """
+        Format a search result as its section title followed by the snippet.
+        """
+        return f"{passage['title']}\n{passage['snippet']}" if passage['title'] else passage['snippet']
+
+    @CHAT_STAGE_SECONDS.timed('format')
+    def format_single_cdp_response(self, cdp, relevant_docs):
+        """
+        Format the search results of a question about a single CDP.
+        """
+        if relevant_docs:
+            passage = relevant_docs[0]
+            response = self.format_how_to_response(passage['snippet'])
+            if passage['title']:
+                response = f"{passage['title']}\n\n{response}"
+            return f"Here's how to do this in {self.titles[cdp]}:\n\n{response}"
+        return f"I couldn't find specific instructions for this in {self.titles[cdp]}'s documentation."
+
     def handle_comparison_question(self, question, cdps):
         """
         Handle questions that compare multiple CDPs.
         """
         responses = {}
-        for cdp in cdps:
-            relevant_docs = self.indexer.search(question, cdp)
+        for cdp, relevant_docs in self.indexer.search_many(question, cdps, snippets=True).items():
             if relevant_docs:
-                responses[cdp] = relevant_docs[0]
+                responses[cdp] = self.format_passage(relevant_docs[0])
 
         return self.format_comparison_response(question, responses)
 
+    def stream_comparison_question(self, question, cdps):
+        """
+        Yield a comparison response one CDP at a time, as soon as each CDP's
+        search completes. The joined chunks equal handle_comparison_question.
+        """
+        found = False
+        for cdp in cdps:
+            relevant_docs = self.indexer.search(question, cdp, snippets=True)
+            if relevant_docs:
+                prefix = "\n\n" if found else "Here's how different CDPs handle this:\n\n"
+                yield f"{prefix}{self.titles[cdp]}:\n{self.format_passage(relevant_docs[0])}"
+                found = True
+
+        if not found:
+            yield self.format_comparison_response(question, {})
+
     def handle_how_to_question(self, question, cdps):
         """
         Handle how-to questions for specific CDPs.
         """
         if len(cdps) == 1:
-            relevant_docs = self.indexer.search(question, cdps[0])
-            if relevant_docs:
-                response = self.format_how_to_response(relevant_docs[0])
-                return f"Here's how to do this in {cdps[0].capitalize()}:\n\n{response}"
-            return f"I couldn't find specific instructions for this in {cdps[0].capitalize()}'s documentation."
+            relevant_docs = self.indexer.search(question, cdps[0], snippets=True)
+            return self.format_single_cdp_response(cdps[0], relevant_docs)
         
         # If multiple CDPs are mentioned but it's not a comparison question
         return self.handle_comparison_question(question, cdps)
@@ -111,41 +147,315 @@ class CDPChatbot:
         """
         Handle questions that are not related to CDPs.
         """
-        return ("I'm a CDP support chatbot. I can help you with questions about Segment, mParticle, "
-                "Lytics, and Zeotap. Please ask me how to perform specific tasks in these platforms.")
+        titles = list(self.titles.values())
+        names = f"{', '.join(titles[:-1])}, and {titles[-1]}" if len(titles) > 2 else ' and '.join(titles)
+        return (f"I'm a CDP support chatbot. I can help you with questions about {names}. "
+                "Please ask me how to perform specific tasks in these platforms.")
+
+    @staticmethod
+    def _create_scoring():
+        """
+        Create the ranking function from the environment.
+
+        CDP_SCORING selects 'tfidf' (default) or 'bm25'; CDP_BM25_K1 (default
+        1.2) and CDP_BM25_B (default 0.75) tune BM25.
+        """
+        name = os.environ.get('CDP_SCORING', 'tfidf').lower()
+        if name == 'bm25':
+            return create_scoring(name, k1=float(os.environ.get('CDP_BM25_K1', 1.2)),
+                                  b=float(os.environ.get('CDP_BM25_B', 0.75)))
+        return create_scoring(name)
+
+    @staticmethod
+    def _create_tokenizer():
+        """
+        Create the tokenizer from the environment.
+
+        CDP_TOKENIZER selects 'nltk' (default) or 'fast', which needs no NLTK
+        data and yields the same vocabulary on the shipped documents.
+        """
+        return create_tokenizer(os.environ.get('CDP_TOKENIZER', 'nltk').lower())
+
+    @staticmethod
+    def _index_precision():
+        """
+        Storage type of the index weights from the environment.
+
+        CDP_INDEX_PRECISION selects 'float64' (default, exact), 'float32' or
+        'uint8'; the compact types use a half or under a third of the posting
+        memory for slightly different scores.
+        """
+        return os.environ.get('CDP_INDEX_PRECISION', 'float64').lower()
+
+    @staticmethod
+    def _section_cache_bytes():
+        """
+        Memory budget for the section text of lazily loaded CDPs.
+
+        CDP_SECTION_CACHE_MB (default 0, unlimited) caps the text kept for
+        answering; the least recently used CDPs are dropped beyond it and
+        reloaded from the index snapshot when they are asked about again.
+        """
+        return int(float(os.environ.get('CDP_SECTION_CACHE_MB', 0)) * 2 ** 20)
+
+    @staticmethod
+    def _create_shards():
+        """
+        Create the shard pool from the environment, or None to score in-process.
+
+        CDP_SHARDS sets the number of worker processes (default 0, disabled);
+        only CDPs with at least CDP_SHARD_MIN_PASSAGES passages (default
+        20000) are sharded, since smaller ones score faster than a round trip.
+        """
+        n_shards = int(os.environ.get('CDP_SHARDS', 0))
+        if n_shards <= 0:
+            return None
+        return ShardPool(n_shards, min_docs=int(os.environ.get('CDP_SHARD_MIN_PASSAGES', 20000)))
+
+    @staticmethod
+    def _create_response_cache():
+        """
+        Create the response cache from the environment.
+
+        CDP_RESPONSE_CACHE_SIZE (default 1024, 0 disables) and
+        CDP_RESPONSE_CACHE_TTL (seconds, default 3600) size the in-process cache;
+        CDP_RESPONSE_CACHE_DB optionally names a SQLite file shared by all workers.
+        """
+        backend = None
+        shared_path = os.environ.get('CDP_RESPONSE_CACHE_DB')
+        if shared_path:
+            try:
+                backend = SQLiteCacheBackend(shared_path)
+            except Exception as e:
+                logger.warning(f"Shared response cache unavailable: {str(e)}")
+
+        return ResponseCache(
+            max_entries=int(os.environ.get('CDP_RESPONSE_CACHE_SIZE', 1024)),
+            ttl=float(os.environ.get('CDP_RESPONSE_CACHE_TTL', 3600)),
+            backend=backend
+        )
+
+    def _answer_question(self, question, intent=None):
+        """
+        Generate a response without consulting the response cache.
+        """
+        # Detect mentioned CDPs and the kind of question
+        intent = intent or self.analyze_question(question)
+        mentioned_cdps = intent.cdps
+
+        # Check if question is CDP-related
+        if not mentioned_cdps:
+            return self.handle_irrelevant_question(question)
+
+        # Handle comparison questions
+        if intent.is_comparison:
+            return self.handle_comparison_question(question, mentioned_cdps)
+
+        # Handle how-to questions
+        if intent.is_how_to:
+            return self.handle_how_to_question(question, mentioned_cdps)
+
+        # For general questions, treat them as how-to questions
+        return self.handle_how_to_question(question, mentioned_cdps)
+
+    def _stream_answer(self, question):
+        """
+        Generate a response in chunks without consulting the response cache.
+        Only answers spanning several CDPs are split; others are one chunk.
+        """
+        intent = self.analyze_question(question)
+        if intent.cdps and (intent.is_comparison or len(intent.cdps) > 1):
+            yield from self.stream_comparison_question(question, intent.cdps)
+        else:
+            yield self._answer_question(question, intent)
 
     def process_question(self, question):
         """
         Main method to process incoming questions and generate responses.
+        Responses are cached per index version.
+        """
+        version = self.indexer.version
+        cached = self.response_cache.get(question, version)
+        if cached is not None:
+            return cached
+
+        try:
+            response = self._answer_question(question)
+        except Exception as e:
+            logger.error(f"Error processing question: {str(e)}", exc_info=True)
+            ERRORS.inc('chat')
+            return ERROR_RESPONSE
+
+        self.response_cache.set(question, version, response)
+        return response
+
+    def stream_question(self, question):
+        """
+        Process a question, yielding the response in chunks as it is built.
+        The joined chunks equal the response of process_question.
         """
+        version = self.indexer.version
+        cached = self.response_cache.get(question, version)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
         try:
-            # Check if question is CDP-related
-            if not any(keyword in question.lower() for cdp in self.cdps for keyword in self.cdps[cdp]):
-                return self.handle_irrelevant_question(question)
+            for chunk in self._stream_answer(question):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error processing question: {str(e)}", exc_info=True)
+            ERRORS.inc('chat')
+            yield f"\n\n{ERROR_RESPONSE}" if chunks else ERROR_RESPONSE
+            return
+
+        self.response_cache.set(question, version, ''.join(chunks))
 
-            # Detect mentioned CDPs
-            mentioned_cdps = self.detect_cdps(question)
+    def process_questions(self, questions):
+        """
+        Process a batch of questions, returning responses in the same order.
 
-            # Handle comparison questions
-            if self.is_comparison_question(question):
-                return self.handle_comparison_question(question, mentioned_cdps)
+        Cached responses are reused. Every remaining question is searched in
+        each CDP it mentions, with one batched query per CDP for the whole
+        batch, and answered as process_question() would.
+        """
+        version = self.indexer.version
+        responses = [None] * len(questions)
+        intents = {}
+        batches = {}
 
-            # Handle how-to questions
-            if self.is_how_to_question(question):
-                return self.handle_how_to_question(question, mentioned_cdps)
+        for position, question in enumerate(questions):
+            responses[position] = self.response_cache.get(question, version)
+            if responses[position] is not None:
+                continue
 
-            # For general questions, treat them as how-to questions
-            return self.handle_how_to_question(question, mentioned_cdps)
+            try:
+                intent = self.analyze_question(question)
+                if intent.cdps:
+                    intents[position] = intent
+                    for cdp in intent.cdps:
+                        batches.setdefault(cdp, []).append(position)
+                    continue
+                responses[position] = self.handle_irrelevant_question(question)
+                self.response_cache.set(question, version, responses[position])
+            except Exception as e:
+                logger.error(f"Error processing question: {str(e)}", exc_info=True)
+                ERRORS.inc('chat')
+                responses[position] = ERROR_RESPONSE
 
-        except Exception as e:
-            logger.error(f"Error processing question: {str(e)}")
-            return "I encountered an error while processing your question. Please try again."
+        found = {}
+        for cdp, positions in batches.items():
+            try:
+                results = self.indexer.search_batch([questions[p] for p in positions], cdp, snippets=True)
+            except Exception as e:
+                logger.error(f"Error processing questions for {cdp}: {str(e)}", exc_info=True)
+                continue
+            for position, relevant_docs in zip(positions, results):
+                found[position, cdp] = relevant_docs
 
-# Initialize global chatbot instance
-chatbot = CDPChatbot()
+        for position, intent in intents.items():
+            if any((position, cdp) not in found for cdp in intent.cdps):
+                ERRORS.inc('chat')
+                responses[position] = ERROR_RESPONSE
+                continue
+            try:
+                if len(intent.cdps) == 1 and not intent.is_comparison:
+                    cdp = intent.cdps[0]
+                    responses[position] = self.format_single_cdp_response(cdp, found[position, cdp])
+                else:
+                    # As handle_comparison_question(): the best passage of every CDP with results
+                    docs = {cdp: found[position, cdp] for cdp in intent.cdps}
+                    responses[position] = self.format_comparison_response(
+                        questions[position], {cdp: self.format_passage(docs[cdp][0]) for cdp in docs if docs[cdp]})
+                self.response_cache.set(questions[position], version, responses[position])
+            except Exception as e:
+                logger.error(f"Error processing question: {str(e)}", exc_info=True)
+                ERRORS.inc('chat')
+                responses[position] = ERROR_RESPONSE
+
+        return responses
+
+# Global chatbot instance, built on first use or by preload()
+_chatbot = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot():
+    """
+    Return the global chatbot instance, building it and its index on first use.
+    """
+    global _chatbot
+    if _chatbot is None:
+        with _chatbot_lock:
+            if _chatbot is None:
+                _chatbot = CDPChatbot()
+    return _chatbot
+
+def set_chatbot(chatbot):
+    """
+    Make ``chatbot`` the global instance, e.g. one answering from a
+    benchmark corpus instead of data/docs.
+    """
+    global _chatbot
+    with _chatbot_lock:
+        _chatbot = chatbot
+    return chatbot
+
+def preload():
+    """
+    Build the global chatbot and its index now, e.g. in a server's master
+    process before it forks workers.
+    """
+    return get_chatbot()
+
+def is_ready():
+    """
+    Whether the global chatbot exists and its index is loaded, without
+    triggering a build.
+    """
+    return _chatbot is not None and _chatbot.indexer.is_ready
+
+@REGISTRY.register_collector
+def collect_metrics():
+    """
+    Metrics read from the global chatbot when /metrics is rendered: response
+    and section cache counters and the size of the loaded index.
+    """
+    if _chatbot is None:
+        return [('cdp_index_ready', 'gauge', 'Whether the index is loaded.', [({}, 0)])]
+
+    cache = _chatbot.response_cache.get_stats()
+    sections = _chatbot.indexer.section_cache.get_stats()
+    state = _chatbot.indexer.state
+    return [
+        ('cdp_index_ready', 'gauge', 'Whether the index is loaded.', [({}, int(_chatbot.indexer.is_ready))]),
+        ('cdp_index_passages', 'gauge', 'Indexed passages per CDP.',
+         [({'cdp': cdp}, index.n_docs) for cdp, index in state.doc_vectors.items()]),
+        ('cdp_response_cache_events_total', 'counter', 'Response cache lookups and evictions.',
+         [({'event': event}, cache[event])
+          for event in ('hits', 'shared_hits', 'misses', 'evictions', 'expirations', 'invalidations')]),
+        ('cdp_response_cache_entries', 'gauge', 'Responses held in the local cache.', [({}, cache['size'])]),
+        ('cdp_section_cache_events_total', 'counter', 'Section text cache hits, loads and evictions.',
+         [({'event': event}, sections[event]) for event in ('hits', 'loads', 'evictions')]),
+        ('cdp_section_cache_bytes', 'gauge', 'Section text held in memory for lazily loaded CDPs.',
+         [({}, sections['bytes'])])
+    ]
 
 def process_question(question):
     """
     Global function to process questions using the chatbot instance.
     """
-    return chatbot.process_question(question)
+    return get_chatbot().process_question(question)
+
+def process_questions(questions):
+    """
+    Global function to process a batch of questions using the chatbot instance.
+    """
+    return get_chatbot().process_questions(questions)
+
+def stream_question(question):
+    """
+    Global function to stream the response to a question using the chatbot instance.
+    """
+    return get_chatbot().stream_question(question)
@@ -0,0 +1,107 @@
+import logging
+import xml.etree.ElementTree as ET
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+logger = logging.getLogger(__name__)
+
+# Links to these file types never lead to documentation pages
+SKIPPED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+                      '.zip', '.gz', '.tar', '.mp4', '.mp3', '.css', '.js', '.json', '.xml')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url, base_url=None):
+    """
+    Normalize a URL so equivalent links de-duplicate to the same string.
+
+    Resolves it against ``base_url``, lowercases the scheme and host, drops
+    default ports, fragments and ``utm_*`` tracking parameters, and sorts the
+    query string. Returns None for non-HTTP(S) links.
+    """
+    if base_url:
+        url = urljoin(base_url, url)
+    parts = urlparse(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parts.port}"
+
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith('utm_'))
+    return urlunparse((scheme, netloc, parts.path or '/', '', urlencode(query), ''))
+
+
+class CrawlFrontier:
+    """
+    Breadth-first crawl frontier with depth and page limits.
+
+    Only URLs on the base URL's host and under its path are accepted, and each
+    normalized URL is queued at most once.
+    """
+
+    def __init__(self, base_url, max_depth=3, max_pages=500):
+        self.base_url = normalize_url(base_url)
+        parts = urlparse(self.base_url)
+        self.host = parts.netloc
+        self.path_prefix = parts.path if parts.path.endswith('/') else parts.path.rsplit('/', 1)[0] + '/'
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self._queue = deque()
+        self._seen = set()
+
+    def in_scope(self, url):
+        """Whether a normalized URL belongs to the documentation being crawled."""
+        parts = urlparse(url)
+        return (parts.netloc == self.host and
+                parts.path.startswith(self.path_prefix) and
+                not parts.path.lower().endswith(SKIPPED_EXTENSIONS))
+
+    def add(self, url, depth, base_url=None):
+        """
+        Queue ``url`` found at ``depth``. Returns True if it was accepted.
+        """
+        url = normalize_url(url, base_url)
+        if (url is None or url in self._seen or depth > self.max_depth or
+                len(self._seen) >= self.max_pages or not self.in_scope(url)):
+            return False
+        self._seen.add(url)
+        self._queue.append((url, depth))
+        return True
+
+    def add_links(self, links, depth, base_url=None):
+        """Queue every link from a page; returns how many were accepted."""
+        return sum(self.add(link, depth, base_url) for link in links)
+
+    def pop(self):
+        """Return the next ``(url, depth)`` to fetch."""
+        return self._queue.popleft()
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def seen(self):
+        """Number of distinct URLs accepted so far."""
+        return len(self._seen)
+
+
+def parse_sitemap(xml_text):
+    """
+    Extract ``<loc>`` URLs from a sitemap or sitemap index.
+    Returns ``(page_urls, nested_sitemap_urls)``.
+    """
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError as e:
+        logger.warning(f"Invalid sitemap: {str(e)}")
+        return [], []
+
+    locs = [el.text.strip() for el in root.iter() if el.tag.endswith('loc') and el.text]
+    if root.tag.endswith('sitemapindex'):
+        return [], locs
+    return locs, []
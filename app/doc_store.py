@@ -0,0 +1,288 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# Section files of a CDP, in order of preference. ``{cdp}_docs.json`` is the
+# original single-document layout and is still read, but no longer written.
+DOC_SUFFIXES = ['_docs.jsonl.gz', '_docs.jsonl', '_docs.json']
+
+
+def docs_file(docs_path, cdp, compress=False):
+    """Path new sections of ``cdp`` are written to."""
+    return Path(docs_path) / f"{cdp}{DOC_SUFFIXES[0] if compress else DOC_SUFFIXES[1]}"
+
+
+def find_docs_file(docs_path, cdp):
+    """Return the existing section file of ``cdp``, or None."""
+    for suffix in DOC_SUFFIXES:
+        path = Path(docs_path) / f"{cdp}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def iter_sections(path):
+    """
+    Yield the sections stored in ``path`` one at a time.
+
+    JSONL files (optionally gzipped) hold one section per line and are read
+    line by line. Legacy ``_docs.json`` files have to be parsed whole.
+    """
+    path = Path(path)
+    if path.suffix == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)['sections']
+        return
+
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PackedSections:
+    """
+    Read-only sequence of sections held in one contiguous UTF-8 buffer.
+
+    Titles and contents are stored back to back and found through a single
+    offsets array, instead of a dict and two str objects per section.
+    Indexing returns a new ``{'title': ..., 'content': ...}`` dict with the
+    original strings; content() and title() decode just one field.
+    """
+
+    def __init__(self, sections):
+        buffer = bytearray()
+        ends = []
+        for section in sections:
+            buffer += section.get('title', '').encode('utf-8')
+            ends.append(len(buffer))
+            buffer += section['content'].encode('utf-8')
+            ends.append(len(buffer))
+        self._buffer = bytes(buffer)
+        # Field i spans _buffer[_offsets[i]:_offsets[i + 1]]; a section's title is field 2n, its content 2n + 1
+        self._offsets = np.zeros(len(ends) + 1, dtype=np.int64)
+        self._offsets[1:] = ends
+        self._offsets.setflags(write=False)
+
+    @classmethod
+    def from_buffer(cls, buffer, offsets):
+        """Wrap a buffer and offsets array returned by raw(), e.g. read back from an index snapshot."""
+        sections = cls.__new__(cls)
+        sections._buffer = bytes(buffer)
+        sections._offsets = np.asarray(offsets, dtype=np.int64)
+        sections._offsets.setflags(write=False)
+        return sections
+
+    def raw(self):
+        """Return the UTF-8 buffer and the field offsets into it."""
+        return self._buffer, self._offsets
+
+    def _field(self, field):
+        start, end = self._offsets[field:field + 2]
+        return self._buffer[start:end].decode('utf-8')
+
+    def title(self, idx):
+        return self._field(2 * self._check(idx))
+
+    def content(self, idx):
+        return self._field(2 * self._check(idx) + 1)
+
+    def _check(self, idx):
+        n = len(self)
+        if not -n <= idx < n:
+            raise IndexError("section index out of range")
+        return idx + n if idx < 0 else idx
+
+    def __len__(self):
+        return (len(self._offsets) - 1) // 2
+
+    def __getitem__(self, idx):
+        idx = self._check(idx)
+        return {'title': self._field(2 * idx), 'content': self._field(2 * idx + 1)}
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    @property
+    def nbytes(self):
+        """Memory used by the text buffer and offsets, in bytes."""
+        return len(self._buffer) + self._offsets.nbytes
+
+
+class SectionCache:
+    """
+    LRU cache of the PackedSections of lazily loaded CDPs, bounded by their
+    total size in bytes (``max_bytes``, 0 for no limit).
+
+    The most recently used entry is never evicted, so a CDP larger than the
+    whole budget can still be loaded; it is evicted by the next one.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'loads': 0,
+            'evictions': 0
+        }
+
+    def get(self, key, loader):
+        """Return the sections cached under ``key``, calling ``loader()`` to load them on a miss."""
+        with self._lock:
+            sections = self._entries.get(key)
+            if sections is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return sections
+
+        # Load without the lock so other CDPs are served meanwhile
+        sections = loader()
+        with self._lock:
+            self.stats['loads'] += 1
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = sections
+            self._bytes += sections.nbytes
+            while self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.stats['evictions'] += 1
+        return sections
+
+    def retain(self, keys):
+        """Drop every entry whose key is not in ``keys``, e.g. sections of replaced documents."""
+        with self._lock:
+            for key in [key for key in self._entries if key not in keys]:
+                self._bytes -= self._entries.pop(key).nbytes
+
+    def get_stats(self):
+        """Return the hit/load/eviction counters and the cached entries and bytes."""
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+class LazySections:
+    """
+    The sections of a CDP that are loaded on first use.
+
+    ``loader()`` returns them as PackedSections, which are kept in ``cache``
+    under ``key`` and reloaded whenever the cache has evicted them. Only the
+    number of sections and their size are known without loading.
+    """
+
+    def __init__(self, key, length, nbytes, loader, cache):
+        self._key = key
+        self._length = length
+        self._nbytes = nbytes
+        self._loader = loader
+        self._cache = cache
+
+    def _sections(self):
+        return self._cache.get(self._key, self._loader)
+
+    def title(self, idx):
+        return self._sections().title(idx)
+
+    def content(self, idx):
+        return self._sections().content(idx)
+
+    def raw(self):
+        """Return the buffer and offsets as PackedSections.raw() does, bypassing the cache."""
+        return self._loader().raw()
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, idx):
+        return self._sections()[idx]
+
+    def __iter__(self):
+        return iter(self._sections())
+
+    @property
+    def nbytes(self):
+        """Memory used by the sections once loaded, in bytes."""
+        return self._nbytes
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """SHA-1 of a file's bytes, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SectionWriter:
+    """
+    Append-only writer for a CDP's section file.
+
+    Sections are written one JSON object per line to a temporary file as they
+    arrive; commit() atomically replaces the CDP's previous section file,
+    whatever its format. Use as a context manager: the file is committed when
+    the block completes and discarded if it raises.
+    """
+
+    def __init__(self, docs_path, cdp, compress=False):
+        self.docs_path = Path(docs_path)
+        self.cdp = cdp
+        self.path = docs_file(docs_path, cdp, compress)
+        self.count = 0
+        self.docs_path.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        self._raw = open(self._tmp_path, 'wb')
+        # No name or timestamp in the gzip header, so equal sections give equal bytes
+        stream = gzip.GzipFile(filename='', mode='wb', compresslevel=6, fileobj=self._raw, mtime=0) if compress else self._raw
+        self._file = io.TextIOWrapper(stream, encoding='utf-8')
+
+    def write(self, section):
+        """Append one section."""
+        self._file.write(json.dumps(section, ensure_ascii=False))
+        self._file.write('\n')
+        self.count += 1
+
+    def write_all(self, sections):
+        """Append every section from an iterable; returns how many were written."""
+        for section in sections:
+            self.write(section)
+        return self.count
+
+    def _close(self):
+        self._file.close()
+        self._raw.close()
+
+    def commit(self):
+        """Publish the written sections and remove the CDP's files in other formats."""
+        self._close()
+        self._tmp_path.replace(self.path)
+        for suffix in DOC_SUFFIXES:
+            other = self.docs_path / f"{self.cdp}{suffix}"
+            if other != self.path and other.exists():
+                other.unlink()
+        return self.path
+
+    def discard(self):
+        """Drop everything written so far."""
+        self._close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
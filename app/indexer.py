@@ -1,195 +1,853 @@
 import numpy as np
-from collections import Counter
+from bisect import bisect_left
+from collections import Counter, namedtuple
 import re
-import json
 import logging
+import threading
+import time
 from pathlib import Path
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+from app.doc_store import PackedSections, SectionCache, SectionWriter, file_fingerprint, find_docs_file, iter_sections
+from app.metrics import ERRORS, FILTERED_RESULTS, SEARCH_QUERIES, SEARCH_SECONDS, SEARCH_STAGE_SECONDS, StageTimer
+from app.registry import load_registry
+from app.scoring import TfidfScoring
+from app.shards import ShardError
+from app.snapshot import load_snapshot, save_snapshot, snapshot_key
+from app.sparse_index import PRECISIONS, SparseIndex, score_many, top_k_indices, top_k_rows
+from app.token_cache import TokenCache
+from app.tokenizer import NltkTokenizer
 
 logger = logging.getLogger(__name__)
 
+# Query x document cells scored at once by search_batch; 512 KiB of float64 stays cache-resident
+BATCH_SCORE_CELLS = 1 << 16
+
+# Sections scoring at or below this cosine similarity are never returned in TF-IDF mode
+MIN_SIMILARITY = TfidfScoring.min_score
+
+# Sections are indexed as passages of this many words, consecutive passages
+# sharing PASSAGE_OVERLAP words; 0 indexes whole sections
+PASSAGE_WORDS = 150
+PASSAGE_OVERLAP = 30
+
+# Words in a snippet returned by search(..., snippets=True)
+SNIPPET_WORDS = 50
+# Snippets count a word when one of its alphanumeric parts is a query term
+WORD_PART = re.compile(r'[0-9a-z]+')
+
+IndexState = namedtuple('IndexState', ['vocab', 'idf', 'doc_freq', 'doc_vectors', 'doc_contents',
+                                       'passages', 'source_fingerprint', 'version'])
+IndexState.__doc__ = """
+Everything search() needs, published as a single object.
+A new state is built off to the side and swapped in with one assignment.
+``doc_contents`` maps each CDP to ``{'platform', 'sections'}`` with the
+sections in a PackedSections buffer, or in LazySections when the state was
+loaded from a snapshot. ``passages`` maps each CDP to a ``(n, 3)`` array of (section, start word,
+end word) spans, one per indexed document; an end of -1 means the whole
+section. ``version`` is derived from the source documents, so every worker
+serving the same documents reports the same version.
+"""
+
+
+def freeze_state(state):
+    """
+    Make every array of ``state`` read-only before it is published, so a
+    reader holding the state can never observe it being modified.
+    """
+    for array in (state.idf, state.doc_freq, *state.passages.values()):
+        array.setflags(write=False)
+    for index in state.doc_vectors.values():
+        index.freeze()
+    return state
+
+
+EMPTY_STATE = freeze_state(IndexState({}, np.zeros(0), np.zeros(0), {}, {}, {}, {}, ''))
+
+
+def record_results(cdp, returned, matching):
+    """
+    Count one query's outcome for ``cdp``: ``returned`` passages were returned
+    out of ``matching`` top-k candidates with a positive score; the
+    difference was cut by the minimum score.
+    """
+    SEARCH_QUERIES.inc(cdp, 'results' if returned else 'empty')
+    if matching > returned:
+        FILTERED_RESULTS.inc(cdp, amount=matching - returned)
+
+
 class DocumentIndexer:
-    def __init__(self):
-        self.docs_path = Path(__file__).parent.parent / 'data' / 'docs'
-        self.doc_contents = {}
-        self.vocab = {}
-        self.idf = None
-        self.doc_vectors = {}
-
-        # Download required NLTK data
-        try:
-            nltk.data.find('tokenizers/punkt')
-            nltk.data.find('corpora/stopwords')
-        except LookupError:
-            nltk.download('punkt')
-            nltk.download('stopwords')
-
-        # Initialize stop words
-        self.stop_words = set(stopwords.words('english'))
-        
+    def __init__(self, docs_path=None, index_path=None, use_snapshot=True,
+                 passage_words=PASSAGE_WORDS, passage_overlap=PASSAGE_OVERLAP, snippet_words=SNIPPET_WORDS,
+                 scoring=None, tokenizer=None, shards=None, precision='float64', cdps=None, section_cache_bytes=0):
+        self.docs_path = Path(docs_path) if docs_path else Path(__file__).parent.parent / 'data' / 'docs'
+        self.index_path = Path(index_path) if index_path else self.docs_path.parent / 'index'
+        self.use_snapshot = use_snapshot
+        if passage_words and not 0 <= passage_overlap < passage_words:
+            raise ValueError("passage_overlap must be smaller than passage_words")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown index precision: {precision}")
+        self.passage_words = passage_words
+        self.passage_overlap = passage_overlap
+        self.snippet_words = snippet_words
+        # Ranking function, see app.scoring; cosine TF-IDF unless configured
+        self.scoring = scoring or TfidfScoring()
+        # Text to tokens, see app.tokenizer; NLTK word_tokenize unless configured
+        self.tokenizer = tokenizer or NltkTokenizer()
+        # Optional app.shards.ShardPool scoring large CDPs on worker processes
+        self.shards = shards
+        # Storage type of posting weights, see app.sparse_index.PRECISIONS
+        self.precision = precision
+        # CDPs to index, in order; every platform of the registry unless given
+        self.cdps = list(cdps) if cdps is not None else [platform.name for platform in load_registry()]
+        # Section text of CDPs loaded from a snapshot is read on first use and
+        # evicted, least recently used first, beyond section_cache_bytes
+        self.section_cache = SectionCache(section_cache_bytes)
+        self._state = EMPTY_STATE
+        self._update_lock = threading.Lock()
+        self._token_cache = None
+        self.build_timings = {}
+
         # Initialize the indexer
         self.initialize()
 
+    @property
+    def state(self):
+        """
+        The published IndexState. Read it once and use its fields to get a
+        consistent view; the separate properties below may each see a
+        different state if the index is swapped in between.
+        """
+        return self._state
+
+    @property
+    def vocab(self):
+        return self._state.vocab
+
+    @property
+    def idf(self):
+        return self._state.idf
+
+    @property
+    def doc_vectors(self):
+        return self._state.doc_vectors
+
+    @property
+    def doc_contents(self):
+        return self._state.doc_contents
+
+    @property
+    def is_ready(self):
+        """Whether an index has been built or loaded and is serving searches."""
+        return self._state is not EMPTY_STATE
+
+    @property
+    def index_options(self):
+        """Settings that change the index contents; part of the snapshot key."""
+        return {'passage_words': self.passage_words, 'passage_overlap': self.passage_overlap,
+                'scoring': self.scoring.options(), 'tokenizer': self.tokenizer.name, 'precision': self.precision}
+
+    @property
+    def version(self):
+        """Identifier of the published index; changes whenever the documents do."""
+        return self._state.version
+
     def initialize(self):
-        """Initialize the indexer by loading and processing documents."""
+        """
+        Initialize the indexer by loading and processing documents.
+
+        May be called again to rebuild from the source documents: the new state
+        is built off to the side while searches keep using the current one,
+        then published with a single assignment. Rebuilds and updates are
+        serialized by the update lock; searches never take it.
+        """
+        with self._update_lock:
+            self._initialize()
+
+    def _initialize(self):
         try:
             self.docs_path.mkdir(parents=True, exist_ok=True)
-            self._load_documents()
-            self._build_vocab()
-            self._calculate_idf()
-            self._vectorize_documents()
+            timings = {}
+            fingerprint = self._timed(timings, 'fingerprint', self._fingerprint_documents)
+
+            # A snapshot holds everything, so the documents are only read on a miss
+            if self.use_snapshot:
+                state = self._timed(timings, 'snapshot', self._load_snapshot, fingerprint)
+                if state is not None:
+                    self._swap(state)
+                    self.build_timings = timings
+                    logger.info(f"Index loaded from snapshot in {sum(timings.values()):.3f}s")
+                    return
+
+            # No usable snapshot: rebuild the index from the source documents
+            doc_contents = self._timed(timings, 'load', self._load_documents, fingerprint)
+            passages, passage_texts = self._timed(timings, 'chunk', self._chunk_documents, doc_contents)
+            doc_tokens = self._timed(timings, 'tokenize', self._tokenize_documents, passage_texts)
+            vocab = self._timed(timings, 'vocab', self._build_vocab, doc_tokens)
+            doc_freq, idf = self._timed(timings, 'idf', self._calculate_idf, doc_tokens, vocab)
+            doc_vectors = self._timed(timings, 'vectorize', self._vectorize_documents, doc_tokens, vocab, idf)
+
+            state = IndexState(vocab, idf, doc_freq, doc_vectors, doc_contents, passages, fingerprint,
+                               snapshot_key(fingerprint, self.index_options))
+            if self.use_snapshot:
+                state = self._save_snapshot(state)
+
+            self._swap(state)
+            self.build_timings = timings
+            logger.info("Index built in %.3fs (%s)", sum(timings.values()),
+                        ', '.join(f"{stage}={seconds:.3f}s" for stage, seconds in timings.items()))
         except Exception as e:
             logger.error(f"Error initializing indexer: {str(e)}")
             raise
 
+    @staticmethod
+    def _timed(timings, stage, func, *args):
+        """Run one build stage and record how long it took."""
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
     def _preprocess_text(self, text):
         """Preprocess text by tokenizing, removing stopwords, and converting to lowercase."""
-        # Convert to lowercase and tokenize
-        tokens = word_tokenize(text.lower())
-        
-        # Remove stopwords and non-alphabetic tokens
-        tokens = [token for token in tokens if token not in self.stop_words and token.isalnum()]
-        
-        return tokens
-
-    def _build_vocab(self):
+        return self.tokenizer(text)
+
+    def _preprocess_batch(self, texts):
+        """_preprocess_text() for many texts, in one pass when the tokenizer supports it."""
+        if hasattr(self.tokenizer, 'tokenize_batch'):
+            return self.tokenizer.tokenize_batch(texts)
+        return [self.tokenizer(text) for text in texts]
+
+    def _load_snapshot(self, fingerprint):
+        """
+        Load the index state from a snapshot matching the current sources.
+        Postings and passages are memory-mapped and section text is read per
+        CDP on first use, so memory grows with the CDPs actually searched.
+        Only section text is evicted under ``section_cache_bytes``; mapped
+        postings are paged out by the operating system, not by the cache.
+        """
+        snapshot = load_snapshot(self.index_path, fingerprint, self.index_options, self.section_cache)
+        if snapshot is None:
+            return None
+
+        vocab, idf, doc_vectors, passages, sections = snapshot
+        doc_freq = np.zeros(len(vocab))
+        for index in doc_vectors.values():
+            doc_freq += np.diff(index.indptr)
+        doc_contents = {cdp: {"platform": cdp, "sections": sections[cdp]} for cdp in doc_vectors}
+        return IndexState(vocab, idf, doc_freq, doc_vectors, doc_contents, passages, fingerprint,
+                          snapshot_key(fingerprint, self.index_options))
+
+    def _save_snapshot(self, state):
+        """
+        Snapshot ``state`` and return it as loaded back from the snapshot, so
+        its arrays are memory-mapped and its section text is read lazily like
+        after a restart. Returns ``state`` itself if saving failed.
+        """
+        sections = {cdp: docs['sections'] for cdp, docs in state.doc_contents.items()}
+        if save_snapshot(self.index_path, state.source_fingerprint, state.vocab, state.idf, state.doc_vectors,
+                         state.passages, sections, self.index_options) is None:
+            return state
+        return self._load_snapshot(state.source_fingerprint) or state
+
+    def _get_token_cache(self):
+        """Return the token cache shared by incremental updates."""
+        if self._token_cache is None:
+            self._token_cache = TokenCache(self.index_path / 'token_cache.json', tokenizer=self.tokenizer.name)
+        return self._token_cache
+
+    def _chunk_sections(self, sections):
+        """
+        Split sections into overlapping passages of ``passage_words`` words.
+
+        Returns the ``(n, 3)`` span array described in IndexState and the text
+        of every passage. Sections that fit in one passage are kept verbatim.
+        """
+        spans, texts = [], []
+        stride = self.passage_words - self.passage_overlap
+        for idx, section in enumerate(sections):
+            words = section['content'].split() if self.passage_words else ()
+            if len(words) <= self.passage_words:
+                spans.append((idx, 0, -1))
+                texts.append(section['content'])
+                continue
+
+            for start in range(0, len(words) - self.passage_overlap, stride):
+                end = min(start + self.passage_words, len(words))
+                spans.append((idx, start, end))
+                texts.append(' '.join(words[start:end]))
+        return np.array(spans, dtype=np.int64).reshape(-1, 3), texts
+
+    def _chunk_documents(self, doc_contents):
+        """Chunk every CDP's sections; returns ``({cdp: spans}, {cdp: passage texts})``."""
+        passages, passage_texts = {}, {}
+        for cdp in doc_contents:
+            passages[cdp], passage_texts[cdp] = self._chunk_sections(doc_contents[cdp]['sections'])
+        return passages, passage_texts
+
+    def _tokenize_passages(self, texts, token_cache):
+        """Tokenize passages, reusing cached tokens for unchanged content."""
+        return [token_cache.get_or_tokenize(text, self._preprocess_text) for text in texts]
+
+    def _tokenize_documents(self, passage_texts):
+        """
+        Tokenize every passage exactly once into the shared token store.
+        Unchanged passages are served from the persistent token cache.
+        """
+        token_cache = TokenCache(self.index_path / 'token_cache.json', tokenizer=self.tokenizer.name)
+        doc_tokens = {
+            cdp: self._tokenize_passages(texts, token_cache)
+            for cdp, texts in passage_texts.items()
+        }
+        token_cache.save()
+        self._token_cache = token_cache
+        logger.info(f"Token cache: {token_cache.hits} hits, {token_cache.misses} misses")
+        return doc_tokens
+
+    def _build_vocab(self, doc_tokens):
         """Build vocabulary from all documents."""
         vocab = set()
-        for cdp in self.doc_contents:
-            for section in self.doc_contents[cdp]['sections']:
-                tokens = self._preprocess_text(section['content'])
+        for cdp in doc_tokens:
+            for tokens in doc_tokens[cdp]:
                 vocab.update(tokens)
-        
-        self.vocab = {word: idx for idx, word in enumerate(sorted(vocab))}
 
-    def _calculate_tf(self, tokens):
-        """Calculate term frequency for a document."""
+        return {word: idx for idx, word in enumerate(sorted(vocab))}
+
+    def _count_terms(self, tokens, vocab):
+        """Count in-vocabulary terms, keyed by term id."""
         counter = Counter(tokens)
-        tf = np.zeros(len(self.vocab))
-        for word, count in counter.items():
-            if word in self.vocab:
-                tf[self.vocab[word]] = count
-        return tf
-
-    def _calculate_idf(self):
-        """Calculate inverse document frequency for all terms."""
-        n_docs = sum(len(self.doc_contents[cdp]['sections']) for cdp in self.doc_contents)
-        doc_freq = np.zeros(len(self.vocab))
-        
-        for cdp in self.doc_contents:
-            for section in self.doc_contents[cdp]['sections']:
-                tokens = set(self._preprocess_text(section['content']))
-                for token in tokens:
-                    if token in self.vocab:
-                        doc_freq[self.vocab[token]] += 1
-        
-        self.idf = np.log(n_docs / (doc_freq + 1)) + 1
-
-    def _vectorize_documents(self):
-        """Create TF-IDF vectors for all documents."""
-        for cdp in self.doc_contents:
-            vectors = []
-            for section in self.doc_contents[cdp]['sections']:
-                tokens = self._preprocess_text(section['content'])
-                tf = self._calculate_tf(tokens)
-                tfidf = tf * self.idf
-                # Normalize the vector
-                norm = np.linalg.norm(tfidf)
-                if norm > 0:
-                    tfidf = tfidf / norm
-                vectors.append(tfidf)
-            self.doc_vectors[cdp] = np.array(vectors)
-
-    def _load_documents(self):
-        """Load documents from the data directory."""
-        for cdp in ['segment', 'mparticle', 'lytics', 'zeotap']:
-            doc_path = self.docs_path / f"{cdp}_docs.json"
-            
+        return {vocab[word]: count for word, count in counter.items() if word in vocab}
+
+    def _calculate_idf(self, doc_tokens, vocab):
+        """Calculate document frequency and inverse document frequency for all terms."""
+        n_docs = sum(len(doc_tokens[cdp]) for cdp in doc_tokens)
+        doc_freq = np.zeros(len(vocab))
+
+        for cdp in doc_tokens:
+            for tokens in doc_tokens[cdp]:
+                for token in set(tokens):
+                    if token in vocab:
+                        doc_freq[vocab[token]] += 1
+
+        return doc_freq, self.scoring.idf(doc_freq, n_docs)
+
+    def _vectorize_documents(self, doc_tokens, vocab, idf):
+        """Build sparse weighted postings for all documents."""
+        doc_counts = {
+            cdp: [self._count_terms(tokens, vocab) for tokens in doc_tokens[cdp]]
+            for cdp in doc_tokens
+        }
+        n_docs = sum(len(counts) for counts in doc_counts.values())
+        total_length = sum(sum(counts.values()) for cdp in doc_counts for counts in doc_counts[cdp])
+        avg_doc_length = total_length / n_docs if n_docs else 0.0
+
+        return {
+            cdp: SparseIndex.from_term_counts(doc_counts[cdp], len(vocab), idf, self.scoring, avg_doc_length,
+                                              self.precision)
+            for cdp in doc_counts
+        }
+
+    def _vectorize_query(self, query, state):
+        """
+        Build the query vector of the scoring mode.
+        Returns sorted term ids and their weights.
+        """
+        return self._vectorize_tokens(self._preprocess_text(query), state)
+
+    def _vectorize_tokens(self, tokens, state):
+        """Build the query vector of already preprocessed query tokens."""
+        query_tf = self._count_terms(tokens, state.vocab)
+        # Terms whose sections were all removed by incremental updates are not part of the index
+        term_ids = np.array([t for t in sorted(query_tf) if state.doc_freq[t] > 0], dtype=np.int64)
+        query_tf = np.array([query_tf[t] for t in term_ids], dtype=np.float64)
+        return term_ids, self.scoring.query_weights(query_tf, state.idf[term_ids])
+
+    def _vectorize_batch(self, query_tokens, state):
+        """
+        Build the query vectors of many preprocessed queries, the same as
+        _vectorize_tokens() for each. Terms are looked up and counted for the
+        whole batch at once.
+        """
+        n_queries = len(query_tokens)
+        n_terms = max(len(state.idf), 1)
+        term_ids = np.fromiter((state.vocab.get(token, -1) for tokens in query_tokens for token in tokens),
+                               dtype=np.int64, count=sum(len(tokens) for tokens in query_tokens))
+        rows = np.repeat(np.arange(n_queries, dtype=np.int64), [len(tokens) for tokens in query_tokens])
+        known = term_ids >= 0
+        known[known] = state.doc_freq[term_ids[known]] > 0
+
+        # Distinct (query, term) cells, sorted by query and then term id
+        cells, query_tf = np.unique(rows[known] * n_terms + term_ids[known], return_counts=True)
+        rows, term_ids = np.divmod(cells, n_terms)
+        bounds = np.searchsorted(rows, np.arange(n_queries + 1)).tolist()
+        query_tf = query_tf.astype(np.float64)
+        vectors = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            ids = term_ids[start:stop]
+            vectors.append((ids, self.scoring.query_weights(query_tf[start:stop], state.idf[ids])))
+        return vectors
+
+    def _fingerprint_documents(self):
+        """
+        Hash the section file of every CDP, creating a placeholder for CDPs
+        without one. Returns a content hash per CDP; unreadable CDPs are left
+        out and not indexed.
+        """
+        fingerprint = {}
+        for cdp in self.cdps:
+            doc_path = find_docs_file(self.docs_path, cdp)
+
             # If document doesn't exist, create empty placeholder
-            if not doc_path.exists():
-                self._create_empty_doc(doc_path, cdp)
-            
+            if doc_path is None:
+                doc_path = self._create_empty_doc(cdp)
+
             try:
-                with open(doc_path, 'r', encoding='utf-8') as f:
-                    self.doc_contents[cdp] = json.load(f)
+                fingerprint[cdp] = file_fingerprint(doc_path)
             except Exception as e:
                 logger.error(f"Error loading documents for {cdp}: {str(e)}")
-                continue
+        return fingerprint
 
-    def _create_empty_doc(self, path, cdp):
-        """Create an empty document structure for a CDP."""
-        empty_doc = {
-            "platform": cdp,
-            "sections": [
-                {
-                    "title": "Getting Started",
-                    "content": f"Welcome to {cdp.capitalize()} documentation."
-                }
-            ]
-        }
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(empty_doc, f, indent=2)
+    def _load_documents(self, fingerprint):
+        """
+        Load the documents of the CDPs in ``fingerprint``.
+        Sections are streamed from each CDP's section file (JSONL, gzipped
+        JSONL or the legacy ``_docs.json``) into a PackedSections buffer.
+        CDPs that fail to load are removed from ``fingerprint``.
+        """
+        doc_contents = {}
+        for cdp in list(fingerprint):
+            try:
+                doc_path = find_docs_file(self.docs_path, cdp)
+                doc_contents[cdp] = {"platform": cdp, "sections": PackedSections(iter_sections(doc_path))}
+            except Exception as e:
+                fingerprint.pop(cdp, None)
+                logger.error(f"Error loading documents for {cdp}: {str(e)}")
+
+        return doc_contents
+
+    def _create_empty_doc(self, cdp):
+        """Create an empty document structure for a CDP and return its path."""
+        titles = {platform.name: platform.title for platform in load_registry()}
+        with SectionWriter(self.docs_path, cdp) as writer:
+            writer.write({
+                "title": "Getting Started",
+                "content": f"Welcome to {titles.get(cdp, cdp.capitalize())} documentation."
+            })
+        return writer.path
 
     def update_documents(self, cdp, documents):
-        """Update the documents for a specific CDP."""
-        try:
-            # Update document contents
-            doc_path = self.docs_path / f"{cdp}_docs.json"
-            with open(doc_path, 'w', encoding='utf-8') as f:
-                json.dump({
+        """
+        Update the documents for a specific CDP.
+
+        Only this CDP's postings are rebuilt; document frequencies are adjusted
+        by the CDP's delta and the other CDPs are just reweighted with the new
+        IDF. The new index is swapped in atomically once it is complete.
+        """
+        with self._update_lock:
+            try:
+                start = time.perf_counter()
+                sections = list(documents)
+
+                # Update document contents, keeping the CDP's current compression
+                current = find_docs_file(self.docs_path, cdp)
+                with SectionWriter(self.docs_path, cdp, compress=current is not None and current.suffix == '.gz') as writer:
+                    writer.write_all(sections)
+
+                docs = {
                     "platform": cdp,
-                    "sections": documents
-                }, f, indent=2)
+                    "sections": PackedSections(sections)
+                }
 
-            # Reload and reindex all documents
-            self.initialize()
-            
-            logger.info(f"Successfully updated documents for {cdp}")
-        except Exception as e:
-            logger.error(f"Error updating documents for {cdp}: {str(e)}")
-            raise
+                self._publish(self._apply_update(self._state, cdp, docs, file_fingerprint(writer.path)))
+                logger.info(f"Successfully updated documents for {cdp} in {time.perf_counter() - start:.3f}s")
+            except Exception as e:
+                logger.error(f"Error updating documents for {cdp}: {str(e)}")
+                raise
+
+    def reload_documents(self, cdp):
+        """
+        Reindex ``cdp`` from its section file, e.g. after the scraper saved a
+        new crawl, without restarting or rebuilding the other CDPs.
+
+        Returns False without doing anything when the file is missing or
+        unchanged since it was indexed. Searches keep using the current index
+        until the new one is swapped in.
+        """
+        with self._update_lock:
+            try:
+                start = time.perf_counter()
+                doc_path = find_docs_file(self.docs_path, cdp)
+                if doc_path is None:
+                    return False
+                fingerprint = file_fingerprint(doc_path)
+                if fingerprint == self._state.source_fingerprint.get(cdp):
+                    return False
+
+                docs = {"platform": cdp, "sections": PackedSections(iter_sections(doc_path))}
+                self._publish(self._apply_update(self._state, cdp, docs, fingerprint))
+                logger.info(f"Reloaded documents for {cdp} in {time.perf_counter() - start:.3f}s")
+                return True
+            except Exception as e:
+                logger.error(f"Error reloading documents for {cdp}: {str(e)}")
+                raise
+
+    def _swap(self, state):
+        """
+        Make ``state`` the published index. Running shard workers get their
+        copy first, so searches of the new state never wait for it.
+        """
+        freeze_state(state)
+        if self.shards is not None:
+            try:
+                self.shards.load(state)
+            except Exception as e:
+                logger.warning(f"Could not load the index into the shard workers: {str(e)}")
+        self._state = state
+        # Cached text of replaced documents is never read again
+        self.section_cache.retain(set(state.source_fingerprint.items()))
+
+    def _publish(self, state):
+        """
+        Snapshot a complete new state and swap it in, as loaded back from the
+        snapshot so its text is read lazily; the update lock must be held.
+        """
+        if self.use_snapshot:
+            state = self._save_snapshot(state)
+        self._swap(state)
+
+    def _apply_update(self, state, cdp, docs, source_hash):
+        """Build a new index state with ``cdp``'s documents replaced by ``docs``."""
+        spans, texts = self._chunk_sections(docs['sections'])
+        token_cache = self._get_token_cache()
+        tokens = self._tokenize_passages(texts, token_cache)
+        token_cache.save(prune=False)
+
+        # New terms are appended so existing term ids stay valid
+        vocab = dict(state.vocab)
+        for section_tokens in tokens:
+            for token in section_tokens:
+                if token not in vocab:
+                    vocab[token] = len(vocab)
+
+        doc_freq = np.zeros(len(vocab))
+        doc_freq[:len(state.doc_freq)] = state.doc_freq
+        old_index = state.doc_vectors.get(cdp)
+        if old_index is not None:
+            doc_freq[:len(old_index.indptr) - 1] -= np.diff(old_index.indptr)
 
-    def search(self, query, cdp, top_k=3):
-        """Search for relevant document sections for a given query and CDP."""
+        doc_counts = [self._count_terms(section_tokens, vocab) for section_tokens in tokens]
+        for counts in doc_counts:
+            for term_id in counts:
+                doc_freq[term_id] += 1
+
+        others = [index for name, index in state.doc_vectors.items() if name != cdp]
+        n_docs = sum(index.n_docs for index in others) + len(doc_counts)
+        idf = self.scoring.idf(doc_freq, n_docs)
+        total_length = sum(index.total_length for index in others) + sum(sum(c.values()) for c in doc_counts)
+        avg_doc_length = total_length / n_docs if n_docs else 0.0
+
+        # Keep CDPs in their original order
+        order = list(state.doc_contents) + ([cdp] if cdp not in state.doc_contents else [])
+        doc_vectors = {}
+        for name in order:
+            if name == cdp:
+                doc_vectors[name] = SparseIndex.from_term_counts(doc_counts, len(vocab), idf, self.scoring,
+                                                                 avg_doc_length, self.precision)
+            elif name in state.doc_vectors:
+                doc_vectors[name] = state.doc_vectors[name].reweighted(idf, self.scoring, avg_doc_length,
+                                                                       self.precision)
+        doc_contents = {name: docs if name == cdp else state.doc_contents[name] for name in order}
+        passages = {name: spans if name == cdp else state.passages[name] for name in order}
+        source_fingerprint = {**state.source_fingerprint, cdp: source_hash}
+        return IndexState(vocab, idf, doc_freq, doc_vectors, doc_contents, passages, source_fingerprint,
+                          snapshot_key(source_fingerprint, self.index_options))
+
+    def search(self, query, cdp, top_k=3, min_similarity=None, snippets=False):
+        """
+        Search for relevant document passages for a given query and CDP.
+
+        Returns the content of the best passages, or with ``snippets`` a
+        ``{'title', 'snippet'}`` dict per passage holding its section title and
+        the ``snippet_words`` window that best matches the query. Passages
+        scoring at or below ``min_similarity`` (by default the scoring mode's
+        ``min_score``) are left out.
+        """
+        if min_similarity is None:
+            min_similarity = self.scoring.min_score
         try:
-            if cdp not in self.doc_vectors or not self.doc_vectors[cdp].size:
+            # Read the published index once so a concurrent update cannot mix states
+            state = self._state
+            if cdp not in state.doc_vectors or not state.doc_vectors[cdp].n_docs:
                 logger.warning(f"No documents found for CDP: {cdp}")
+                SEARCH_QUERIES.inc(cdp, 'no_index')
                 return []
 
+            stages = StageTimer(SEARCH_STAGE_SECONDS, 'search')
             # Preprocess and vectorize query
-            query_tokens = self._preprocess_text(query)
-            query_tf = self._calculate_tf(query_tokens)
-            query_vector = query_tf * self.idf
-            
-            # Normalize query vector
-            query_norm = np.linalg.norm(query_vector)
-            if query_norm > 0:
-                query_vector = query_vector / query_norm
-
-            # Calculate cosine similarities
-            similarities = np.dot(self.doc_vectors[cdp], query_vector)
-            
-            # Get top k results
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            
-            # Filter out low similarity results
-            results = []
-            for idx in top_indices:
-                if similarities[idx] > 0.1:  # Minimum similarity threshold
-                    section = self.doc_contents[cdp]['sections'][idx]
-                    results.append(section['content'])
-            
+            tokens = self._preprocess_text(query)
+            stages.mark('tokenize')
+            term_ids, query_weights = self._vectorize_tokens(tokens, state)
+            stages.mark('vectorize')
+
+            sharded = None
+            if self._sharded(state, cdp):
+                sharded = self._search_shards(state, {cdp: [(term_ids, query_weights)]}, top_k, min_similarity)
+            if sharded is not None:
+                top_indices, matching = sharded[cdp][0]
+                stages.mark('shards')
+            else:
+                # Score the documents from the postings of the query terms
+                similarities = state.doc_vectors[cdp].score(term_ids, query_weights)
+                stages.mark('score')
+
+                top_indices = top_k_indices(similarities, top_k, min_similarity)
+                matching = self._matching(similarities, len(top_indices), top_k)
+                stages.mark('top_k')
+            results = self._results(state, cdp, top_indices, tokens if snippets else None)
+            stages.mark('results')
+
+            SEARCH_SECONDS.observe(stages.finish(), 'search', cdp)
+            record_results(cdp, len(results), matching)
             return results
 
         except Exception as e:
-            logger.error(f"Error searching documents: {str(e)}")
+            logger.error(f"Error searching documents: {str(e)}", exc_info=True)
+            ERRORS.inc('search')
             return []
 
+    def search_many(self, query, cdps, top_k=3, min_similarity=None, snippets=False):
+        """
+        Search several CDPs for the same query.
+
+        The query is preprocessed and vectorized once and all requested CDPs are
+        scored in one pass. Returns ``{cdp: results}`` with the same results
+        search() would give for each CDP.
+        """
+        if min_similarity is None:
+            min_similarity = self.scoring.min_score
+        try:
+            state = self._state
+            results = {cdp: [] for cdp in cdps}
+            available = [cdp for cdp in results if cdp in state.doc_vectors and state.doc_vectors[cdp].n_docs]
+            for cdp in results:
+                if cdp not in available:
+                    logger.warning(f"No documents found for CDP: {cdp}")
+                    SEARCH_QUERIES.inc(cdp, 'no_index')
+            if not available:
+                return results
+
+            stages = StageTimer(SEARCH_STAGE_SECONDS, 'search_many')
+            tokens = self._preprocess_text(query)
+            stages.mark('tokenize')
+            term_ids, query_weights = self._vectorize_tokens(tokens, state)
+            stages.mark('vectorize')
+
+            matching = {}
+            sharded = [cdp for cdp in available if self._sharded(state, cdp)]
+            if sharded:
+                found = self._search_shards(state, {cdp: [(term_ids, query_weights)] for cdp in sharded},
+                                            top_k, min_similarity) or {}
+                for cdp, ((top_indices, count),) in found.items():
+                    results[cdp], matching[cdp] = top_indices, count
+                stages.mark('shards')
+
+            local = [cdp for cdp in available if cdp not in matching]
+            if local:
+                similarities, offsets = score_many([state.doc_vectors[cdp] for cdp in local], term_ids, query_weights)
+                stages.mark('score')
+                for i, cdp in enumerate(local):
+                    cdp_similarities = similarities[offsets[i]:offsets[i + 1]]
+                    top_indices = top_k_indices(cdp_similarities, top_k, min_similarity)
+                    matching[cdp] = self._matching(cdp_similarities, len(top_indices), top_k)
+                    results[cdp] = top_indices
+                stages.mark('top_k')
+            for cdp in available:
+                results[cdp] = self._results(state, cdp, results[cdp], tokens if snippets else None)
+            stages.mark('results')
+
+            SEARCH_SECONDS.observe(stages.finish(), 'search_many', 'multi')
+            for cdp in available:
+                record_results(cdp, len(results[cdp]), matching[cdp])
+            return results
+
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}", exc_info=True)
+            ERRORS.inc('search')
+            return {cdp: [] for cdp in cdps}
+
+    def search_batch(self, queries, cdp, top_k=3, min_similarity=None, snippets=False):
+        """
+        Search one CDP for many queries at once.
+
+        The queries are tokenized and vectorized in one pass, scored with a
+        single sparse matrix product and their top-k selected for all rows at
+        once; every returned passage is read once. Repeated queries are
+        searched once. Returns one result list per query, in order, identical
+        to calling search() for each.
+        """
+        if min_similarity is None:
+            min_similarity = self.scoring.min_score
+        try:
+            state = self._state
+            if cdp not in state.doc_vectors or not state.doc_vectors[cdp].n_docs:
+                logger.warning(f"No documents found for CDP: {cdp}")
+                SEARCH_QUERIES.inc(cdp, 'no_index', amount=len(queries))
+                return [[] for _ in queries]
+
+            stages = StageTimer(SEARCH_STAGE_SECONDS, 'search_batch')
+            index = state.doc_vectors[cdp]
+            # Position of each query among the distinct ones
+            distinct = {}
+            rows = [distinct.setdefault(query, len(distinct)) for query in queries]
+            query_tokens = self._preprocess_batch(list(distinct))
+            stages.mark('tokenize')
+            vectors = self._vectorize_batch(query_tokens, state)
+            stages.mark('vectorize')
+
+            sharded = None
+            if self._sharded(state, cdp):
+                sharded = self._search_shards(state, {cdp: vectors}, top_k, min_similarity)
+            if sharded is not None:
+                results = [top_indices for top_indices, _ in sharded[cdp]]
+                counts = [(len(top_indices), matching) for top_indices, matching in sharded[cdp]]
+                stages.mark('shards')
+            else:
+                results = []
+                matching = []
+                chunk_size = max(1, BATCH_SCORE_CELLS // index.n_docs)
+                for start in range(0, len(vectors), chunk_size):
+                    chunk = vectors[start:start + chunk_size]
+                    similarities = index.score_batch([v[0] for v in chunk], [v[1] for v in chunk])
+                    stages.mark('score')
+                    results.extend(top_k_rows(similarities, top_k, min_similarity))
+                    matching.extend(np.minimum(top_k, np.count_nonzero(similarities > 0, axis=1)).tolist())
+                    stages.mark('top_k')
+                counts = [(len(top_indices), count) for top_indices, count in zip(results, matching)]
+            results = self._results_batch(state, cdp, results, query_tokens if snippets else None)
+            results = [list(results[row]) for row in rows]
+            stages.mark('results')
+
+            SEARCH_SECONDS.observe(stages.finish(), 'search_batch', cdp)
+            for row in rows:
+                record_results(cdp, *counts[row])
+            return results
+
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}", exc_info=True)
+            ERRORS.inc('search')
+            return [[] for _ in queries]
+
+    def _sharded(self, state, cdp):
+        """Whether ``cdp`` is scored on the shard workers."""
+        return self.shards is not None and self.shards.covers(state.doc_vectors[cdp])
+
+    def _search_shards(self, state, queries, top_k, min_similarity):
+        """
+        Run ShardPool.search(); returns None when the workers failed, so the
+        caller scores in-process with identical results.
+        """
+        try:
+            return self.shards.search(state, queries, top_k, min_similarity)
+        except ShardError as e:
+            logger.warning(f"Shard search failed, scoring in-process: {str(e)}")
+            ERRORS.inc('shards')
+            return None
+
+    @staticmethod
+    def _matching(similarities, returned, top_k):
+        """
+        Return how many of the top ``top_k`` passages have a positive score.
+        Only needed when fewer than ``top_k`` passages were returned.
+        """
+        if returned >= top_k:
+            return returned
+        return min(top_k, int(np.count_nonzero(similarities > 0)))
+
+    def _results(self, state, cdp, top_indices, query_tokens=None):
+        """
+        Turn the indices of the best passages into search results: passage
+        contents, or title/snippet dicts when ``query_tokens`` are given.
+        """
+        return self._results_batch(state, cdp, [top_indices], None if query_tokens is None else [query_tokens])[0]
+
+    def _results_batch(self, state, cdp, top_indices, query_tokens=None):
+        """
+        _results() for the best passages of many queries, ``top_indices`` and
+        ``query_tokens`` holding one entry per query. Every passage is read
+        once, however many queries return it.
+        """
+        if not top_indices:
+            return []
+        sections = state.doc_contents[cdp]['sections']
+        found = np.unique(np.concatenate([np.asarray(indices, dtype=np.int64) for indices in top_indices]))
+        section_words = {}
+        passages = {}
+        for doc_idx, (section_idx, start, end) in zip(found.tolist(), state.passages[cdp][found].tolist()):
+            if end < 0:
+                content = sections.content(section_idx)
+            else:
+                if section_idx not in section_words:
+                    section_words[section_idx] = sections.content(section_idx).split()
+                content = ' '.join(section_words[section_idx][start:end])
+            passages[doc_idx] = (content, sections.title(section_idx) if query_tokens is not None else None)
+
+        if query_tokens is None:
+            return [[passages[doc_idx][0] for doc_idx in np.asarray(indices).tolist()] for indices in top_indices]
+
+        # Index the words of every passage long enough to need a snippet once
+        word_parts = {doc_idx: self._word_parts(content) for doc_idx, (content, _) in passages.items()
+                      if self.snippet_words and len(content.split()) > self.snippet_words}
+        return [[{'title': passages[doc_idx][1],
+                  'snippet': self._snippet(passages[doc_idx][0], set(tokens), word_parts.get(doc_idx))}
+                 for doc_idx in np.asarray(indices).tolist()]
+                for indices, tokens in zip(top_indices, query_tokens)]
+
+    def _snippet(self, content, terms, word_parts=None):
+        """
+        Return the ``snippet_words``-word window of ``content`` containing the
+        most query terms, marking cut-off text with an ellipsis.
+        ``word_parts`` is _word_parts(content) when already known.
+        """
+        words = content.split()
+        size = self.snippet_words
+        if not size or len(words) <= size:
+            return content
+
+        lowered, parts = word_parts if word_parts is not None else self._word_parts(content)
+        # Parts are ASCII, so no other term can match
+        terms = {term for term in terms if term.isascii() and term.isalnum()}
+        hits = {position for position, word in enumerate(lowered) if word in terms}
+        hits.update(position for term in terms for position in parts.get(term, ()))
+        hits = sorted(hits)
+        # The first window [start, start + size) with the most hits starts at 0
+        # or where a hit enters it, so only those starts need counting
+        starts = [0] + [word - size + 1 for word in hits if 0 < word - size + 1 <= len(words) - size]
+        start = max(starts, key=lambda start: (bisect_left(hits, start + size) - bisect_left(hits, start), -start))
+        snippet = ' '.join(words[start:start + size])
+        if start > 0:
+            snippet = '... ' + snippet
+        if start + size < len(words):
+            snippet = snippet + ' ...'
+        return snippet
+
+    @staticmethod
+    def _word_parts(content):
+        """
+        Split ``content`` into lowercased words for matching query terms. A
+        word is a snippet hit when one of its alphanumeric parts, the runs of
+        ``[0-9a-z]``, is a term; a plain alphanumeric word is its own only
+        part. Returns the words and, for the other words only, a mapping of
+        each part to the positions of the words holding it.
+        """
+        lowered = content.lower().split()
+        parts = {}
+        for position, word in enumerate(lowered):
+            if not (word.isalnum() and word.isascii()):
+                for part in WORD_PART.findall(word):
+                    parts.setdefault(part, []).append(position)
+        return lowered, parts
+
     def get_document_count(self, cdp):
         """Get the number of indexed documents for a CDP."""
-        if cdp in self.doc_vectors:
-            return len(self.doc_vectors[cdp])
+        doc_vectors = self._state.doc_vectors
+        if cdp in doc_vectors:
+            return doc_vectors[cdp].n_docs
         return 0
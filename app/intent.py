@@ -0,0 +1,66 @@
+import re
+from collections import namedtuple
+
+QuestionIntent = namedtuple('QuestionIntent', ['cdps', 'is_comparison', 'is_how_to'])
+QuestionIntent.__doc__ = """
+What a question asks for: the CDPs it mentions (in registry order, empty when
+it is not about any CDP) and whether it asks for a comparison or a how-to.
+"""
+
+COMPARISON_KEYWORDS = ['compare', 'compared', 'compares', 'comparing', 'comparison', 'comparisons',
+                       'versus', 'vs', 'difference', 'differences', 'better', 'between']
+
+# Every pattern starts at a word boundary; the compiled alternation adds the \b
+HOW_TO_PATTERNS = [
+    r"^how (?:do|can|to|would|should) (?:i|you|we)\b",
+    r"^what(?: is|'s) the (?:best way|way) to\b",
+    r"^what are the steps to\b",
+    r"steps (?:for|to)\b",
+    r"guide (?:for|to)\b",
+    r"tutorial (?:for|on)\b",
+    r"process (?:of|for)\b",
+    r"procedure (?:for|to)\b"
+]
+
+COMPARISON = object()
+
+
+class IntentAnalyzer:
+    """
+    Single-pass intent and entity detection for questions.
+
+    CDP keywords, comparison keywords and how-to phrases are compiled once into
+    one alternation, so a question is lowercased once and scanned once.
+    Keywords only match whole words: "vs" does not match inside "dvs".
+    How-to phrases are tried first at each position; none of them contains a
+    keyword, so no keyword is hidden by a how-to match.
+    """
+
+    def __init__(self, cdps):
+        """``cdps`` maps each CDP name to the keywords that identify it."""
+        self.cdps = list(cdps)
+        self._categories = {keyword: COMPARISON for keyword in COMPARISON_KEYWORDS}
+        for cdp, keywords in cdps.items():
+            for keyword in keywords:
+                self._categories[keyword.lower()] = cdp
+
+        # Longest keywords first so "segment.com" wins over "segment"
+        keywords = sorted(self._categories, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(?:(?P<how_to>{})|(?P<keyword>{})\b)".format(
+            '|'.join(HOW_TO_PATTERNS), '|'.join(re.escape(keyword) for keyword in keywords)))
+
+    def analyze(self, question):
+        """Return the QuestionIntent of ``question``."""
+        mentioned = set()
+        is_comparison = is_how_to = False
+        for match in self._pattern.finditer(question.lower()):
+            if match.lastgroup == 'how_to':
+                is_how_to = True
+            else:
+                category = self._categories[match.group()]
+                if category is COMPARISON:
+                    is_comparison = True
+                else:
+                    mentioned.add(category)
+
+        return QuestionIntent([cdp for cdp in self.cdps if cdp in mentioned], is_comparison, is_how_to)
@@ -0,0 +1,251 @@
+import bisect
+import math
+import threading
+import time
+from functools import wraps
+
+# Latency buckets in seconds: 100µs up to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with a fixed set of label names.
+
+    Label values are passed positionally, in ``labelnames`` order, which keeps
+    an increment down to a dict update under a lock.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Cumulative histogram of observations, e.g. latencies in seconds.
+
+    Each label combination keeps per-bucket counts, the sum and the count;
+    an observation is a bisect and three increments under a lock.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                # Bucket counts, then the sum and the count
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def observe_many(self, observations):
+        """Record ``(value, labelvalues)`` pairs under a single lock acquisition."""
+        indexes = [bisect.bisect_left(self.buckets, value) for value, _ in observations]
+        with self._lock:
+            for index, (value, labelvalues) in zip(indexes, observations):
+                series = self._values.get(labelvalues)
+                if series is None:
+                    series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+                series[index] += 1
+                series[-2] += value
+                series[-1] += 1
+
+    def time(self, *labelvalues):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, labelvalues)
+
+    def timed(self, *labelvalues):
+        """Decorator observing the seconds spent in each call."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labelvalues)
+            return wrapper
+        return decorator
+
+    def count(self, *labelvalues):
+        with self._lock:
+            series = self._values.get(labelvalues)
+            return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            values = {labelvalues: list(series) for labelvalues, series in self._values.items()}
+        for labelvalues, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, ('le', _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class StageTimer:
+    """
+    Time consecutive stages of one operation: each ``mark(stage)`` ends a
+    stage begun at the previous mark (or creation). ``finish()`` records all
+    stages into ``histogram`` at once, labelled with ``labelvalues`` followed
+    by the stage name, and returns the total seconds.
+    """
+
+    __slots__ = ('histogram', 'labelvalues', 'start', 'last', 'stages')
+
+    def __init__(self, histogram, *labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+        self.stages = []
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((now - self.last, self.labelvalues + (stage,)))
+        self.last = now
+
+    def finish(self):
+        self.histogram.observe_many(self.stages)
+        return self.last - self.start
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Collectors are callables run at render time for values that already live
+    elsewhere (cache statistics, index sizes); each returns
+    ``(name, type, documentation, [(labels dict, value), ...])`` tuples.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics of this process; every server worker process keeps its own
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'cdp_http_request_duration_seconds', 'HTTP request latency, until the response body is sent.',
+    ['route', 'method', 'status'])
+CHAT_STAGE_SECONDS = REGISTRY.histogram(
+    'cdp_chat_stage_duration_seconds', 'Time spent in intent detection and response formatting.', ['stage'])
+SEARCH_SECONDS = REGISTRY.histogram(
+    'cdp_search_duration_seconds', 'Index search latency per CDP ("multi" for search_many).',
+    ['operation', 'cdp'])
+SEARCH_STAGE_SECONDS = REGISTRY.histogram(
+    'cdp_search_stage_duration_seconds', 'Time spent in each stage of an index search.', ['operation', 'stage'])
+SEARCH_QUERIES = REGISTRY.counter(
+    'cdp_search_queries_total', 'Queries searched per CDP, by whether any passage was returned.',
+    ['cdp', 'outcome'])
+FILTERED_RESULTS = REGISTRY.counter(
+    'cdp_search_threshold_filtered_total', 'Matching passages left out of the top-k by the minimum score.',
+    ['cdp'])
+ERRORS = REGISTRY.counter(
+    'cdp_errors_total', 'Errors caught and answered with a generic message.', ['component'])
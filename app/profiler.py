@@ -0,0 +1,148 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Frames shown per stack in the log summary of a slow request
+SUMMARY_FRAMES = 5
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name})"
+
+
+def _collapse(frame):
+    """Return the stack ending at ``frame`` as 'outer;...;inner' (the folded flame graph format)."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for requests slower than ``threshold`` seconds.
+
+    While at least one request is being profiled, a background thread
+    samples the stack of every profiled thread each ``interval`` seconds;
+    nothing is sampled between requests. A request that turns out slow is
+    logged with its hottest stacks and its samples are written to
+    ``output_dir`` in the folded format read by flamegraph.pl and speedscope.
+    Only the newest ``keep`` profiles are kept.
+    """
+
+    def __init__(self, threshold, interval=0.005, output_dir=None, keep=50):
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = Path(output_dir) if output_dir else Path(__file__).parent.parent / 'data' / 'profiles'
+        self.keep = keep
+        # Thread id -> stack sample counts of the request running on it
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the block run on the current thread as the request ``name``."""
+        samples = self.start()
+        try:
+            yield
+        finally:
+            self.finish(name, samples)
+
+    def start(self):
+        """Start sampling the current thread; pass the result to finish()."""
+        samples = Counter()
+        samples.started = time.perf_counter()
+        with self._lock:
+            self._active[threading.get_ident()] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name='cdp-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return samples
+
+    def finish(self, name, samples):
+        """Stop sampling the current thread and report the request if it was slow."""
+        elapsed = time.perf_counter() - samples.started
+        with self._lock:
+            if self._active.get(threading.get_ident()) is samples:
+                del self._active[threading.get_ident()]
+        if elapsed >= self.threshold:
+            try:
+                self._report(name, elapsed, samples)
+            except Exception as e:
+                logger.warning(f"Could not save the profile of a slow request: {str(e)}")
+
+    def _sample(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, samples in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != me:
+                    samples[_collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _report(self, name, elapsed, samples):
+        total = sum(samples.values())
+        if not total:
+            logger.warning(f"Slow request {name}: {elapsed * 1000:.0f} ms (no samples)")
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_')
+        path = self.output_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{safe_name}.folded"
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # The innermost frames of the most sampled stacks show where the time went
+        hottest = '; '.join(f"{count * 100 // total}% {' < '.join(reversed(stack.split(';')[-SUMMARY_FRAMES:]))}"
+                            for stack, count in samples.most_common(3))
+        logger.warning(f"Slow request {name}: {elapsed * 1000:.0f} ms, {total} samples in {path.name}; {hottest}")
+
+        profiles = sorted(self.output_dir.glob('*.folded'))
+        for old in profiles[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+
+def _create_profiler():
+    """
+    Build the profiler configured by the environment: CDP_PROFILE_SLOW_MS
+    enables it for requests at least that slow, CDP_PROFILE_INTERVAL_MS sets
+    the sampling interval (default 5) and CDP_PROFILE_DIR where profiles go.
+    """
+    threshold = float(os.environ.get('CDP_PROFILE_SLOW_MS', 0))
+    if threshold <= 0:
+        return None
+    return SlowRequestProfiler(threshold / 1000,
+                               interval=float(os.environ.get('CDP_PROFILE_INTERVAL_MS', 5)) / 1000,
+                               output_dir=os.environ.get('CDP_PROFILE_DIR'))
+
+
+# Slow request profiler of this process, None unless CDP_PROFILE_SLOW_MS is set
+profiler = _create_profiler()
+
+
+def profile_request(name):
+    """Context manager profiling the block as request ``name`` when profiling is enabled."""
+    return profiler.profile(name) if profiler is not None else nullcontext()
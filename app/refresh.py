@@ -0,0 +1,219 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.chatbot import get_chatbot
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process crawls on its own schedule
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MODES = ('serial', 'concurrent', 'recursive')
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds')
+
+
+class RefreshScheduler:
+    """
+    Background worker that re-crawls the documentation every ``interval``
+    seconds and hot-reloads changed CDPs into the live indexer.
+
+    Each CDP is reindexed as soon as its crawl saved new sections. The
+    reindex is incremental and the new index is swapped in atomically, so
+    searches are served from the previous index in the meantime. The
+    'recursive' mode parses HTML in a process pool, so request threads do not
+    compete with the parser for the GIL.
+
+    With several server workers on a host, a lock file lets one of them crawl
+    per interval; every worker reloads the section files that changed on disk.
+    """
+
+    def __init__(self, scraper, get_indexer, interval, mode='recursive', lock_path=None):
+        if mode not in REFRESH_MODES:
+            raise ValueError(f"Unknown refresh mode: {mode}")
+        self.scraper = scraper
+        # Called on each refresh so the index can still be loading when the scheduler starts
+        self.get_indexer = get_indexer
+        self.interval = interval
+        self.mode = mode
+        self.lock_path = Path(lock_path) if lock_path else Path(scraper.manifest_path) / 'refresh.lock'
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._forced = False
+        self.stats = {
+            'runs': 0,
+            'failures': 0,
+            'running': False,
+            'progress': None,
+            'next_refresh': None,
+            'last_refresh': None
+        }
+
+    def start(self):
+        """Start the background thread; the first refresh runs after one interval."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cdp-refresh', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """Run a refresh now instead of at the next interval, crawling even if another process just did."""
+        self._forced = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._update(next_refresh=_timestamp(time.time() + self.interval))
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._stop.is_set():
+                forced, self._forced = self._forced, False
+                self.run_once(force=forced)
+
+    def _update(self, **fields):
+        with self._lock:
+            self.stats.update(fields)
+
+    def run_once(self, force=False):
+        """
+        Crawl (unless another process on the host is crawling or, without
+        ``force``, just did) and reload every CDP whose section file changed.
+        Returns the refresh record, or None if a refresh is already running.
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+
+        start = time.time()
+        refresh = {'started': _timestamp(start), 'crawled': False, 'saved': [], 'reloaded': [], 'error': None}
+        self._update(running=True, next_refresh=None,
+                     progress={'crawled': 0, 'total': len(self.scraper.cdp_configs), 'reloaded': []})
+        try:
+            indexer = self.get_indexer()
+            with self._crawl_lock(force) as crawling:
+                if crawling:
+                    refresh['crawled'] = True
+                    refresh['saved'] = self.scraper.update_all_documentation(
+                        concurrent=self.mode != 'serial', recursive=self.mode == 'recursive',
+                        on_update=lambda cdp, saved: self._crawled(indexer, cdp, saved))
+
+            # Also picks up section files written by another process's crawl
+            for cdp in list(indexer.state.doc_contents):
+                self._reload(indexer, cdp)
+        except Exception as e:
+            logger.error(f"Documentation refresh failed: {str(e)}")
+            refresh['error'] = str(e)
+        finally:
+            with self._lock:
+                refresh['reloaded'] = self.stats['progress']['reloaded']
+                refresh['finished'] = _timestamp(time.time())
+                refresh['seconds'] = round(time.time() - start, 3)
+                self.stats['runs'] += 1
+                self.stats['failures'] += refresh['error'] is not None
+                self.stats.update(running=False, progress=None, last_refresh=refresh)
+            self._running.release()
+
+        logger.info(f"Documentation refresh finished in {refresh['seconds']:.1f}s, "
+                    f"reloaded: {', '.join(refresh['reloaded']) or 'none'}")
+        return refresh
+
+    def _crawled(self, indexer, cdp, saved):
+        with self._lock:
+            self.stats['progress']['crawled'] += 1
+        if saved:
+            self._reload(indexer, cdp)
+
+    def _reload(self, indexer, cdp):
+        try:
+            reloaded = indexer.reload_documents(cdp)
+        except Exception:
+            # Logged by the indexer; the current index keeps serving
+            return
+        if reloaded:
+            with self._lock:
+                self.stats['progress']['reloaded'].append(cdp)
+
+    @contextmanager
+    def _crawl_lock(self, force=False):
+        """
+        Yield whether this process should crawl: no other process on the host is
+        crawling and, unless ``force``, none finished a crawl within the last
+        half interval.
+        """
+        if fcntl is None:
+            yield True
+            return
+
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+', encoding='utf-8') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                # The lock file holds the time the last crawl finished
+                f.seek(0)
+                last_crawl = float(f.read().strip() or 0)
+                if not force and time.time() - last_crawl < self.interval / 2:
+                    yield False
+                    return
+                yield True
+                f.truncate(0)
+                f.write(str(time.time()))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_stats(self):
+        """Return the schedule, progress of a running refresh and the last refresh."""
+        with self._lock:
+            stats = {**self.stats, 'enabled': True, 'interval': self.interval, 'mode': self.mode}
+            if stats['progress'] is not None:
+                stats['progress'] = {**stats['progress'], 'reloaded': list(stats['progress']['reloaded'])}
+            return stats
+
+
+# Refresh scheduler of this process, started by start_scheduler()
+_scheduler = None
+
+
+def start_scheduler():
+    """
+    Start this process's refresh scheduler if CDP_REFRESH_INTERVAL (seconds)
+    is set. CDP_REFRESH_MODE picks the crawl: 'recursive' (default),
+    'concurrent' or 'serial'. Returns the scheduler, or None when disabled.
+
+    Call it in each serving process after any fork, since the thread does not
+    survive one.
+    """
+    global _scheduler
+    interval = float(os.environ.get('CDP_REFRESH_INTERVAL', 0))
+    if _scheduler is None and interval > 0:
+        from app.scraper import scraper
+
+        _scheduler = RefreshScheduler(scraper, lambda: get_chatbot().indexer, interval,
+                                      os.environ.get('CDP_REFRESH_MODE', 'recursive').lower()).start()
+    return _scheduler
+
+
+def get_scheduler():
+    """Return this process's refresh scheduler, or None when it is not running."""
+    return _scheduler
@@ -0,0 +1,55 @@
+import json
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+# Registry read when neither a path nor CDP_REGISTRY is given
+DEFAULT_REGISTRY = Path(__file__).parent.parent / 'data' / 'cdps.json'
+
+# Platform names are used in section file names and metric labels
+NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+SELECTOR_NAMES = ('content', 'title', 'sections')
+
+Platform = namedtuple('Platform', ['name', 'title', 'keywords', 'base_url', 'selectors'])
+Platform.__doc__ = """
+One CDP the chatbot answers questions about: its ``name`` (used for section
+files and in the index), display ``title``, the ``keywords`` that identify
+it in a question, and where and how the scraper reads its documentation.
+"""
+
+
+def load_registry(path=None):
+    """
+    Read the platform registry, a JSON file with a ``platforms`` list.
+
+    ``path`` defaults to CDP_REGISTRY, then data/cdps.json. Platforms keep
+    their file order, which is the order CDPs are indexed and answered in.
+    Raises ValueError when an entry is incomplete or a name is repeated.
+    """
+    path = Path(path or os.environ.get('CDP_REGISTRY') or DEFAULT_REGISTRY)
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)['platforms']
+
+    platforms = []
+    for entry in entries:
+        name = entry.get('name', '')
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid platform name in {path}: {name!r}")
+        if any(platform.name == name for platform in platforms):
+            raise ValueError(f"Platform {name} is registered twice in {path}")
+        selectors = entry.get('selectors', {})
+        missing = [selector for selector in SELECTOR_NAMES if selector not in selectors]
+        if not entry.get('base_url') or missing:
+            raise ValueError(f"Platform {name} in {path} needs a base_url and the selectors "
+                             f"{', '.join(SELECTOR_NAMES)}")
+
+        platforms.append(Platform(
+            name=name,
+            title=entry.get('title', name.capitalize()),
+            keywords=[keyword.lower() for keyword in entry.get('keywords', [name])],
+            base_url=entry['base_url'],
+            selectors=dict(selectors)
+        ))
+    return platforms
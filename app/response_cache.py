@@ -0,0 +1,190 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question):
+    """Normalize a question into a cache key: lowercase with collapsed whitespace."""
+    return ' '.join(question.lower().split())
+
+
+class SQLiteCacheBackend:
+    """
+    Response store shared by every worker on a host, backed by a SQLite file.
+
+    Each process opens its own connection; SQLite handles the locking.
+    """
+
+    # Trim the table once every this many writes
+    TRIM_INTERVAL = 100
+
+    def __init__(self, path, max_entries=10000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, version TEXT, value TEXT, expires REAL)"
+            )
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, version):
+        """Return the stored value, or None if it is missing, stale or expired."""
+        row = self._connection().execute(
+            "SELECT value FROM responses WHERE key = ? AND version = ? AND expires > ?",
+            (key, version, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, version, value, ttl):
+        """Store a value, periodically trimming the table back to ``max_entries``."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, version, value, expires) VALUES (?, ?, ?, ?)",
+                (key, version, json.dumps(value), time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.TRIM_INTERVAL == 0:
+                conn.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY expires DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+
+    def clear(self):
+        """Remove every stored value."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    """
+    Bounded in-process LRU cache of chatbot responses with a TTL.
+
+    Every entry records the index version it was computed against; once the
+    index version changes, older entries are dropped. An optional shared
+    backend (see SQLiteCacheBackend) lets workers reuse each other's answers.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _check_version(self, version):
+        """
+        Drop all local entries when lookups move to a new index version.
+        Caller holds the lock.
+        """
+        if version != self._version:
+            if self._entries:
+                self.stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+            self._version = version
+
+    def get(self, question, version):
+        """Return the cached response for ``question`` at ``version``, or None."""
+        if not self.enabled:
+            return None
+
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self.stats['expirations'] += 1
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key, version)
+            except Exception as e:
+                logger.warning(f"Shared response cache lookup failed: {str(e)}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.stats['shared_hits'] += 1
+                    self._store(key, version, value)
+                return value
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, question, version, value):
+        """Cache ``value`` as the response to ``question`` at ``version``."""
+        if not self.enabled:
+            return
+
+        key = normalize_question(question)
+        with self._lock:
+            self._store(key, version, value)
+            if version != self._version:
+                return
+
+        if self.backend is not None:
+            try:
+                self.backend.set(key, version, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared response cache write failed: {str(e)}")
+
+    def _store(self, key, version, value):
+        """Insert into the local LRU, evicting the oldest entries. Caller holds the lock."""
+        # A response computed against an index that has since been replaced is stale
+        if version != self._version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get_stats(self):
+        """Return the hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {**self.stats, 'size': len(self._entries), 'max_entries': self.max_entries}
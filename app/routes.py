@@ -1,10 +1,64 @@
-from flask import Blueprint, render_template, request, jsonify
-from app.chatbot import process_question
+from flask import Blueprint, Response, render_template, request, jsonify
+from app.chatbot import get_chatbot, is_ready, process_question, process_questions, stream_question
+from app.metrics import REGISTRY
+from app.refresh import get_scheduler
+import hmac
+import json
 import logging
+import os
 
 main_bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+# Maximum number of questions accepted by /api/chat/batch
+MAX_BATCH_QUESTIONS = 1000
+
+def question_from_json(data):
+    """
+    Return the stripped question of a chat request body, or raise ValueError
+    with the message to send back to the client.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('question'), str):
+        raise ValueError('Missing question parameter')
+
+    question = data['question'].strip()
+    if not question:
+        raise ValueError('Question cannot be empty')
+    return question
+
+def readiness():
+    """
+    Return the readiness payload and HTTP status: 200 once the index is loaded,
+    503 while it is still being built or failed to load.
+    """
+    if not is_ready():
+        return {'status': 'starting', 'service': 'cdp-chatbot'}, 503
+
+    state = get_chatbot().indexer.state
+    return {
+        'status': 'ready',
+        'service': 'cdp-chatbot',
+        'index_version': state.version,
+        'documents': {cdp: index.n_docs for cdp, index in state.doc_vectors.items()}
+    }, 200
+
+def admin_allowed():
+    """
+    Admin endpoints need ``Authorization: Bearer $CDP_ADMIN_TOKEN`` and are
+    closed when no token is configured. CDP_ADMIN_ALLOW_LOCAL=1 opens them to
+    local clients instead, for development only: behind a reverse proxy on the
+    same host every request comes from a local address.
+    """
+    token = os.environ.get('CDP_ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    if os.environ.get('CDP_ADMIN_ALLOW_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        return request.remote_addr in ('127.0.0.1', '::1')
+    return False
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
 @main_bp.route('/')
 def index():
     """Serve the main chatbot interface."""
@@ -14,18 +68,11 @@ def index():
 def chat():
     """Handle chat API requests."""
     try:
-        data = request.get_json()
-        
-        if not data or 'question' not in data:
-            return jsonify({
-                'error': 'Missing question parameter'
-            }), 400
-
-        question = data['question'].strip()
-        
-        if not question:
+        try:
+            question = question_from_json(request.get_json())
+        except ValueError as e:
             return jsonify({
-                'error': 'Question cannot be empty'
+                'error': str(e)
             }), 400
 
         # Process the question and get response
@@ -42,10 +89,141 @@ def chat():
             'error': 'An error occurred while processing your request'
         }), 500
 
+def sse_event(data, event=None):
+    """Encode ``data`` as one Server-Sent Event, JSON so newlines survive."""
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@main_bp.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Handle chat API requests, streaming the response as Server-Sent Events.
+
+    Each ``message`` event carries a ``chunk`` of the response; comparison
+    answers arrive one CDP at a time. A ``done`` event ends the stream.
+    /api/chat remains the non-streaming equivalent.
+    """
+    try:
+        try:
+            question = question_from_json(request.get_json())
+        except ValueError as e:
+            return jsonify({
+                'error': str(e)
+            }), 400
+
+        def generate():
+            try:
+                for chunk in stream_question(question):
+                    yield sse_event({'chunk': chunk})
+                yield sse_event({'success': True}, event='done')
+            except Exception as e:
+                logger.error(f"Error streaming chat response: {str(e)}")
+                yield sse_event({'error': 'An error occurred while processing your request'}, event='error')
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+        })
+
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}")
+        return jsonify({
+            'error': 'An error occurred while processing your request'
+        }), 500
+
+@main_bp.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Handle batched chat API requests, returning responses in order."""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+            return jsonify({
+                'error': 'Missing questions parameter'
+            }), 400
+
+        questions = data['questions']
+
+        if not questions:
+            return jsonify({
+                'error': 'Questions cannot be empty'
+            }), 400
+
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return jsonify({
+                'error': f'At most {MAX_BATCH_QUESTIONS} questions are allowed per batch'
+            }), 400
+
+        if not all(isinstance(question, str) and question.strip() for question in questions):
+            return jsonify({
+                'error': 'Each question must be a non-empty string'
+            }), 400
+
+        # Process the questions and get responses
+        responses = process_questions([question.strip() for question in questions])
+
+        return jsonify({
+            'success': True,
+            'responses': responses
+        })
+
+    except Exception as e:
+        logger.error(f"Error processing batch chat request: {str(e)}")
+        return jsonify({
+            'error': 'An error occurred while processing your request'
+        }), 500
+
 @main_bp.route('/api/health')
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint: the process is up, whether or not the index is loaded."""
     return jsonify({
         'status': 'healthy',
         'service': 'cdp-chatbot'
     })
+
+@main_bp.route('/api/ready')
+def ready_check():
+    """Readiness endpoint: 200 only once the index is loaded and searches can be served."""
+    payload, status = readiness()
+    return jsonify(payload), status
+
+@main_bp.route('/api/admin/refresh', methods=['GET', 'POST'])
+def admin_refresh():
+    """
+    Documentation refresh status: schedule, progress of a running refresh and
+    the last refresh. POST starts a refresh now.
+    """
+    if not admin_allowed():
+        return jsonify({
+            'error': 'Forbidden'
+        }), 403
+
+    scheduler = get_scheduler()
+    if scheduler is None:
+        if request.method == 'POST':
+            return jsonify({
+                'error': 'The refresh scheduler is not running; set CDP_REFRESH_INTERVAL to enable it'
+            }), 409
+        return jsonify({'enabled': False})
+
+    if request.method == 'POST':
+        scheduler.trigger()
+        return jsonify(scheduler.get_stats()), 202
+
+    stats = scheduler.get_stats()
+    stats['index_version'] = get_chatbot().indexer.version if is_ready() else None
+    return jsonify(stats)
+
+@main_bp.route('/metrics')
+def metrics():
+    """
+    Prometheus metrics of this worker process: request, search and stage
+    latency histograms, result and error counters, response cache and index
+    gauges. Protected like the admin endpoints.
+    """
+    if not admin_allowed():
+        return jsonify({
+            'error': 'Forbidden'
+        }), 403
+
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
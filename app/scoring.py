@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class TfidfScoring:
+    """
+    Cosine similarity between TF-IDF vectors, the original ranking.
+
+    Posting weights are divided by the document norm at build time and the
+    query vector is normalized, so a document's score is a plain dot product.
+    """
+
+    name = 'tfidf'
+    # Documents scoring at or below this cosine similarity are not returned
+    min_score = 0.1
+
+    def options(self):
+        """Settings that change posting weights; part of the snapshot key."""
+        return {'name': self.name}
+
+    def idf(self, doc_freq, n_docs):
+        """Smoothed inverse document frequency."""
+        return np.log(n_docs / (doc_freq + 1)) + 1
+
+    def posting_weights(self, index, terms, idf, avg_doc_length):
+        """Compute L2-normalized TF-IDF weights for every posting of ``index``."""
+        weights = index.tf * idf[terms]
+        norms = np.sqrt(np.bincount(index.doc_ids, weights=weights * weights, minlength=index.n_docs))
+        norms[norms == 0] = 1.0
+        return weights / norms[index.doc_ids]
+
+    def query_weights(self, query_tf, idf):
+        """Normalized TF-IDF weights of the query terms."""
+        weights = query_tf * idf
+        norm = np.linalg.norm(weights)
+        return weights / norm if norm > 0 else weights
+
+
+class BM25Scoring:
+    """
+    Okapi BM25.
+
+    The length-normalized term weight of every posting is precomputed from
+    the document lengths and the corpus average, so a query is still a sum of
+    posting weights, scaled by how often each term appears in the query.
+    """
+
+    name = 'bm25'
+    # BM25 scores are unbounded; any document matching a query term qualifies
+    min_score = 0.0
+
+    def __init__(self, k1=1.2, b=0.75):
+        if k1 < 0 or not 0 <= b <= 1:
+            raise ValueError("BM25 needs k1 >= 0 and 0 <= b <= 1")
+        self.k1 = k1
+        self.b = b
+
+    def options(self):
+        return {'name': self.name, 'k1': self.k1, 'b': self.b}
+
+    def idf(self, doc_freq, n_docs):
+        """BM25 inverse document frequency, kept positive for very common terms."""
+        return np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def posting_weights(self, index, terms, idf, avg_doc_length):
+        """Compute ``idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))`` per posting."""
+        doc_lengths = np.bincount(index.doc_ids, weights=index.tf, minlength=index.n_docs)
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / (avg_doc_length or 1.0))
+        return idf[terms] * index.tf * (self.k1 + 1) / (index.tf + length_norm[index.doc_ids])
+
+    def query_weights(self, query_tf, idf):
+        """Query term counts; the IDF is already part of the posting weights."""
+        return query_tf.astype(np.float64)
+
+
+SCORING_MODES = {
+    'tfidf': TfidfScoring,
+    'bm25': BM25Scoring
+}
+
+
+def create_scoring(name='tfidf', **params):
+    """Create the scoring mode called ``name`` with its tuning ``params``."""
+    if name not in SCORING_MODES:
+        raise ValueError(f"Unknown scoring mode: {name}")
+    return SCORING_MODES[name](**params)
@@ -1,70 +1,133 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import logging
+import hashlib
 import json
+import multiprocessing
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from pathlib import Path
 import time
 from urllib.parse import urljoin, urlparse
 
+from app.crawl_frontier import CrawlFrontier, parse_sitemap
+from app.doc_store import SectionWriter
+from app.registry import load_registry
+
 logger = logging.getLogger(__name__)
 
+class HostRateLimiter:
+    """
+    Politeness limits applied per host: at most ``max_concurrency`` requests in
+    flight and request starts spaced at least ``1 / requests_per_second`` apart.
+    """
+
+    def __init__(self, max_concurrency=2, requests_per_second=2.0):
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = {
+                    'semaphore': threading.BoundedSemaphore(self.max_concurrency),
+                    'lock': threading.Lock(),
+                    'next_slot': 0.0
+                }
+            return self._hosts[host]
+
+    @contextmanager
+    def limit(self, url):
+        """Hold one of the host's request slots for the duration of the block."""
+        state = self._host_state(urlparse(url).netloc)
+        with state['semaphore']:
+            if self.requests_per_second > 0:
+                with state['lock']:
+                    now = time.monotonic()
+                    slot = max(now, state['next_slot'])
+                    state['next_slot'] = slot + 1 / self.requests_per_second
+                if slot > now:
+                    time.sleep(slot - now)
+            yield
+
 class DocumentScraper:
-    def __init__(self):
+    def __init__(self, max_workers=8, per_host_concurrency=2, requests_per_second=2.0, platforms=None):
         self.docs_path = Path(__file__).parent.parent / 'data' / 'docs'
+        # Write sections as gzipped JSONL
+        self.compress_docs = False
+        # Per-URL ETag / Last-Modified / content hash manifests from previous crawls
+        self.manifest_path = Path(__file__).parent.parent / 'data' / 'crawl'
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+
+        # Pause between pages in the serial crawl
+        self.request_delay = 1
+        # Retry backoff: base * 2**attempt seconds, capped, with jitter
+        self.backoff_base = 1.0
+        self.backoff_max = 30.0
+
+        # Concurrent crawl settings
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(per_host_concurrency, requests_per_second)
+        self.crawl_stats = {}
+        self.last_changes = {}
+
+        # Recursive crawl settings
+        self.max_depth = 3
+        self.max_pages = 500
+        self.use_sitemap = False
+        # Processes parsing HTML during a recursive crawl; 0 parses on the fetch threads
+        self.parse_workers = os.cpu_count() or 1
+        # Changed pages a crawl parses on its fetch threads before it hands
+        # parsing to the processes; starting one costs about half a second
+        self.parse_pool_min_pages = 50
+
+        # Pooled session so connections to each host are reused
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Where and how each platform's documentation is crawled, from the registry
         self.cdp_configs = {
-            'segment': {
-                'base_url': 'https://segment.com/docs/',
-                'selectors': {
-                    'content': 'article',
-                    'title': 'h1',
-                    'sections': '.content-body'
-                }
-            },
-            'mparticle': {
-                'base_url': 'https://docs.mparticle.com/',
-                'selectors': {
-                    'content': 'article',
-                    'title': 'h1',
-                    'sections': '.content'
-                }
-            },
-            'lytics': {
-                'base_url': 'https://docs.lytics.com/',
-                'selectors': {
-                    'content': 'article',
-                    'title': 'h1',
-                    'sections': '.content'
-                }
-            },
-            'zeotap': {
-                'base_url': 'https://docs.zeotap.com/',
-                'selectors': {
-                    'content': 'article',
-                    'title': 'h1',
-                    'sections': '.content'
-                }
-            }
+            platform.name: {'base_url': platform.base_url, 'selectors': platform.selectors}
+            for platform in (platforms if platforms is not None else load_registry())
         }
 
-    def _make_request(self, url, retry_count=3):
+    def _make_request(self, url, retry_count=3, headers=None):
         """
         Make an HTTP request with retry logic.
         """
         for attempt in range(retry_count):
             try:
-                response = requests.get(url, headers=self.headers, timeout=10)
+                with self.rate_limiter.limit(url):
+                    response = self.session.get(url, timeout=10, headers=headers)
                 response.raise_for_status()
                 return response
             except requests.RequestException as e:
                 if attempt == retry_count - 1:
                     logger.error(f"Failed to fetch {url}: {str(e)}")
                     raise
-                time.sleep(1 * (attempt + 1))  # Exponential backoff
+                time.sleep(self._backoff_delay(attempt))
+
+    def _backoff_delay(self, attempt):
+        """
+        Exponential backoff with jitter for the given retry attempt.
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
 
-    def _clean_text(self, text):
+    @staticmethod
+    def _clean_text(text):
         """
         Clean and normalize text content.
         """
@@ -80,7 +143,8 @@ class DocumentScraper:
         
         return text.strip()
 
-    def _extract_content(self, soup, selectors):
+    @staticmethod
+    def _extract_content(soup, selectors):
         """
         Extract content from a BeautifulSoup object using provided selectors.
         """
@@ -93,14 +157,14 @@ class DocumentScraper:
 
         # Extract title
         title = content_area.select_one(selectors['title'])
-        title_text = self._clean_text(title.get_text()) if title else "Untitled Section"
+        title_text = DocumentScraper._clean_text(title.get_text()) if title else "Untitled Section"
 
         # Extract content sections
         content_sections = content_area.select(selectors['sections'])
         
         if not content_sections:
             # If no sections found, treat entire content as one section
-            main_content = self._clean_text(content_area.get_text())
+            main_content = DocumentScraper._clean_text(content_area.get_text())
             if main_content:
                 sections.append({
                     "title": title_text,
@@ -110,8 +174,8 @@ class DocumentScraper:
             # Process each section
             for section in content_sections:
                 section_title = section.find('h2')
-                section_title = self._clean_text(section_title.get_text()) if section_title else title_text
-                section_content = self._clean_text(section.get_text())
+                section_title = DocumentScraper._clean_text(section_title.get_text()) if section_title else title_text
+                section_content = DocumentScraper._clean_text(section.get_text())
                 
                 if section_content:
                     sections.append({
@@ -163,73 +227,405 @@ class DocumentScraper:
                 logger.warning(f"No documentation links found for {cdp}")
                 return []
 
-            all_sections = []
+            manifest = self._load_manifest(cdp)
+            pages = []
             
             # Process each documentation page
             for link in doc_links:
-                try:
-                    response = self._make_request(link)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    sections = self._extract_content(soup, selectors)
-                    all_sections.extend(sections)
-                    
-                    # Be nice to the servers
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing {link}: {str(e)}")
-                    continue
+                pages.append(self._scrape_page(link, selectors, manifest.get(link)))
 
-            return all_sections
+                # Be nice to the servers
+                time.sleep(self.request_delay)
+
+            return self._collect_pages(cdp, doc_links, pages, manifest)
 
         except Exception as e:
             logger.error(f"Error scraping documentation for {cdp}: {str(e)}")
             raise
 
-    def save_documentation(self, cdp, sections):
+    def _scrape_page(self, link, selectors, previous=None):
         """
-        Save scraped documentation to a JSON file.
+        Fetch one documentation page and extract its sections.
+
+        ``previous`` is the page's manifest entry from the last crawl. It is used
+        to send a conditional request, and its sections are reused when the
+        server answers 304 or the body hash is unchanged, skipping the parse.
+        Returns ``(status, entry)`` where status is one of 'not_modified',
+        'unchanged', 'changed' or 'failed'.
+        """
+        status, entry, _ = self._fetch_page(link, previous, selectors)
+        return status, entry
+
+    def _fetch_page(self, link, previous=None, selectors=None):
+        """
+        Fetch one page for _scrape_page() or the recursive crawl.
+
+        Returns ``(status, entry, html)``. When the page changed and no
+        ``selectors`` are given, parsing is left to the caller: ``html`` holds
+        the body and ``entry`` has no sections yet. Otherwise ``html`` is None.
         """
+        headers = {}
+        if previous:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+
         try:
-            self.docs_path.mkdir(parents=True, exist_ok=True)
-            
-            output_file = self.docs_path / f"{cdp}_docs.json"
-            data = {
-                "platform": cdp,
-                "sections": sections
+            response = self._make_request(link, headers=headers)
+            if response.status_code == 304 and previous:
+                return 'not_modified', previous, None
+
+            content_hash = hashlib.sha1(response.content).hexdigest()
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash
             }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Entries from a flat crawl have no links; reparse those once
+            if previous and previous.get('content_hash') == content_hash and 'links' in previous:
+                return 'unchanged', {**entry, 'sections': previous['sections'], 'links': previous['links']}, None
+
+            if selectors is None:
+                return 'changed', entry, response.text
+
+            sections, links = parse_page(response.text, link, selectors)
+            return 'changed', {**entry, 'sections': sections, 'links': links}, None
+        except Exception as e:
+            logger.error(f"Error processing {link}: {str(e)}")
+            # Keep serving the last good copy of the page
+            return 'failed', previous, None
+
+    def _collect_pages(self, cdp, doc_links, pages, manifest):
+        """
+        Record which sections changed since the last crawl, persist the new
+        manifest and return a generator over the CDP's sections in page order.
+        """
+        new_manifest = {}
+        changed_sections = []
+        counts = {'not_modified': 0, 'unchanged': 0, 'changed': 0, 'failed': 0}
+        for link, (status, entry) in zip(doc_links, pages):
+            counts[status] += 1
+            if entry is None:
+                continue
+            new_manifest[link] = entry
+            if status == 'changed':
+                changed_sections.extend(entry['sections'])
+
+        removed = [link for link in manifest if link not in new_manifest]
+        self.last_changes[cdp] = {
+            **counts,
+            'removed': len(removed),
+            'changed_sections': changed_sections
+        }
+        logger.info(f"{cdp}: {counts['changed']} changed, {counts['not_modified'] + counts['unchanged']} "
+                    f"unchanged, {len(removed)} removed, {counts['failed']} failed pages")
+
+        self._save_manifest(cdp, new_manifest)
+        return (section for link in doc_links if link in new_manifest for section in new_manifest[link]['sections'])
+
+    def has_changes(self, cdp):
+        """
+        Whether the last crawl of ``cdp`` found changed, new or removed pages.
+        """
+        changes = self.last_changes.get(cdp)
+        return changes is None or bool(changes['changed'] or changes['removed'])
+
+    def _load_manifest(self, cdp):
+        """
+        Load the crawl manifest of a CDP, or an empty one.
+        """
+        path = self.manifest_path / f"{cdp}_manifest.json"
+        if not path.exists():
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable crawl manifest for {cdp}: {str(e)}")
+            return {}
+
+    def _save_manifest(self, cdp, manifest):
+        """
+        Persist the crawl manifest of a CDP.
+        """
+        try:
+            self.manifest_path.mkdir(parents=True, exist_ok=True)
+            path = self.manifest_path / f"{cdp}_manifest.json"
+            tmp_path = path.with_suffix('.json.tmp')
+            tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+            tmp_path.replace(path)
+        except Exception as e:
+            logger.warning(f"Could not save crawl manifest for {cdp}: {str(e)}")
+
+    def scrape_documentation_concurrent(self, cdp):
+        """
+        Scrape documentation for a specific CDP, fetching pages concurrently.
+        Politeness is enforced by the per-host rate limiter instead of a fixed sleep.
+        """
+        if cdp not in self.cdp_configs:
+            raise ValueError(f"Unsupported CDP: {cdp}")
+
+        config = self.cdp_configs[cdp]
+        selectors = config['selectors']
+        start = time.perf_counter()
+
+        try:
+            doc_links = self._get_doc_links(config['base_url'])
+            if not doc_links:
+                logger.warning(f"No documentation links found for {cdp}")
+                return []
+
+            manifest = self._load_manifest(cdp)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pages = list(pool.map(lambda link: self._scrape_page(link, selectors, manifest.get(link)),
+                                      doc_links))
+
+            elapsed = time.perf_counter() - start
+            self.crawl_stats[cdp] = {
+                'pages': len(doc_links),
+                'seconds': elapsed,
+                'pages_per_second': len(doc_links) / elapsed if elapsed > 0 else 0.0
+            }
+            logger.info(f"Crawled {len(doc_links)} {cdp} pages in {elapsed:.1f}s "
+                        f"({self.crawl_stats[cdp]['pages_per_second']:.1f} pages/s)")
+
+            return self._collect_pages(cdp, doc_links, pages, manifest)
+
+        except Exception as e:
+            logger.error(f"Error scraping documentation for {cdp}: {str(e)}")
+            raise
+
+    def _create_parse_pool(self):
+        """
+        Create the process pool that parses crawled pages. Workers are spawned
+        rather than forked: crawls run from multithreaded servers, where a
+        forked child can deadlock on a lock another thread held at fork time.
+        They are started as pages are submitted, not when the pool is created.
+        """
+        return ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def crawl_documentation(self, cdp, parse_pool=None):
+        """
+        Crawl documentation for a specific CDP recursively.
+
+        Pages are discovered breadth-first from the base URL (and sitemap.xml
+        with ``use_sitemap``) up to ``max_depth`` links away and ``max_pages``
+        pages in total. Fetching runs on a thread pool. The first
+        ``parse_pool_min_pages`` changed pages are parsed on the fetch threads;
+        beyond that pages are parsed in a process pool, so both overlap, and
+        small crawls never pay for starting one. At most ``2 * parse_workers``
+        pages wait for parsing; fetching pauses while that queue is full.
+        ``parse_pool`` lets several crawls share one process pool.
+        """
+        if cdp not in self.cdp_configs:
+            raise ValueError(f"Unsupported CDP: {cdp}")
+
+        config = self.cdp_configs[cdp]
+        selectors = config['selectors']
+        start = time.perf_counter()
+
+        frontier = CrawlFrontier(config['base_url'], self.max_depth, self.max_pages)
+        frontier.add(config['base_url'], 0)
+        if self.use_sitemap:
+            frontier.add_links(self._get_sitemap_links(config['base_url']), 1)
+
+        # The process pool parsing this crawl's pages, once it found enough changed ones
+        pool = None
+        owns_pool = False
+        max_parsing = 2 * self.parse_workers
+
+        try:
+            manifest = self._load_manifest(cdp)
+            doc_links = []
+            results = {}
+            fetching, parsing = {}, {}
+            parse_backlog = deque()
+            parsed = changed = 0
+
+            def finish(link, depth, status, entry):
+                results[link] = (status, entry)
+                if entry is not None:
+                    frontier.add_links(entry.get('links', []), depth + 1, link)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as fetch_pool:
+                while frontier or fetching or parsing or parse_backlog:
+                    # Hand fetched pages to the parsers as queue slots free up
+                    while parse_backlog and len(parsing) < max_parsing:
+                        link, depth, status, entry, html = parse_backlog.popleft()
+                        future = pool.submit(parse_page, html, link, selectors)
+                        parsing[future] = (link, depth, status, entry)
+
+                    if pool is None and self.parse_workers > 0 and changed >= self.parse_pool_min_pages:
+                        owns_pool = parse_pool is None
+                        pool = self._create_parse_pool() if owns_pool else parse_pool
+
+                    # Only fetch more while the parse queue is keeping up
+                    while frontier and len(fetching) < self.max_workers and not parse_backlog:
+                        link, depth = frontier.pop()
+                        doc_links.append(link)
+                        # Without the process pool, the fetch thread parses the page
+                        future = fetch_pool.submit(self._fetch_page, link, manifest.get(link),
+                                                   None if pool else selectors)
+                        fetching[future] = (link, depth)
+
+                    done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in fetching:
+                            link, depth = fetching.pop(future)
+                            status, entry, html = future.result()
+                            if status == 'changed':
+                                changed += 1
+                            if html is None:
+                                finish(link, depth, status, entry)
+                            else:
+                                parse_backlog.append((link, depth, status, entry, html))
+                            continue
+
+                        link, depth, status, entry = parsing.pop(future)
+                        try:
+                            sections, links = future.result()
+                            parsed += 1
+                            finish(link, depth, status, {**entry, 'sections': sections, 'links': links})
+                        except Exception as e:
+                            logger.error(f"Error parsing {link}: {str(e)}")
+                            finish(link, depth, 'failed', manifest.get(link))
+        except Exception as e:
+            logger.error(f"Error crawling documentation for {cdp}: {str(e)}")
+            raise
+        finally:
+            if owns_pool:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - start
+        self.crawl_stats[cdp] = {
+            'pages': len(doc_links),
+            'parsed': parsed,
+            'seconds': elapsed,
+            'pages_per_second': len(doc_links) / elapsed if elapsed > 0 else 0.0
+        }
+        logger.info(f"Crawled {len(doc_links)} {cdp} pages in {elapsed:.1f}s "
+                    f"({self.crawl_stats[cdp]['pages_per_second']:.1f} pages/s)")
+
+        return self._collect_pages(cdp, doc_links, [results[link] for link in doc_links], manifest)
+
+    def _get_sitemap_links(self, base_url):
+        """
+        Collect page URLs from the site's sitemap.xml, following a sitemap
+        index one level deep. Returns an empty list if there is no sitemap.
+        """
+        for sitemap_url in dict.fromkeys([urljoin(base_url, 'sitemap.xml'), urljoin(base_url, '/sitemap.xml')]):
+            try:
+                response = self._make_request(sitemap_url, retry_count=1)
+            except Exception:
+                continue
+
+            pages, sitemaps = parse_sitemap(response.content)
+            for nested_url in sitemaps:
+                try:
+                    pages.extend(parse_sitemap(self._make_request(nested_url, retry_count=1).content)[0])
+                except Exception as e:
+                    logger.warning(f"Skipping sitemap {nested_url}: {str(e)}")
+            return pages
+        return []
+
+    def save_documentation(self, cdp, sections):
+        """
+        Stream scraped sections to the CDP's JSONL section file.
+        ``sections`` may be any iterable. Returns the number of sections saved;
+        nothing is written when there are none.
+        """
+        try:
+            sections = iter(sections)
+            first = next(sections, None)
+            if first is None:
+                return 0
+
+            with SectionWriter(self.docs_path, cdp, compress=self.compress_docs) as writer:
+                writer.write(first)
+                writer.write_all(sections)
                 
             logger.info(f"Successfully saved documentation for {cdp}")
+            return writer.count
             
         except Exception as e:
             logger.error(f"Error saving documentation for {cdp}: {str(e)}")
             raise
 
-    def update_all_documentation(self):
+    def update_all_documentation(self, concurrent=False, recursive=False, on_update=None):
         """
         Update documentation for all supported CDPs.
+        With ``concurrent``, CDPs are crawled in parallel and each crawl fetches
+        pages concurrently. ``recursive`` uses crawl_documentation() instead,
+        with the CDPs big enough to need one sharing an HTML parsing process pool.
+        ``on_update(cdp, saved)`` is called as soon as each CDP is done.
+        Returns the CDPs whose documentation was saved.
         """
-        for cdp in self.cdp_configs:
+        def update(cdp, parse_pool=None):
+            saved = self._update_cdp_documentation(cdp, concurrent or recursive, recursive, parse_pool)
+            if on_update is not None:
+                on_update(cdp, saved)
+            return saved
+
+        cdps = list(self.cdp_configs)
+        if recursive:
+            parse_pool = self._create_parse_pool() if self.parse_workers > 0 else None
             try:
-                logger.info(f"Updating documentation for {cdp}...")
+                with ThreadPoolExecutor(max_workers=len(cdps)) as pool:
+                    saved = list(pool.map(lambda cdp: update(cdp, parse_pool), cdps))
+            finally:
+                if parse_pool is not None:
+                    parse_pool.shutdown()
+        elif concurrent:
+            with ThreadPoolExecutor(max_workers=len(cdps)) as pool:
+                saved = list(pool.map(update, cdps))
+        else:
+            saved = [update(cdp) for cdp in cdps]
+
+        return [cdp for cdp, cdp_saved in zip(cdps, saved) if cdp_saved]
+
+    def _update_cdp_documentation(self, cdp, concurrent, recursive=False, parse_pool=None):
+        """
+        Scrape and save documentation for one CDP, logging instead of raising.
+        Returns whether new documentation was saved.
+        """
+        try:
+            logger.info(f"Updating documentation for {cdp}...")
+            if recursive:
+                sections = self.crawl_documentation(cdp, parse_pool)
+            elif concurrent:
+                sections = self.scrape_documentation_concurrent(cdp)
+            else:
                 sections = self.scrape_documentation(cdp)
-                if sections:
-                    self.save_documentation(cdp, sections)
-                    logger.info(f"Successfully updated {cdp} documentation")
-                else:
-                    logger.warning(f"No content found for {cdp}")
-            except Exception as e:
-                logger.error(f"Failed to update {cdp} documentation: {str(e)}")
-                continue
+            if not self.has_changes(cdp):
+                logger.info(f"{cdp} documentation is unchanged")
+            elif self.save_documentation(cdp, sections):
+                logger.info(f"Successfully updated {cdp} documentation")
+                return True
+            else:
+                logger.warning(f"No content found for {cdp}")
+        except Exception as e:
+            logger.error(f"Failed to update {cdp} documentation: {str(e)}")
+        return False
+
+def parse_page(html, page_url, selectors):
+    """
+    Parse one documentation page into ``(sections, links)``.
+
+    Module-level so it can run in a ProcessPoolExecutor. Links are every
+    ``href`` on the page resolved against ``page_url``; the crawl frontier
+    normalizes and filters them.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    links = [urljoin(page_url, a['href']) for a in soup.find_all('a', href=True)]
+    return DocumentScraper._extract_content(soup, selectors), links
 
 # Create scraper instance
 scraper = DocumentScraper()
 
-def update_documentation():
+def update_documentation(concurrent=False, recursive=False):
     """
     Global function to update all documentation.
+    Returns the CDPs whose documentation was saved.
     """
-    scraper.update_all_documentation()
+    return scraper.update_all_documentation(concurrent=concurrent, recursive=recursive)
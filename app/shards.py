@@ -0,0 +1,265 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from app.sparse_index import SparseIndex, top_k_indices, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Index versions a shard worker keeps loaded: the published one and its
+# predecessor, which searches that started before a swap may still use
+KEEP_VERSIONS = 2
+
+# Query x document cells a worker scores at once for a batch, as in search_batch
+BATCH_SCORE_CELLS = 1 << 16
+
+
+class ShardError(Exception):
+    """A shard worker failed or did not answer; the caller scores in-process instead."""
+
+
+def shard_bounds(n_docs, n_shards):
+    """Split ``n_docs`` documents into ``n_shards`` contiguous ranges of near-equal size."""
+    return [n_docs * i // n_shards for i in range(n_shards + 1)]
+
+
+def merge_top_k(parts, top_k):
+    """
+    Merge per-shard ``(doc_ids, scores, positives)`` results of one query.
+
+    Returns the ``top_k`` document ids ordered like top_k_indices() over the
+    whole index (descending score, ties towards the higher id) and how many
+    of the top ``top_k`` documents have a positive score.
+    """
+    doc_ids = np.concatenate([part[0] for part in parts])
+    scores = np.concatenate([part[1] for part in parts])
+    order = np.lexsort((-doc_ids, -scores))[:top_k]
+    return doc_ids[order], min(top_k, sum(part[2] for part in parts))
+
+
+def _search_shard(index, offset, vectors, top_k, min_similarity):
+    """
+    Score one shard for each ``(term_ids, weights)`` query vector and return
+    its ``(doc_ids, scores, positives)`` per query, with global document ids.
+    """
+    results = []
+    if len(vectors) == 1:
+        similarities = index.score(*vectors[0])
+        top = top_k_indices(similarities, top_k, min_similarity)
+        positives = min(top_k, int(np.count_nonzero(similarities > 0)))
+        return [(top + offset, similarities[top], positives)]
+
+    chunk_size = max(1, BATCH_SCORE_CELLS // index.n_docs)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        similarities = index.score_batch([v[0] for v in chunk], [v[1] for v in chunk])
+        positives = np.minimum(top_k, np.count_nonzero(similarities > 0, axis=1)).tolist()
+        for row, top in enumerate(top_k_rows(similarities, top_k, min_similarity)):
+            results.append((top + offset, similarities[row, top], positives[row]))
+    return results
+
+
+def _serve(conn):
+    """
+    Shard worker main loop: load shards of index versions and answer searches
+    over them until the connection is closed.
+    """
+    # Interrupts go to the server, which shuts the workers down by closing their pipes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    versions = OrderedDict()
+    while True:
+        try:
+            request_id, command, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if command == 'load':
+                version, shards = args
+                versions[version] = {cdp: (SparseIndex(indptr, doc_ids, None, weights, n_docs, bases, scales), offset)
+                                     for cdp, (offset, indptr, doc_ids, weights, n_docs, bases, scales)
+                                     in shards.items()}
+                while len(versions) > KEEP_VERSIONS:
+                    versions.popitem(last=False)
+                result = None
+            elif command == 'search':
+                version, queries, top_k, min_similarity = args
+                shards = versions[version]
+                result = {}
+                for cdp, vectors in queries.items():
+                    result[cdp] = _search_shard(*shards[cdp], vectors, top_k, min_similarity)
+            else:
+                raise ValueError(f"Unknown command: {command}")
+            conn.send((request_id, True, result))
+        except Exception as e:
+            conn.send((request_id, False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """One shard worker process and the connection to it; requests may be pipelined from many threads."""
+
+    def __init__(self, context, number):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), name=f"cdp-shard-{number}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self.alive = True
+        self._reader = threading.Thread(target=self._read, name=f"cdp-shard-{number}-reader", daemon=True)
+        self._reader.start()
+
+    def call(self, command, *args):
+        """Send a request and return a Future for its result."""
+        future = Future()
+        with self._send_lock:
+            if not self.alive:
+                raise ShardError(f"{self.process.name} is not running")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self.conn.send((request_id, command, args))
+            except (OSError, ValueError) as e:
+                self._pending.pop(request_id, None)
+                raise ShardError(f"{self.process.name}: {str(e)}")
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, result = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id, None)
+            if future is not None:
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(ShardError(result))
+
+        # The worker exited or the connection was closed: fail everything still waiting
+        with self._send_lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ShardError(f"{self.process.name} exited"))
+
+    def close(self):
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardPool:
+    """
+    Scores large CDP indexes in parallel on ``n_shards`` worker processes.
+
+    Each CDP with at least ``min_docs`` passages is split into contiguous
+    document ranges, one per worker. A query vector is sent to every worker,
+    each scores its range and returns its own top-k, and the partial results
+    are merged. Per-document scores are summed in the same order as in the
+    unsharded index, so the merged results are identical to it.
+
+    Workers are spawned on first use in each process (so a pool created
+    before a server forks is never shared) and receive a copy of their shards
+    for each index version; the indexer loads a new version before
+    publishing it. ``timeout`` bounds the wait for a worker's answer.
+    """
+
+    def __init__(self, n_shards, min_docs=0, timeout=10.0):
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+        self.n_shards = n_shards
+        self.min_docs = min_docs
+        self.timeout = timeout
+        self._workers = []
+        self._pid = None
+        self._loaded = deque(maxlen=KEEP_VERSIONS)
+        self._lock = threading.Lock()
+
+    def covers(self, index):
+        """Whether searches of ``index`` go to the shard workers."""
+        return index.n_docs >= max(self.min_docs, self.n_shards)
+
+    @property
+    def started(self):
+        """Whether every worker of this process is running."""
+        return self._pid == os.getpid() and bool(self._workers) and all(worker.alive for worker in self._workers)
+
+    def _start(self):
+        """Spawn the workers; the pool lock must be held."""
+        for worker in self._workers if self._pid == os.getpid() else []:
+            worker.close()
+        context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(context, number) for number in range(self.n_shards)]
+        self._pid = os.getpid()
+        self._loaded.clear()
+        logger.info(f"Started {self.n_shards} shard workers")
+
+    def load(self, state, start=False):
+        """
+        Send ``state``'s shards to the workers unless they already have them.
+        Workers are started only with ``start``; once started in this process,
+        workers that died are replaced.
+        """
+        if state.version in self._loaded and self.started:
+            return
+        with self._lock:
+            if not self.started:
+                if not start and self._pid != os.getpid():
+                    return
+                self._start()
+            if state.version in self._loaded:
+                return
+
+            shards = [{} for _ in range(self.n_shards)]
+            for cdp, index in state.doc_vectors.items():
+                if self.covers(index):
+                    bounds = shard_bounds(index.n_docs, self.n_shards)
+                    for number, (start_doc, stop_doc) in enumerate(zip(bounds, bounds[1:])):
+                        shard = index.shard(start_doc, stop_doc)
+                        shards[number][cdp] = (start_doc, shard.indptr, shard.doc_ids, shard.weights, shard.n_docs,
+                                               shard.bases, shard.scales)
+
+            futures = [worker.call('load', state.version, worker_shards)
+                       for worker, worker_shards in zip(self._workers, shards)]
+            for future in futures:
+                future.result()
+            self._loaded.append(state.version)
+
+    def search(self, state, queries, top_k, min_similarity):
+        """
+        Search sharded CDPs of ``state``. ``queries`` maps each CDP to a list of
+        ``(term_ids, weights)`` query vectors; returns, per CDP, one
+        ``(doc_ids, matching)`` pair per vector as the unsharded search would
+        select them. Raises ShardError when a worker fails.
+        """
+        try:
+            self.load(state, start=True)
+            futures = [worker.call('search', state.version, queries, top_k, min_similarity)
+                       for worker in self._workers]
+            parts = [future.result(self.timeout) for future in futures]
+        except ShardError:
+            raise
+        except Exception as e:
+            raise ShardError(f"{type(e).__name__}: {str(e)}")
+
+        return {cdp: [merge_top_k([part[cdp][n] for part in parts], top_k) for n in range(len(vectors))]
+                for cdp, vectors in queries.items()}
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for worker in self._workers:
+                    worker.close()
+            self._workers = []
+            self._pid = None
+            self._loaded.clear()
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.doc_store import LazySections, PackedSections, SectionCache
+from app.sparse_index import SparseIndex
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+ARRAY_NAMES = ['indptr', 'doc_ids', 'tf', 'weights']
+# Per-term arrays of quantized indexes, see SparseIndex
+QUANTIZATION_NAMES = ['bases', 'scales']
+
+
+def snapshot_key(fingerprint, options=None):
+    """
+    Derive the snapshot directory name from the source fingerprint.
+    Any change to the source files, the index ``options`` or the snapshot
+    format yields a new key.
+    """
+    payload = json.dumps({'version': SNAPSHOT_VERSION, 'sources': fingerprint, 'options': options}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def save_snapshot(index_path, fingerprint, vocab, idf, doc_vectors, passages, sections, options=None):
+    """
+    Write a versioned snapshot of the index into ``index_path``.
+
+    Postings of all CDPs are concatenated into one ``.npy`` file per array so
+    they can be memory-mapped; the manifest records each CDP's offsets.
+    Passage spans and the section text (``sections`` maps each CDP to its
+    PackedSections) are stored too, so a snapshot is loaded without reading
+    the source documents.
+    """
+    index_path = Path(index_path)
+    key = snapshot_key(fingerprint, options)
+    final_dir = index_path / f"snapshot-{key}"
+    if final_dir.exists():
+        return final_dir
+
+    tmp_dir = index_path / f"snapshot-{key}.tmp-{os.getpid()}"
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        cdps = {}
+        nnz_offset = text_offset = field_offset = 0
+        section_offsets = []
+        with open(tmp_dir / 'sections.bin', 'wb') as f:
+            for cdp, index in doc_vectors.items():
+                buffer, offsets = sections[cdp].raw()
+                f.write(buffer)
+                section_offsets.append(offsets)
+                cdps[cdp] = {
+                    'n_docs': index.n_docs,
+                    'nnz_start': nnz_offset,
+                    'nnz_end': nnz_offset + index.nnz,
+                    'sections': (len(offsets) - 1) // 2,
+                    'text_start': text_offset,
+                    'text_end': text_offset + len(buffer),
+                    'offsets_start': field_offset,
+                    'offsets_end': field_offset + len(offsets)
+                }
+                nnz_offset += index.nnz
+                text_offset += len(buffer)
+                field_offset += len(offsets)
+
+        # Passage spans have one row per document, so they share the documents' offsets
+        np.save(tmp_dir / 'passages.npy', np.concatenate([passages[cdp] for cdp in doc_vectors])
+                if doc_vectors else np.zeros((0, 3), dtype=np.int64))
+        np.save(tmp_dir / 'section_offsets.npy', np.concatenate(section_offsets)
+                if section_offsets else np.zeros(0, dtype=np.int64))
+
+        np.save(tmp_dir / 'idf.npy', idf)
+        # Quantized indexes: one row of per-term values per CDP, like indptr
+        if any(index.scales is not None for index in doc_vectors.values()):
+            for name in QUANTIZATION_NAMES:
+                np.save(tmp_dir / f"{name}.npy", np.stack([getattr(index, name) for index in doc_vectors.values()]))
+        for name in ARRAY_NAMES:
+            arrays = [getattr(index, name) for index in doc_vectors.values()]
+            if name == 'indptr':
+                stacked = np.stack(arrays) if arrays else np.zeros((0, len(vocab) + 1), dtype=np.int64)
+            else:
+                stacked = np.concatenate(arrays) if arrays else np.zeros(0)
+            np.save(tmp_dir / f"{name}.npy", stacked)
+
+        with open(tmp_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': SNAPSHOT_VERSION,
+                'sources': fingerprint,
+                'options': options,
+                'vocab': sorted(vocab, key=vocab.get),
+                'cdps': cdps
+            }, f)
+
+        # Another worker may have published the same snapshot first
+        try:
+            tmp_dir.rename(final_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        _remove_stale_snapshots(index_path, keep=final_dir.name)
+        logger.info(f"Saved index snapshot {final_dir.name}")
+        return final_dir
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.warning(f"Could not save index snapshot: {str(e)}")
+        return None
+
+
+def load_snapshot(index_path, fingerprint, options=None, section_cache=None):
+    """
+    Load the snapshot matching ``fingerprint`` and ``options``.
+
+    Returns ``(vocab, idf, doc_vectors, passages, sections)`` with the numeric
+    arrays memory-mapped read-only, or ``None`` if no valid snapshot exists.
+    ``sections`` maps each CDP to LazySections, read from the snapshot only
+    when first needed and kept in ``section_cache``.
+    """
+    snapshot_dir = Path(index_path) / f"snapshot-{snapshot_key(fingerprint, options)}"
+    if not (snapshot_dir / 'manifest.json').exists():
+        return None
+
+    try:
+        with open(snapshot_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('version') != SNAPSHOT_VERSION or manifest.get('sources') != fingerprint or
+                manifest.get('options') != options):
+            return None
+
+        vocab = {word: idx for idx, word in enumerate(manifest['vocab'])}
+        idf = _load_array(snapshot_dir / 'idf.npy')
+        arrays = {name: _load_array(snapshot_dir / f"{name}.npy") for name in ARRAY_NAMES}
+        quantization = {}
+        if (snapshot_dir / 'scales.npy').exists():
+            quantization = {name: _load_array(snapshot_dir / f"{name}.npy") for name in QUANTIZATION_NAMES}
+
+        all_passages = _load_array(snapshot_dir / 'passages.npy')
+        section_offsets = _load_array(snapshot_dir / 'section_offsets.npy')
+        text = _SnapshotFile(snapshot_dir / 'sections.bin')
+        section_cache = section_cache if section_cache is not None else SectionCache()
+
+        doc_vectors, passages, sections = {}, {}, {}
+        passage_offset = 0
+        for row, (cdp, info) in enumerate(manifest['cdps'].items()):
+            passages[cdp] = all_passages[passage_offset:passage_offset + info['n_docs']]
+            passage_offset += info['n_docs']
+            sections[cdp] = LazySections(
+                (cdp, fingerprint[cdp]),
+                info['sections'],
+                info['text_end'] - info['text_start'] + (info['offsets_end'] - info['offsets_start']) * 8,
+                _section_loader(text, section_offsets, info),
+                section_cache
+            )
+            start, end = info['nnz_start'], info['nnz_end']
+            doc_vectors[cdp] = SparseIndex(
+                arrays['indptr'][row],
+                arrays['doc_ids'][start:end],
+                arrays['tf'][start:end],
+                arrays['weights'][start:end],
+                info['n_docs'],
+                **{name: rows[row] for name, rows in quantization.items()}
+            )
+        return vocab, idf, doc_vectors, passages, sections
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable index snapshot {snapshot_dir}: {str(e)}")
+        return None
+
+
+def _load_array(path):
+    """
+    Memory-map a snapshot array read-only. It is returned as a plain ndarray
+    view, since indexing np.memmap objects carries a per-call overhead.
+    """
+    return np.load(path, mmap_mode='r').view(np.ndarray)
+
+
+class _SnapshotFile:
+    """
+    A snapshot file kept open for reads from any thread. Like the
+    memory-mapped arrays, it stays readable after a newer snapshot replaced
+    it on disk.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+    def read(self, start, end):
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start)
+
+    def __del__(self):
+        if hasattr(self, '_file'):
+            self._file.close()
+
+
+def _section_loader(text, section_offsets, info):
+    """Return a function reading one CDP's sections back from the snapshot."""
+    def load():
+        return PackedSections.from_buffer(text.read(info['text_start'], info['text_end']),
+                                          np.array(section_offsets[info['offsets_start']:info['offsets_end']]))
+    return load
+
+
+def _remove_stale_snapshots(index_path, keep):
+    """Delete snapshots other than ``keep``."""
+    for path in Path(index_path).glob('snapshot-*'):
+        if path.name != keep and '.tmp-' not in path.name:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,281 @@
+import numpy as np
+
+from app.scoring import TfidfScoring
+
+# Storage types of posting weights. float64 keeps the weights exactly as the
+# scoring mode computed them, float32 halves them and uint8 quantizes each
+# term's weights to 256 evenly spaced levels between its smallest and largest,
+# stored as unsigned 8-bit codes
+PRECISIONS = {
+    'float64': np.float64,
+    'float32': np.float32,
+    'uint8': np.uint8
+}
+
+
+class SparseIndex:
+    """
+    Term-major (CSR-style) inverted index over precomputed posting weights.
+
+    Postings for term ``t`` live in ``doc_ids[indptr[t]:indptr[t + 1]]`` and
+    ``weights[indptr[t]:indptr[t + 1]]``, sorted by document id. Weights are
+    computed by the scoring mode (normalized TF-IDF by default, or BM25) at
+    build time, so a query only has to touch the postings of its own terms.
+
+    Quantized indexes hold ``bases`` and ``scales``, one of each per term:
+    the weight of a posting ``p`` of term ``t`` is
+    ``bases[t] + weights[p] * scales[t]``. Both are folded into the query
+    weights, so scoring reads the same postings as unquantized.
+    """
+
+    def __init__(self, indptr, doc_ids, tf, weights, n_docs, bases=None, scales=None):
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tf = tf
+        self.weights = weights
+        self.n_docs = n_docs
+        self.bases = bases
+        self.scales = scales
+
+    @classmethod
+    def from_term_counts(cls, doc_counts, n_terms, idf, scoring=None, avg_doc_length=None, precision='float64'):
+        """
+        Build an index from one ``{term_id: count}`` mapping per document.
+        ``avg_doc_length`` is the corpus-wide average used by length-normalized
+        scoring modes; weights are stored with ``precision``, see compact().
+        """
+        n_docs = len(doc_counts)
+        lengths = np.fromiter((len(counts) for counts in doc_counts), dtype=np.int64, count=n_docs)
+        nnz = int(lengths.sum())
+
+        doc_of = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+        terms = np.fromiter((t for counts in doc_counts for t in counts), dtype=np.int64, count=nnz)
+        tf = np.fromiter((c for counts in doc_counts for c in counts.values()), dtype=np.float64, count=nnz)
+
+        # Sort postings by term, then by document
+        order = np.lexsort((doc_of, terms))
+        doc_of, terms, tf = doc_of[order], terms[order], tf[order]
+
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+
+        index = cls(indptr, doc_of, tf, None, n_docs)
+        index.weights = (scoring or TfidfScoring()).posting_weights(index, terms, idf, avg_doc_length)
+        return index.compact(precision)
+
+    def reweighted(self, idf, scoring=None, avg_doc_length=None, precision='float64'):
+        """
+        Return a copy of this index with weights recomputed for new corpus statistics.
+
+        Used when another CDP's documents change the global document frequencies;
+        the stored term frequencies are reused, so nothing is re-tokenized. The
+        term range is extended when the vocabulary has grown.
+        """
+        n_terms = len(self.indptr) - 1
+        terms = np.repeat(np.arange(n_terms, dtype=np.int64), np.diff(self.indptr))
+        indptr = self.indptr
+        if len(idf) > n_terms:
+            indptr = np.concatenate([indptr, np.full(len(idf) - n_terms, indptr[-1], dtype=np.int64)])
+
+        index = SparseIndex(indptr, self.doc_ids, self.tf, None, self.n_docs)
+        index.weights = (scoring or TfidfScoring()).posting_weights(index, terms, idf, avg_doc_length)
+        return index.compact(precision)
+
+    def compact(self, precision):
+        """
+        Return this index with its weights stored as ``precision`` (see
+        PRECISIONS). Below float64, document ids are also stored as int32 and
+        term frequencies, which are whole numbers, as float32.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown index precision: {precision}")
+        if precision == 'float64':
+            return self
+
+        doc_ids = self.doc_ids.astype(np.int32, copy=False)
+        tf = self.tf.astype(np.float32, copy=False)
+        if precision == 'float32':
+            return SparseIndex(self.indptr, doc_ids, tf, self.weights.astype(np.float32), self.n_docs)
+
+        # Map every term's weight range [smallest, largest] onto the codes 0-255
+        lengths = np.diff(self.indptr)
+        used = lengths > 0
+        bases = np.zeros(len(lengths), dtype=np.float32)
+        scales = np.ones(len(lengths), dtype=np.float32)
+        if self.nnz:
+            starts = self.indptr[:-1][used]
+            bases[used] = np.minimum.reduceat(self.weights, starts)
+            scales[used] = (np.maximum.reduceat(self.weights, starts) - bases[used]) / 255
+            scales[scales == 0] = 1.0
+        codes = np.rint((self.weights - np.repeat(bases, lengths)) / np.repeat(scales, lengths))
+        weights = np.clip(codes, 0, 255).astype(np.uint8)
+        return SparseIndex(self.indptr, doc_ids, tf, weights, self.n_docs, bases, scales)
+
+    def shard(self, start, stop):
+        """
+        Return the index of documents ``start`` to ``stop`` only, renumbered
+        from 0. Postings keep their order, so every document scores exactly as
+        it does in the full index.
+        """
+        keep = (self.doc_ids >= start) & (self.doc_ids < stop)
+        kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        return SparseIndex(kept_before[self.indptr], self.doc_ids[keep] - start, self.tf[keep], self.weights[keep],
+                           stop - start, self.bases, self.scales)
+
+    def freeze(self):
+        """Make the arrays read-only; published indexes are never modified in place."""
+        for array in (self.indptr, self.doc_ids, self.tf, self.weights, self.bases, self.scales):
+            if array is not None:
+                array.setflags(write=False)
+        return self
+
+    @property
+    def nnz(self):
+        """Number of stored postings."""
+        return len(self.doc_ids)
+
+    @property
+    def total_length(self):
+        """Sum of all term frequencies, i.e. the total length of the indexed documents."""
+        return float(self.tf.sum())
+
+    @property
+    def nbytes(self):
+        """Memory used by the posting arrays, in bytes."""
+        quantization = self.bases.nbytes + self.scales.nbytes if self.scales is not None else 0
+        return self.indptr.nbytes + self.doc_ids.nbytes + self.tf.nbytes + self.weights.nbytes + quantization
+
+    def _posting_positions(self, term_ids):
+        """Return the concatenated posting positions of ``term_ids`` and the length of each run."""
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64), lengths
+
+        # Turn [start, start + length) runs into one flat array of positions
+        run_offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return run_offsets + np.arange(total, dtype=np.int64), lengths
+
+    def _contributions(self, positions, lengths, term_ids, query_weights):
+        """
+        Weighted contribution of each posting at ``positions``, which hold
+        ``lengths`` postings of each of ``term_ids`` in turn.
+        """
+        if self.scales is None:
+            return self.weights[positions] * np.repeat(query_weights, lengths)
+        return (self.weights[positions] * np.repeat(query_weights * self.scales[term_ids], lengths)
+                + np.repeat(query_weights * self.bases[term_ids], lengths))
+
+    def score_batch(self, query_term_ids, query_weights):
+        """
+        Score a batch of queries with one sparse matrix product.
+
+        ``query_term_ids`` and ``query_weights`` hold one array per query, as
+        for score(). Returns a ``(len(queries), n_docs)`` similarity matrix.
+        """
+        n_queries = len(query_term_ids)
+        lengths = [len(term_ids) for term_ids in query_term_ids]
+        if not sum(lengths):
+            return np.zeros((n_queries, self.n_docs))
+
+        # Gather the postings of every (query, term) pair in one go
+        rows = np.repeat(np.arange(n_queries, dtype=np.int64), lengths)
+        term_ids = np.concatenate(query_term_ids)
+        positions, posting_lengths = self._posting_positions(term_ids)
+        cells = np.repeat(rows, posting_lengths) * self.n_docs + self.doc_ids[positions]
+        contributions = self._contributions(positions, posting_lengths, term_ids, np.concatenate(query_weights))
+
+        similarities = np.bincount(cells, weights=contributions, minlength=n_queries * self.n_docs)
+        return similarities.reshape(n_queries, self.n_docs)
+
+    def score(self, term_ids, query_weights):
+        """
+        Score every document against a query as the weighted sum of its postings.
+
+        ``term_ids`` must be sorted and unique; ``query_weights`` holds the matching
+        query weights from the scoring mode.
+        """
+        positions, lengths = self._posting_positions(term_ids)
+        if not len(positions):
+            return np.zeros(self.n_docs)
+
+        contributions = self._contributions(positions, lengths, term_ids, query_weights)
+        return np.bincount(self.doc_ids[positions], weights=contributions, minlength=self.n_docs)
+
+
+def score_many(indexes, term_ids, query_weights):
+    """
+    Score several indexes against one query in a single pass.
+
+    The postings of every index are gathered with their document ids shifted by
+    the index's segment offset, so one ``bincount`` scores the combined corpus.
+    Returns the combined similarities and the segment offsets (length
+    ``len(indexes) + 1``); index ``i`` owns ``similarities[offsets[i]:offsets[i + 1]]``.
+    """
+    offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+    np.cumsum([index.n_docs for index in indexes], out=offsets[1:])
+
+    doc_ids, contributions = [], []
+    for index, offset in zip(indexes, offsets):
+        positions, lengths = index._posting_positions(term_ids)
+        if len(positions):
+            doc_ids.append(index.doc_ids[positions] + offset)
+            contributions.append(index._contributions(positions, lengths, term_ids, query_weights))
+
+    if not doc_ids:
+        return np.zeros(offsets[-1]), offsets
+    similarities = np.bincount(np.concatenate(doc_ids), weights=np.concatenate(contributions),
+                               minlength=offsets[-1])
+    return similarities, offsets
+
+
+def top_k_rows(similarities, top_k, min_similarity):
+    """
+    Apply top_k_indices() to every row of a 2-D array at once.
+
+    The k-th highest score of every row is found with one ``np.partition``;
+    only the cells above ``min_similarity`` that reach it are sorted, so
+    ties are broken towards the higher column index without a per-row sort.
+    Returns one array of column indices per row.
+    """
+    n_rows, n_cols = similarities.shape
+    if top_k <= 0 or not n_cols:
+        return [np.zeros(0, dtype=np.int64) for _ in range(n_rows)]
+
+    selected = similarities > min_similarity
+    if top_k < n_cols:
+        kth = np.partition(similarities, n_cols - top_k, axis=1)[:, n_cols - top_k]
+        selected &= similarities >= kth[:, None]
+    rows, columns = np.nonzero(selected)
+    # Sort by row, then descending by score, then by column index
+    order = np.lexsort((-columns, -similarities[rows, columns], rows))
+    rows, columns = rows[order], columns[order]
+
+    bounds = np.searchsorted(rows, np.arange(n_rows + 1)).tolist()
+    return [columns[start:min(stop, start + top_k)] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def top_k_indices(similarities, top_k, min_similarity):
+    """
+    Return the indices of the ``top_k`` highest similarities above ``min_similarity``.
+
+    The threshold is applied first, so usually only a handful of candidates
+    remain; larger candidate sets are cut down with ``np.partition`` (O(n))
+    before sorting. The order matches ``argsort(similarities)[-top_k:][::-1]``
+    followed by the threshold filter, with ties broken towards the higher index.
+    """
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    candidates = np.flatnonzero(similarities > min_similarity)
+    if len(candidates) > top_k:
+        scores = similarities[candidates]
+        kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        # Keep everything tied with the k-th score so the tie order stays deterministic
+        candidates = candidates[scores >= kth]
+
+    scores = similarities[candidates]
+    order = np.lexsort((-candidates, -scores))[:top_k]
+    return candidates[order]
@@ -13,14 +13,10 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
-    // Add a message to the chat
-    function addMessage(content, isUser = false) {
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${isUser ? 'user' : 'bot'}`;
-        
-        const messageContent = document.createElement('div');
-        messageContent.className = 'message-content';
-        
+    // Render text into a message, replacing what it showed before
+    function renderContent(messageContent, content) {
+        messageContent.replaceChildren();
+
         if (typeof content === 'string') {
             // Handle newlines and format as paragraphs
             const paragraphs = content.split('\n').filter(p => p.trim());
@@ -37,12 +33,105 @@ document.addEventListener('DOMContentLoaded', () => {
         } else {
             messageContent.textContent = content;
         }
+    }
+
+    // Add a message to the chat, returning its content element
+    function addMessage(content, isUser = false) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${isUser ? 'user' : 'bot'}`;
+        
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content';
+        renderContent(messageContent, content);
         
         messageDiv.appendChild(messageContent);
         chatMessages.appendChild(messageDiv);
         
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageContent;
+    }
+
+    // Parse one Server-Sent Event into its type and JSON data
+    function parseEvent(raw) {
+        let type = 'message';
+        const data = [];
+        raw.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data.push(line.slice(5).trim());
+            }
+        });
+        return { type, data: data.length ? JSON.parse(data.join('\n')) : {} };
+    }
+
+    // Stream the answer from /api/chat/stream, calling onChunk per chunk.
+    // Returns false when streaming is unavailable so the caller can fall back.
+    async function streamResponse(question, onChunk) {
+        if (!window.ReadableStream || !window.TextDecoder) {
+            return false;
+        }
+
+        const response = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ question }),
+        });
+
+        if (!response.ok || !response.body) {
+            return false;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                throw new Error('Stream ended before the response was complete');
+            }
+
+            // Events are separated by a blank line; keep any partial event
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+
+            for (const raw of events) {
+                const event = parseEvent(raw);
+                if (event.type === 'error') {
+                    throw new Error(event.data.error);
+                }
+                if (event.type === 'done') {
+                    return true;
+                }
+                onChunk(event.data.chunk);
+            }
+        }
+    }
+
+    // Fetch the complete answer from /api/chat
+    async function fetchResponse(question) {
+        const response = await fetch('/api/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ question }),
+        });
+
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+
+        const data = await response.json();
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        return data.response;
     }
 
     // Show loading animation
@@ -83,28 +172,33 @@ document.addEventListener('DOMContentLoaded', () => {
         const loadingDiv = showLoading();
 
         try {
-            // Send request to backend
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ question }),
-            });
-
-            // Remove loading animation
-            loadingDiv.remove();
-
-            if (!response.ok) {
-                throw new Error('Network response was not ok');
+            // Render the answer as it streams in, one chunk at a time
+            let botContent = null;
+            let answer = '';
+            let streamed = false;
+            try {
+                streamed = await streamResponse(question, chunk => {
+                    if (!botContent) {
+                        loadingDiv.remove();
+                        botContent = addMessage('');
+                    }
+                    answer += chunk;
+                    renderContent(botContent, answer);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                });
+            } catch (error) {
+                // Once part of the answer is shown, retrying would repeat it
+                if (botContent) {
+                    throw error;
+                }
+                console.warn('Streaming failed, retrying without streaming:', error);
             }
 
-            const data = await response.json();
-            
-            if (data.error) {
-                addMessage('Sorry, I encountered an error. Please try again.');
-            } else {
-                addMessage(data.response);
+            // Fall back to the non-streaming endpoint when no chunk arrived
+            if (!streamed) {
+                answer = await fetchResponse(question);
+                loadingDiv.remove();
+                addMessage(answer);
             }
 
         } catch (error) {
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Persistent per-section token cache keyed by a hash of the section content.
+
+    Entries are only reused when they were produced by the same tokenizer, so
+    switching tokenizers never mixes token streams.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, tokenizer='nltk'):
+        self.path = Path(path)
+        self.tokenizer = tokenizer
+        self.entries = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def content_hash(text):
+        """Return a stable hash for a section's content."""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        """Load cached tokens from disk, ignoring stale or unreadable caches."""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION and data.get('tokenizer') == self.tokenizer:
+                self.entries = data.get('tokens', {})
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable token cache {self.path}: {str(e)}")
+
+    def get_or_tokenize(self, text, tokenize):
+        """Return cached tokens for ``text``, tokenizing and caching on a miss."""
+        key = self.content_hash(text)
+        self.used.add(key)
+        tokens = self.entries.get(key)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+
+        self.misses += 1
+        tokens = tokenize(text)
+        self.entries[key] = tokens
+        self._dirty = True
+        return tokens
+
+    def save(self, prune=True):
+        """
+        Write the cache to disk.
+        With ``prune``, entries not used since the cache was loaded are dropped.
+        """
+        if not self._dirty and (not prune or len(self.used) == len(self.entries)):
+            return
+        # Per-process temporary file, so workers saving at once never write into each other's file
+        tmp_path = self.path.with_suffix(f".tmp-{os.getpid()}")
+        try:
+            if prune:
+                self.entries = {key: self.entries[key] for key in self.used if key in self.entries}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # json.dumps uses the C encoder in one pass, unlike json.dump's chunked writes
+            payload = json.dumps({
+                'version': self.VERSION,
+                'tokenizer': self.tokenizer,
+                'tokens': self.entries
+            })
+            tmp_path.write_text(payload, encoding='utf-8')
+            tmp_path.replace(self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"Could not write token cache {self.path}: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,253 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# NLTK's English stopword list, embedded so the fast tokenizer needs no corpus data
+STOP_WORDS = frozenset("""
+a about above after again against ain all am an and any are aren aren't as at be because been before
+being below between both but by can couldn couldn't d did didn didn't do does doesn doesn't doing don
+don't down during each few for from further had hadn hadn't has hasn hasn't have haven haven't having
+he her here hers herself him himself his how i if in into is isn isn't it it's its itself just ll m ma
+me mightn mightn't more most mustn mustn't my myself needn needn't no nor not now o of off on once only
+or other our ours ourselves out over own re s same shan shan't she she's should should've shouldn
+shouldn't so some such t than that that'll the their theirs them themselves then there these they this
+those through to too under until up ve very was wasn wasn't we were weren weren't what when where which
+while who whom why will with won won't wouldn wouldn't y you you'd you'll you're you've your yours
+yourself yourselves
+""".split())
+
+# NLTK's contractions that are written without an apostrophe, split in two
+CONTRACTIONS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na')
+}
+
+
+class NltkTokenizer:
+    """
+    The original tokenizer: NLTK ``word_tokenize`` followed by stopword and
+    non-alphanumeric filtering. NLTK and its data are loaded on first use.
+    """
+
+    name = 'nltk'
+
+    # Texts the batch rules are checked against when NLTK is loaded
+    BATCH_CHECK = [
+        'How do I set up a new source in Segment?',
+        '"Quoted" text, can\'t stop: won\'t stop... it\'s 3,000.5 items (roughly).',
+        "'Tis the users' profiles -- cannot wanna gonna lemme [see] e.g. Dr. Smith. Done.",
+        'Ends with a colon: and a comma, then "quotes" and \'single\' ones; 1. 2.',
+        'Can I (re)build [audiences] for #1 & $2 @ 50%? cannot*wanna {gonna} <gotta>! lemme; gimme'
+    ]
+
+    # Lowercased texts of plain words and the punctuation NLTK always splits
+    # off: the only other rule that applies to them splits the CONTRACTIONS,
+    # and punkt's sentence boundaries do not change their tokens
+    PLAIN = re.compile(r'[a-z0-9 \t\n\r\f\v?!;@#$%&*()\[\]{}<>]*')
+    PLAIN_SEPARATORS = str.maketrans({char: ' ' for char in '?!;@#$%&*()[]{}<>'})
+
+    def __init__(self):
+        self._word_tokenize = None
+        self._sent_tokenize = None
+        self._batch_rules = None
+        self._stop_words = None
+
+    def _load(self):
+        import nltk
+        from nltk.tokenize import sent_tokenize, word_tokenize
+
+        # NLTK data is never downloaded here: that needs the network, which
+        # production containers do not have. Newer NLTK releases load punkt
+        # from punkt_tab, older ones from the pickled punkt models
+        if not any(self._has_data(nltk, resource) for resource in ('tokenizers/punkt_tab', 'tokenizers/punkt')):
+            raise LookupError("NLTK punkt data is missing; install it with download_nltk_data.py "
+                              "or set CDP_TOKENIZER=fast")
+        if self._has_data(nltk, 'corpora/stopwords'):
+            from nltk.corpus import stopwords
+            self._stop_words = set(stopwords.words('english'))
+        else:
+            logger.warning("NLTK stopwords data is missing; using the bundled English stopword list")
+            self._stop_words = set(STOP_WORDS)
+        self._sent_tokenize = sent_tokenize
+        self._word_tokenize = word_tokenize
+        self._batch_rules = self._line_rules()
+        if any(self.tokenize_batch(self.BATCH_CHECK)[n] != self(text) for n, text in enumerate(self.BATCH_CHECK)):
+            logger.warning("This NLTK version tokenizes batches differently; batches are tokenized text by text")
+            self._batch_rules = None
+
+    @staticmethod
+    def _has_data(nltk, resource):
+        """Whether NLTK ``resource`` is installed locally."""
+        try:
+            nltk.data.find(resource)
+            return True
+        except LookupError:
+            return False
+
+    @staticmethod
+    def _line_rules():
+        """
+        The substitutions of NLTK's word tokenizer, adapted to run over many
+        sentences at once, one per line: anchors match at every line and
+        whitespace runs are collapsed without merging lines.
+        """
+        from nltk.tokenize.destructive import NLTKWordTokenizer
+
+        def multiline(rules):
+            return [(re.compile(regexp.pattern, regexp.flags | re.M), substitution) for regexp, substitution in rules]
+
+        before = multiline(NLTKWordTokenizer.STARTING_QUOTES + NLTKWordTokenizer.PUNCTUATION +
+                           [NLTKWordTokenizer.PARENS_BRACKETS, NLTKWordTokenizer.DOUBLE_DASHES])
+        after = multiline([(re.compile(r'[^\S\n]+'), ' ') if regexp.pattern == r'\s+' else (regexp, substitution)
+                           for regexp, substitution in NLTKWordTokenizer.ENDING_QUOTES] +
+                          [(regexp, r' \1 \2 ') for regexp in
+                           NLTKWordTokenizer.CONTRACTIONS2 + NLTKWordTokenizer.CONTRACTIONS3])
+        return before, after
+
+    def __call__(self, text):
+        """Tokenize, lowercase and drop stopwords and non-alphanumeric tokens."""
+        if self._word_tokenize is None:
+            self._load()
+        tokens = self._word_tokenize(text.lower())
+        return [token for token in tokens if token not in self._stop_words and token.isalnum()]
+
+    def tokenize_batch(self, texts):
+        """
+        Tokenize many texts with the same result as calling the tokenizer on
+        each. Texts of plain words are split directly, each distinct word once
+        per batch. For the others sentences are split per text, then NLTK's
+        word rules run once over all sentences instead of once per sentence;
+        texts with line breaks are tokenized on their own.
+        """
+        if self._word_tokenize is None:
+            self._load()
+        if self._batch_rules is None:
+            return [self(text) for text in texts]
+
+        known = {}
+        results = [None] * len(texts)
+        sentences = []
+        counts = []
+        for n, text in enumerate(texts):
+            lowered = text.lower()
+            if self.PLAIN.fullmatch(lowered):
+                tokens = []
+                for word in lowered.translate(self.PLAIN_SEPARATORS).split():
+                    word_tokens = known.get(word)
+                    if word_tokens is None:
+                        word_tokens = known[word] = [token for token in CONTRACTIONS.get(word, (word,))
+                                                     if token not in self._stop_words]
+                    tokens.extend(word_tokens)
+                results[n] = tokens
+                continue
+            parts = self._sent_tokenize(lowered) if '\n' not in text else None
+            if parts is None or not all(part.strip() and '\n' not in part for part in parts):
+                results[n] = self(text)
+                continue
+            sentences.extend(parts)
+            counts.append((n, len(parts)))
+        if not sentences:
+            return results
+
+        before, after = self._batch_rules
+        lines = '\n'.join(sentences)
+        for regexp, substitution in before:
+            lines = regexp.sub(substitution, lines)
+        # Pad every sentence with spaces, as NLTK does before its ending rules
+        lines = ' ' + lines.replace('\n', ' \n ') + ' '
+        for regexp, substitution in after:
+            lines = regexp.sub(substitution, lines)
+        line_tokens = iter(lines.split('\n'))
+
+        for n, count in counts:
+            tokens = [token for _ in range(count) for token in next(line_tokens).split()]
+            results[n] = [token for token in tokens if token not in self._stop_words and token.isalnum()]
+        return results
+
+
+class FastTokenizer:
+    """
+    Regex/translate tokenizer producing the same tokens as NltkTokenizer.
+
+    Only alphanumeric tokens survive the filter, so it is enough to replicate
+    the NLTK rules that decide which parts of a word end up alphanumeric:
+    punctuation that NLTK splits off, leading quotes, clitics ("n't", "'s",
+    ...), sentence-final periods and the MacIntyre contractions. Punkt's
+    sentence splitting is approximated: a trailing period is dropped unless
+    the word is a number inside the text, which matches every sentence in the
+    shipped documents but not every abbreviation heuristic of Punkt.
+    """
+
+    name = 'fast'
+
+    # Characters NLTK always splits into separate tokens
+    SEPARATORS = str.maketrans({char: ' ' for char in
+                                '«“‘„»”’"`;@#$%&?!*()[]{}<>‒–—―'})
+    # Colons and commas are split unless a digit follows; runs of periods always
+    SPLIT_PUNCTUATION = re.compile(r"[:,](?!\d)|\.{2,}")
+    LEADING_QUOTE = re.compile(r"^'(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+    CLITIC = re.compile(r"(?<=[^' ])(?:'s|'m|'d|')$")
+    CLITIC_LONG = re.compile(r"(?<=[^' ])(?:'ll|'re|'ve|n't)$")
+    # Punkt does not end a sentence after a lowercase-followed number like "1."
+    NUMBER = re.compile(r"^-?[.,]?\d[\d,.-]*\.$")
+
+    def __call__(self, text):
+        """Tokenize, lowercase and drop stopwords and non-alphanumeric tokens."""
+        words = self._words(text)
+        last = len(words) - 1
+        return [token for position, word in enumerate(words) for token in self._word_tokens(word, position == last)]
+
+    def tokenize_batch(self, texts):
+        """
+        Tokenize many texts with the same result as calling the tokenizer on
+        each. Words are normalized once per batch, however often they occur.
+        """
+        known = {}
+        results = []
+        for text in texts:
+            words = self._words(text)
+            last = len(words) - 1
+            tokens = []
+            for position, word in enumerate(words):
+                key = (word, position == last)
+                word_tokens = known.get(key)
+                if word_tokens is None:
+                    word_tokens = known[key] = self._word_tokens(*key)
+                tokens.extend(word_tokens)
+            results.append(tokens)
+        return results
+
+    def _words(self, text):
+        """Split lowercased ``text`` into words at the punctuation NLTK separates."""
+        return self.SPLIT_PUNCTUATION.sub(' ', text.lower().translate(self.SEPARATORS)).split()
+
+    def _word_tokens(self, word, last):
+        """The tokens kept from one word; ``last`` if it ends the text."""
+        if word[0] == "'":
+            word = self.LEADING_QUOTE.sub('', word)
+        if word[-1] == '.' and (last or not self.NUMBER.match(word)):
+            word = word[:-1]
+        if "'" in word:
+            word = self.CLITIC_LONG.sub('', self.CLITIC.sub('', word))
+
+        if not word.isalnum():
+            return ()
+        return tuple(token for token in CONTRACTIONS.get(word, (word,)) if token not in STOP_WORDS)
+
+
+TOKENIZERS = {
+    'nltk': NltkTokenizer,
+    'fast': FastTokenizer
+}
+
+
+def create_tokenizer(name='nltk'):
+    """Create the tokenizer called ``name``."""
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer: {name}")
+    return TOKENIZERS[name]()
@@ -0,0 +1,15 @@
+"""
+ASGI entry point for high-concurrency deployments, e.g.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+
+Each worker loads the index in the background at startup (from the mmap
+snapshot when one exists); /api/ready answers 503 until it is loaded.
+CDP_ASGI_THREADS (default 8) sizes each worker's search thread pool.
+"""
+import os
+
+from app import create_app
+from app.asgi import AsyncChatApp
+
+app = AsyncChatApp(create_app(), max_threads=int(os.environ.get('CDP_ASGI_THREADS', 8)))
@@ -0,0 +1,158 @@
+"""
+Compare the memory and ranking of the compact index storage modes.
+
+Section text is loaded once as a list of dicts per CDP, as the indexer used
+to keep it, and once into PackedSections. Then the index is built with each
+``--precision`` and loaded from its snapshot, as a server worker would load
+it, with every array paged in. Every measurement runs in a fresh process, so
+resident memory figures are not inflated by earlier ones or by the build.
+
+Ranking parity compares each compact mode's search() results with float64:
+recall is the share of float64 top-k passages it still returns, exact the
+share of queries with identical results. Modes whose recall is below
+``--min-recall`` are flagged.
+
+    python -m benchmarks.bench_compact --sections 25000 --precision float64 float32 uint8
+"""
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from app.doc_store import PackedSections, SectionWriter, find_docs_file, iter_sections
+from app.indexer import DocumentIndexer
+from app.scoring import SCORING_MODES, create_scoring
+from app.sparse_index import PRECISIONS
+from app.tokenizer import TOKENIZERS, create_tokenizer
+from benchmarks.common import CDPS, make_queries, peak_rss_bytes, rss_bytes, write_corpus
+
+ROOT = Path(__file__).parent.parent
+
+TEXT_MODES = {
+    'dicts': list,
+    'packed': PackedSections
+}
+
+
+def measure_text(docs_path, mode):
+    """Resident memory taken by every CDP's sections held in ``mode``."""
+    gc.collect()
+    before = rss_bytes()
+    sections = {cdp: TEXT_MODES[mode](iter_sections(find_docs_file(docs_path, cdp))) for cdp in CDPS}
+    gc.collect()
+    return {'rss_delta_bytes': rss_bytes() - before, 'sections': sum(len(s) for s in sections.values())}
+
+
+def create_indexer(docs_path, precision, args):
+    return DocumentIndexer(docs_path=docs_path, index_path=docs_path.parent / f"index-{precision}",
+                           scoring=create_scoring(args.scoring), tokenizer=create_tokenizer(args.tokenizer),
+                           precision=precision)
+
+
+def measure_index(docs_path, precision, queries, args):
+    """Resident memory, posting bytes and search results of the ``precision`` index loaded from its snapshot."""
+    gc.collect()
+    before = rss_bytes()
+    indexer = create_indexer(docs_path, precision, args)
+    state = indexer.state
+    # Page in the memory-mapped arrays, as a long-running server ends up doing
+    checksum = sum(float(array.sum()) for index in state.doc_vectors.values()
+                   for array in (index.indptr, index.doc_ids, index.tf, index.weights, index.bases, index.scales)
+                   if array is not None)
+    gc.collect()
+    rss_delta = rss_bytes() - before
+
+    results = [[hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+                for content in indexer.search(query, cdp, top_k=args.top_k)]
+               for query in queries for cdp in CDPS]
+    return {
+        'rss_delta_bytes': rss_delta,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'index_bytes': int(sum(index.nbytes for index in state.doc_vectors.values())),
+        'text_bytes': int(sum(docs['sections'].nbytes for docs in state.doc_contents.values())),
+        'checksum': checksum,
+        'results': results
+    }
+
+
+def parity(expected, actual):
+    """Return (recall of the expected passages, share of identical result lists)."""
+    found = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    total = sum(len(e) for e in expected)
+    exact = sum(e == a for e, a in zip(expected, actual))
+    return found / total if total else 1.0, exact / len(expected)
+
+
+def child(mode, docs_path, args):
+    """Run ``mode`` in this process; the parent reads the JSON from the last line."""
+    logging.getLogger().setLevel(logging.ERROR)
+    if mode in TEXT_MODES:
+        return measure_text(docs_path, mode)
+    with open(docs_path.parent / 'queries.json', 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    return measure_index(docs_path, mode, queries, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=25000, help='sections per CDP')
+    parser.add_argument('--precision', nargs='+', default=list(PRECISIONS), choices=list(PRECISIONS))
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--min-recall', type=float, default=0.95)
+    parser.add_argument('--tokenizer', default='fast', choices=sorted(TOKENIZERS))
+    parser.add_argument('--scoring', default='tfidf', choices=sorted(SCORING_MODES))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--docs', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, Path(args.docs), args)))
+        return
+
+    options = ['--top-k', str(args.top_k), '--tokenizer', args.tokenizer, '--scoring', args.scoring]
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        # Section files as the scraper writes them, read one line at a time
+        for cdp in CDPS:
+            with SectionWriter(docs_path, cdp) as writer:
+                writer.write_all(iter_sections(find_docs_file(docs_path, cdp)))
+        with open(Path(tmp) / 'queries.json', 'w', encoding='utf-8') as f:
+            json.dump(make_queries(vocabulary, args.queries), f)
+        logging.getLogger().setLevel(logging.ERROR)
+        for precision in args.precision:
+            create_indexer(docs_path, precision, args)
+
+        def run(mode):
+            result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_compact', '--child', mode,
+                                     '--docs', str(docs_path)] + options, cwd=ROOT, stdout=subprocess.PIPE,
+                                    text=True, check=True)
+            return json.loads(result.stdout.strip().splitlines()[-1])
+
+        print(f"{args.sections} sections/CDP")
+        print(f"{'section text':<14} {'RSS MiB':>9}")
+        for mode in TEXT_MODES:
+            print(f"{mode:<14} {run(mode)['rss_delta_bytes'] / 2 ** 20:>9.1f}")
+
+        print(f"\n{'precision':<14} {'RSS MiB':>9} {'index MiB':>10} {'text MiB':>9} {'recall':>8} {'exact':>7}")
+        runs = {precision: run(precision) for precision in args.precision}
+        baseline = runs.get('float64')
+        for precision, result in runs.items():
+            line = (f"{precision:<14} {result['rss_delta_bytes'] / 2 ** 20:>9.1f} "
+                    f"{result['index_bytes'] / 2 ** 20:>10.1f} {result['text_bytes'] / 2 ** 20:>9.1f}")
+            if baseline is not None:
+                recall, exact = parity(baseline['results'], result['results'])
+                line += f" {recall:>8.4f} {exact:>7.4f}"
+                if recall < args.min_recall:
+                    line += f"  below --min-recall {args.min_recall}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Stress-test concurrent searches while the index is being swapped.
+
+Reader threads call search, search_many and search_batch in a loop. In the
+second phase a writer thread also alternates update_documents() between two
+versions of Segment's sections and full initialize() rebuilds. Every result
+must equal the result against one of the two versions (a torn state would
+differ or fail) and no search may log an error. Reader latency is compared
+with the first, writer-free phase and with the longest rebuild, which
+readers would wait out if they ever blocked on a swap.
+
+    python -m benchmarks.bench_concurrency --readers 8 --seconds 5
+"""
+import argparse
+import logging
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.doc_store import find_docs_file, iter_sections
+from app.indexer import DocumentIndexer
+from benchmarks.common import CDPS, make_queries, make_section, percentile, write_corpus
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def freeze(result):
+    """Turn a search result into something hashable."""
+    if isinstance(result, dict):
+        return tuple((cdp, freeze(docs)) for cdp, docs in result.items())
+    if isinstance(result, list):
+        return tuple(freeze(item) for item in result)
+    return result
+
+
+def operations(indexer, queries, batch_size=8):
+    """(name, callable) pairs covering the three search entry points."""
+    ops = []
+    for n, query in enumerate(queries):
+        ops.append((f"search {n}", lambda q=query: indexer.search(q, 'segment')))
+        ops.append((f"many {n}", lambda q=query: indexer.search_many(q, CDPS)))
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        ops.append((f"batch {start}", lambda b=batch: indexer.search_batch(b, 'segment')))
+    return ops
+
+
+def run_phase(ops, expected, readers, seconds, writer=None):
+    """Hammer ``ops`` from ``readers`` threads; return (latencies, mismatches, exceptions)."""
+    stop = threading.Event()
+    latencies = []
+    counts = {'mismatches': 0, 'exceptions': 0}
+    lock = threading.Lock()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        local = []
+        mismatches = exceptions = 0
+        while not stop.is_set():
+            name, op = rng.choice(ops)
+            start = time.perf_counter()
+            try:
+                result = op()
+            except Exception:
+                exceptions += 1
+                continue
+            local.append(time.perf_counter() - start)
+            mismatches += freeze(result) not in expected[name]
+        with lock:
+            latencies.extend(local)
+            counts['mismatches'] += mismatches
+            counts['exceptions'] += exceptions
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(readers)]
+    if writer is not None:
+        threads.append(threading.Thread(target=writer, args=(stop,)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), counts['mismatches'], counts['exceptions']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=1000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of each phase')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    errors = ErrorCounter()
+    logging.getLogger('app.indexer').addHandler(errors)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index')
+        ops = operations(indexer, queries)
+
+        # Two versions of Segment's sections; record every result under each
+        sections_a = list(iter_sections(find_docs_file(docs_path, 'segment')))
+        rng = random.Random(1)
+        sections_b = [make_section(rng, vocabulary) if rng.random() < 0.2 else section for section in sections_a]
+        expected = {name: set() for name, _ in ops}
+        for sections in (sections_b, sections_a):
+            indexer.update_documents('segment', sections)
+            for name, op in ops:
+                expected[name].add(freeze(op()))
+
+        swaps = [0]
+        writer_times = []
+
+        def writer(stop):
+            versions = [sections_b, sections_a]
+            while not stop.is_set():
+                start = time.perf_counter()
+                if swaps[0] % 3 == 2:
+                    indexer.initialize()
+                else:
+                    indexer.update_documents('segment', versions[swaps[0] % 2])
+                writer_times.append(time.perf_counter() - start)
+                swaps[0] += 1
+
+        print(f"{args.readers} readers, {len(ops)} operations, {args.sections} sections/CDP")
+        print(f"{'phase':<10} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'mismatch':>9} {'except':>7}")
+        for phase, phase_writer in [('baseline', None), ('swapping', writer)]:
+            latencies, mismatches, exceptions = run_phase(ops, expected, args.readers, args.seconds, phase_writer)
+            print(f"{phase:<10} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {latencies[-1] * 1000:>8.2f} "
+                  f"{mismatches:>9} {exceptions:>7}")
+
+        print(f"index swaps:        {swaps[0]} (longest {max(writer_times) * 1000:.1f} ms)")
+        print(f"logged errors:      {errors.count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure refresh cost with conditional fetching against a local stub site.
+
+Crawls the site three times: a cold crawl, an unchanged refresh, and a refresh
+after a few pages changed. Reports requests, 304s, bytes downloaded, time and
+the number of sections that would be handed to the indexer.
+
+    python -m benchmarks.bench_conditional_fetch --pages 200 --changed 10
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app.scraper import DocumentScraper
+from benchmarks.common import StubDocsServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--changed', type=int, default=10, help='pages modified before the last refresh')
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    with StubDocsServer(pages=args.pages, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        scraper = DocumentScraper(max_workers=16, per_host_concurrency=8, requests_per_second=0)
+        scraper.manifest_path = Path(tmp)
+        scraper.cdp_configs = {
+            'stub': {
+                'base_url': server.base_url,
+                'selectors': {'content': 'article', 'title': 'h1', 'sections': '.content'}
+            }
+        }
+
+        print(f"{'crawl':<12} {'requests':>9} {'304s':>6} {'KiB':>8} {'seconds':>8} {'changed sections':>17}")
+        for name in ['cold', 'unchanged', 'changed']:
+            if name == 'changed':
+                server.update_pages(args.changed)
+            server.reset_counters()
+            start = time.perf_counter()
+            scraper.scrape_documentation_concurrent('stub')
+            elapsed = time.perf_counter() - start
+            changes = scraper.last_changes['stub']
+            print(f"{name:<12} {server.requests:>9} {server.not_modified:>6} {server.bytes_sent / 1024:>8.1f} "
+                  f"{elapsed:>8.2f} {len(changes['changed_sections']):>17}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Compare in-thread HTML parsing with the process-pool parsing stage of the recursive crawl.
+
+Serves a directory of saved HTML pages over a local HTTP server and crawls it
+with DocumentScraper.crawl_documentation(). Without ``--fixtures`` a synthetic
+multi-level documentation site is generated first. Each ``--workers`` value is
+one run; 0 parses on the fetch threads. Pass ``--pool-min-pages 0`` to use the
+process pool from the first page, however small the crawl.
+
+    python -m benchmarks.bench_crawl_pipeline --branching 8 --depth 3
+    python -m benchmarks.bench_crawl_pipeline --fixtures saved_site/ --start /docs/
+"""
+import argparse
+import functools
+import http.server
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.scraper import DocumentScraper
+from benchmarks.common import make_section, make_vocabulary
+
+
+def write_site(root, branching, depth, paragraphs, seed=0):
+    """
+    Write a documentation tree under ``root/docs``: every page links to its
+    ``branching`` children plus a navigation block, so links are only
+    discovered by descending level by level. Returns the number of pages.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(5000, seed)
+    nav = ''.join(f'<a href="/docs/p{i}/">Guide {i}</a> ' for i in range(branching))
+    pages = 0
+
+    def write(path, level):
+        nonlocal pages
+        children = [f"{path}p{i}/" for i in range(branching)] if level < depth else []
+        sections = [make_section(rng, vocabulary) for _ in range(paragraphs)]
+        body = ''.join(
+            f'<div class="content"><h2>{section["title"]}</h2>'
+            f'<p>{section["content"]}</p><ul><li>{section["title"]}</li></ul></div>'
+            for section in sections
+        )
+        links = ''.join(f'<a href="{child}?utm_source=nav#top">{child}</a> ' for child in children)
+        html = (f"<html><head><title>{path}</title></head><body><nav>{nav}</nav>"
+                f"<article><h1>{path}</h1>{body}</article><footer>{links}</footer></body></html>")
+        out = Path(root) / path.lstrip('/') / 'index.html'
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(html, encoding='utf-8')
+        pages += 1
+        for child in children:
+            write(child, level + 1)
+
+    write('/docs/', 0)
+    return pages
+
+
+def serve(directory, latency):
+    """Serve ``directory`` on a local port, delaying each response by ``latency`` seconds."""
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=str(directory)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--fixtures', help='directory of saved HTML pages to serve instead of a synthetic site')
+    parser.add_argument('--start', default='/docs/', help='path the crawl starts from')
+    parser.add_argument('--branching', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--paragraphs', type=int, default=30, help='sections per synthetic page')
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--fetch-workers', type=int, default=16)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count() or 1],
+                        help='parse process counts to compare')
+    parser.add_argument('--pool-min-pages', type=int, help="changed pages parsed on the fetch threads before the "
+                        "process pool takes over (the scraper's default unless given)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        site = args.fixtures
+        if site is None:
+            site = Path(tmp) / 'site'
+            pages = write_site(site, args.branching, args.depth, args.paragraphs)
+            print(f"Generated {pages} pages")
+
+        httpd = serve(site, args.latency)
+        base_url = f"http://127.0.0.1:{httpd.server_address[1]}{args.start}"
+        try:
+            print(f"{'parse workers':>13} {'pages':>6} {'sections':>9} {'seconds':>8} {'pages/s':>8}")
+            baseline = None
+            for workers in args.workers:
+                scraper = DocumentScraper(max_workers=args.fetch_workers,
+                                          per_host_concurrency=args.fetch_workers, requests_per_second=0)
+                scraper.manifest_path = Path(tmp) / f"crawl-{workers}"
+                scraper.max_pages = 100000
+                scraper.max_depth = args.depth if args.fixtures is None else 100
+                scraper.parse_workers = workers
+                if args.pool_min_pages is not None:
+                    scraper.parse_pool_min_pages = args.pool_min_pages
+                scraper.cdp_configs = {
+                    'fixture': {
+                        'base_url': base_url,
+                        'selectors': {'content': 'article', 'title': 'h1', 'sections': '.content'}
+                    }
+                }
+                sections = list(scraper.crawl_documentation('fixture'))
+                stats = scraper.crawl_stats['fixture']
+                # Both modes must extract the same content; page order follows
+                # fetch completion, so compare without it
+                extracted = sorted((section['title'], section['content']) for section in sections)
+                if baseline is None:
+                    baseline = extracted
+                elif extracted != baseline:
+                    print(f"  MISMATCH with {workers} parse workers")
+                print(f"{workers:>13} {stats['pages']:>6} {len(sections):>9} "
+                      f"{stats['seconds']:>8.2f} {stats['pages_per_second']:>8.1f}")
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Crawl a local stub documentation site serially and concurrently.
+
+Reports pages/sec for both modes and the peak number of requests the stub
+server saw in flight, which must stay within the per-host limit.
+
+    python -m benchmarks.bench_crawler --pages 200 --latency 0.05
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app.scraper import DocumentScraper
+from benchmarks.common import StubDocsServer
+
+
+def crawl(server, scraper, concurrent):
+    scraper.cdp_configs = {
+        'stub': {
+            'base_url': server.base_url,
+            'selectors': {'content': 'article', 'title': 'h1', 'sections': '.content'}
+        }
+    }
+    server.reset_counters()
+    start = time.perf_counter()
+    if concurrent:
+        sections = list(scraper.scrape_documentation_concurrent('stub'))
+    else:
+        sections = list(scraper.scrape_documentation('stub'))
+    return sections, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub server response delay in seconds')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8, help='max concurrent requests per host')
+    parser.add_argument('--rate', type=float, default=100.0, help='max requests per second per host')
+    args = parser.parse_args()
+
+    with StubDocsServer(pages=args.pages, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        serial = DocumentScraper(max_workers=1, per_host_concurrency=1, requests_per_second=0)
+        serial.request_delay = 0
+        serial.manifest_path = Path(tmp) / 'serial'
+        serial_sections, serial_time = crawl(server, serial, concurrent=False)
+
+        concurrent = DocumentScraper(max_workers=args.workers, per_host_concurrency=args.per_host,
+                                     requests_per_second=args.rate)
+        concurrent.manifest_path = Path(tmp) / 'concurrent'
+        concurrent_sections, concurrent_time = crawl(server, concurrent, concurrent=True)
+
+        print(f"pages:             {args.pages} ({args.latency * 1000:.0f}ms latency)")
+        print(f"same sections:     {serial_sections == concurrent_sections}")
+        print(f"serial:            {args.pages / serial_time:8.1f} pages/s (without the 1s politeness sleep)")
+        print(f"concurrent:        {args.pages / concurrent_time:8.1f} pages/s")
+        print(f"peak in flight:    {server.peak_in_flight} (limit {args.per_host})")
+
+
+if __name__ == '__main__':
+    main()
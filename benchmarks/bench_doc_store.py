@@ -0,0 +1,82 @@
+"""
+Compare the legacy ``_docs.json`` layout with the streaming JSONL section files.
+
+For each format, writes one CDP's sections, then loads them back the way the
+indexer does, reporting file size, write/load time and peak Python memory
+(tracemalloc) of the load. Loaded sections must match the originals.
+
+    python -m benchmarks.bench_doc_store --sections 20000
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.doc_store import SectionWriter, find_docs_file, iter_sections
+from benchmarks.common import make_section, make_vocabulary
+
+
+def write_legacy(docs_path, sections):
+    """Write sections the way save_documentation used to."""
+    with open(Path(docs_path) / 'bench_docs.json', 'w', encoding='utf-8') as f:
+        json.dump({"platform": 'bench', "sections": sections}, f, indent=2, ensure_ascii=False)
+
+
+def load_legacy(docs_path):
+    """Load sections the way _load_documents used to."""
+    raw = (Path(docs_path) / 'bench_docs.json').read_bytes()
+    return json.loads(raw.decode('utf-8'))['sections']
+
+
+def write_jsonl(docs_path, sections, compress):
+    with SectionWriter(docs_path, 'bench', compress=compress) as writer:
+        writer.write_all(iter(sections))
+
+
+def load_jsonl(docs_path):
+    return list(iter_sections(find_docs_file(docs_path, 'bench')))
+
+
+def measure(load, docs_path):
+    """Return (sections, seconds, peak MiB) for one load."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    sections = load(docs_path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return sections, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(20000)
+    sections = [make_section(rng, vocabulary) for _ in range(args.sections)]
+
+    formats = [
+        ('json (legacy)', write_legacy, load_legacy),
+        ('jsonl', lambda path, s: write_jsonl(path, s, False), load_jsonl),
+        ('jsonl.gz', lambda path, s: write_jsonl(path, s, True), load_jsonl),
+    ]
+    print(f"{'format':<14} {'MiB on disk':>11} {'write':>8} {'load':>8} {'load peak MiB':>14} {'same':>5}")
+    for name, write, load in formats:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            write(tmp, sections)
+            write_time = time.perf_counter() - start
+            size = sum(path.stat().st_size for path in Path(tmp).iterdir()) / 2 ** 20
+
+            loaded, load_time, peak = measure(load, tmp)
+            print(f"{name:<14} {size:>11.1f} {write_time:>7.2f}s {load_time:>7.2f}s {peak:>14.1f} "
+                  f"{str(loaded == sections):>5}")
+
+
+if __name__ == '__main__':
+    main()
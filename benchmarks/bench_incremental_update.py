@@ -0,0 +1,55 @@
+"""
+Measure incremental update_documents() latency against a full rebuild.
+
+For each corpus size, 5% of one CDP's sections are replaced. The updated index
+is checked against a from-scratch build of the same files.
+
+    python -m benchmarks.bench_incremental_update --sizes 500 2000 8000
+"""
+import argparse
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from benchmarks.common import make_queries, make_section, timed, write_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 8000], help='sections per CDP')
+    parser.add_argument('--changed', type=float, default=0.05, help='fraction of sections to replace')
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'sections/CDP':>12} {'incremental':>12} {'full rebuild':>13} {'speedup':>8} {'mismatches':>11}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            docs_path = Path(tmp) / 'docs'
+            vocabulary = write_corpus(docs_path, size)
+            queries = make_queries(vocabulary, args.queries)
+            indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index')
+
+            with open(docs_path / 'segment_docs.json', 'r', encoding='utf-8') as f:
+                sections = json.load(f)['sections']
+            rng = random.Random(size)
+            for idx in rng.sample(range(len(sections)), max(1, int(len(sections) * args.changed))):
+                sections[idx] = make_section(rng, vocabulary)
+
+            _, incremental = timed(indexer.update_documents, 'segment', sections)
+
+            # Cold rebuild of the same files, as update_documents used to do
+            rebuilt, full = timed(DocumentIndexer, docs_path=docs_path,
+                                  index_path=Path(tmp) / 'cold', use_snapshot=False)
+
+            mismatches = sum(
+                indexer.search(query, cdp) != rebuilt.search(query, cdp)
+                for query in queries for cdp in rebuilt.doc_contents
+            )
+            print(f"{size:>12} {incremental * 1000:>10.1f}ms {full * 1000:>11.1f}ms "
+                  f"{full / incremental:>7.1f}x {mismatches:>11}")
+
+
+if __name__ == '__main__':
+    main()
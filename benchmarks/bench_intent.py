@@ -0,0 +1,88 @@
+"""
+Check the intent analyzer on labeled questions and time it against the
+original per-request keyword and regex scans.
+
+benchmarks/intent_questions.json lists the expected CDPs, comparison and
+how-to flags of representative questions. Any question the analyzer gets
+wrong is printed and the script exits non-zero.
+
+    python -m benchmarks.bench_intent --repeat 2000
+"""
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+from app.intent import IntentAnalyzer
+from benchmarks.common import timed
+
+QUESTIONS_PATH = Path(__file__).parent / 'intent_questions.json'
+
+CDP_KEYWORDS = {
+    'segment': ['segment', 'segment.com'],
+    'mparticle': ['mparticle', 'mparticle.com'],
+    'lytics': ['lytics', 'lytics.com'],
+    'zeotap': ['zeotap', 'zeotap.com']
+}
+
+
+def legacy_analyze(question):
+    """The original substring and regex checks of CDPChatbot."""
+    mentioned = [cdp for cdp, keywords in CDP_KEYWORDS.items()
+                 if any(keyword in question.lower() for keyword in keywords)]
+    comparison_keywords = ['compare', 'comparison', 'versus', 'vs', 'difference', 'better', 'between']
+    is_comparison = any(keyword in question.lower() for keyword in comparison_keywords)
+    how_to_patterns = [
+        r'^how (do|can|to|would|should) (i|you|we)',
+        r'^what( is|\'s) the (best way|way) to',
+        r'^what are the steps to',
+        r'steps (for|to)',
+        r'guide (for|to)',
+        r'tutorial (for|on)',
+        r'process (of|for)',
+        r'procedure (for|to)'
+    ]
+    is_how_to = any(re.search(pattern, question.lower()) for pattern in how_to_patterns)
+    return mentioned, is_comparison, is_how_to
+
+
+def failures(analyze, questions):
+    """Return the questions whose (cdps, comparison, how_to) differ from the labels."""
+    wrong = []
+    for item in questions:
+        expected = (item['cdps'], item['comparison'], item['how_to'])
+        actual = tuple(analyze(item['question']))
+        if actual != expected:
+            wrong.append((item['question'], expected, actual))
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(QUESTIONS_PATH, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    analyzer = IntentAnalyzer(CDP_KEYWORDS)
+
+    wrong = failures(analyzer.analyze, questions)
+    for question, expected, actual in wrong:
+        print(f"FAIL {question!r}: expected {expected}, got {actual}")
+
+    texts = [item['question'] for item in questions]
+    _, legacy_time = timed(lambda: [legacy_analyze(text) for text in texts], repeat=args.repeat)
+    _, analyzer_time = timed(lambda: [analyzer.analyze(text) for text in texts], repeat=args.repeat)
+
+    print(f"labeled questions:  {len(questions)}")
+    print(f"analyzer failures:  {len(wrong)}")
+    print(f"legacy failures:    {len(failures(legacy_analyze, questions))}")
+    print(f"legacy latency:     {legacy_time / len(texts) * 1e6:.2f} us/question")
+    print(f"analyzer latency:   {analyzer_time / len(texts) * 1e6:.2f} us/question")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
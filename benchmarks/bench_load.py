@@ -0,0 +1,157 @@
+"""
+Load-test the chatbot server: throughput and latency percentiles.
+
+Each ``--mode`` starts a local server on ``--port``, waits for /api/ready
+(reporting how long that took), sends ``--requests`` questions from
+``--concurrency`` keep-alive connections and stops the server:
+
+    dev   Flask's threaded development server (the run.py baseline)
+    wsgi  gunicorn with gunicorn.conf.py (preloaded index)
+    asgi  uvicorn with asgi:app
+
+Modes whose server is not installed are skipped. ``--url`` instead targets a
+server that is already running. The response cache is disabled in started
+servers unless ``--cache`` is given, so every request runs a search.
+
+    python -m benchmarks.bench_load --mode dev wsgi asgi --workers 2
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmarks.common import percentile
+
+ROOT = Path(__file__).parent.parent
+QUESTION_FILES = [Path(__file__).parent / 'relevance_questions.json', Path(__file__).parent / 'intent_questions.json']
+
+SERVERS = {
+    'dev': ('flask', ['-m', 'flask', '--app', 'wsgi', 'run', '--host', '127.0.0.1', '--port', '{port}',
+                      '--no-reload', '--no-debugger', '--with-threads']),
+    'wsgi': ('gunicorn', ['-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}',
+                          '--workers', '{workers}']),
+    'asgi': ('uvicorn', ['-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}',
+                         '--workers', '{workers}', '--log-level', 'warning'])
+}
+
+
+def load_questions():
+    """Representative questions from the benchmark question sets."""
+    questions = []
+    for path in QUESTION_FILES:
+        with open(path, 'r', encoding='utf-8') as f:
+            questions.extend(item['question'] for item in json.load(f) if item['question'])
+    return questions
+
+
+def wait_ready(host, port, timeout):
+    """Poll /api/ready until it answers 200; return the seconds waited or None."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request('GET', '/api/ready')
+            if connection.getresponse().status == 200:
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return None
+
+
+def run_load(host, port, endpoint, questions, total, concurrency):
+    """Send ``total`` requests over ``concurrency`` connections; return (latencies, errors, seconds)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        for n in counter:
+            body = json.dumps({'question': questions[n % len(questions)]})
+            start = time.perf_counter()
+            try:
+                connection.request('POST', endpoint, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=60)
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0], time.perf_counter() - start
+
+
+def report(name, ready, latencies, errors, seconds):
+    ready = f"{ready:.1f}s" if ready is not None else '-'
+    print(f"{name:<6} {ready:>7} {len(latencies) / seconds:>9.1f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+          f"{percentile(latencies, 0.99) * 1000:>8.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', nargs='+', choices=sorted(SERVERS), default=['dev', 'wsgi', 'asgi'])
+    parser.add_argument('--url', help='load-test a running server instead of starting one')
+    parser.add_argument('--endpoint', default='/api/chat', choices=['/api/chat', '/api/chat/stream'])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    args = parser.parse_args()
+
+    questions = load_questions()
+    print(f"{args.requests} requests to {args.endpoint}, concurrency {args.concurrency}")
+    print(f"{'mode':<6} {'ready':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+
+    if args.url:
+        url = urlsplit(args.url)
+        report('url', None, *run_load(url.hostname, url.port or 80, args.endpoint, questions, args.requests,
+                                      args.concurrency))
+        return
+
+    env = dict(os.environ)
+    if not args.cache:
+        env['CDP_RESPONSE_CACHE_SIZE'] = '0'
+    for mode in args.mode:
+        module, server_args = SERVERS[mode]
+        if importlib.util.find_spec(module) is None:
+            print(f"{mode:<6} skipped: {module} is not installed")
+            continue
+
+        command = [sys.executable] + [arg.format(port=args.port, workers=args.workers) for arg in server_args]
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            ready = wait_ready('127.0.0.1', args.port, timeout=300)
+            if ready is None:
+                print(f"{mode:<6} failed: server not ready")
+                continue
+            report(mode, ready, *run_load('127.0.0.1', args.port, args.endpoint, questions, args.requests,
+                                          args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
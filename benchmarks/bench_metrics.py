@@ -0,0 +1,88 @@
+"""
+Measure the cost of the search instrumentation and the slow request profiler.
+
+Times search() over a synthetic corpus, then the instrumentation one search
+records (stage marks, the latency histogram and the result counters) on
+throwaway metrics, and reports it as a share of the search. The recorded
+query counts must match the searches run. Search latency is also measured
+while the sampling profiler is active, and the /metrics text is rendered.
+
+    python -m benchmarks.bench_metrics --sections 2000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.indexer import DocumentIndexer
+from app.metrics import REGISTRY, SEARCH_QUERIES, Counter, Histogram, StageTimer
+from app.profiler import SlowRequestProfiler
+from benchmarks.common import CDPS, make_queries, timed, write_corpus
+
+
+def instrumentation(count, similarities):
+    """Record ``count`` searches worth of metrics on throwaway metrics."""
+    stages = Histogram('bench_stage_seconds', '', ['operation', 'stage'])
+    seconds = Histogram('bench_search_seconds', '', ['operation', 'cdp'])
+    queries = Counter('bench_queries_total', '', ['cdp', 'outcome'])
+    filtered = Counter('bench_filtered_total', '', ['cdp'])
+    for n in range(count):
+        timer = StageTimer(stages, 'search')
+        for stage in ('tokenize', 'vectorize', 'score', 'top_k', 'results'):
+            timer.mark(stage)
+        seconds.observe(timer.finish(), 'search', 'segment')
+        # The worst case: a short result list costs an extra pass over the scores
+        matching = min(3, int(np.count_nonzero(similarities > 0)))
+        queries.inc('segment', 'results')
+        if matching > 1:
+            filtered.inc('segment', amount=matching - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index')
+
+        def search_all():
+            return [indexer.search(query, cdp) for query in queries for cdp in CDPS]
+
+        searches = len(queries) * len(CDPS)
+        before = sum(SEARCH_QUERIES.value(cdp, outcome) for cdp in CDPS for outcome in ('results', 'empty'))
+        expected, search_time = timed(search_all, repeat=3)
+        after = sum(SEARCH_QUERIES.value(cdp, outcome) for cdp in CDPS for outcome in ('results', 'empty'))
+
+        similarities = np.zeros(indexer.state.doc_vectors['segment'].n_docs)
+        _, metrics_time = timed(instrumentation, searches, similarities, repeat=3)
+
+        profiler = SlowRequestProfiler(threshold=float('inf'), interval=0.005, output_dir=Path(tmp) / 'profiles')
+        samples = profiler.start()
+        start = time.perf_counter()
+        profiled = search_all()
+        profiled_time = time.perf_counter() - start
+        profiler.finish('bench', samples)
+
+        start = time.perf_counter()
+        text = REGISTRY.render()
+        render_time = time.perf_counter() - start
+
+        print(f"sections per CDP:      {args.sections}")
+        print(f"recorded queries:      {after - before} / {3 * searches}")
+        print(f"search():              {search_time / searches * 1e6:.1f} µs/search")
+        print(f"instrumentation:       {metrics_time / searches * 1e6:.2f} µs/search "
+              f"({metrics_time / search_time * 100:.1f}% of a search)")
+        print(f"search() profiled:     {profiled_time / searches * 1e6:.1f} µs/search, "
+              f"{sum(samples.values())} samples, results {'match' if profiled == expected else 'DIFFER'}")
+        print(f"/metrics render:       {render_time * 1000:.2f} ms, {len(text.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare whole-section indexing with passage indexing and snippet extraction.
+
+Builds a corpus of long sections and plants each query's terms in a short
+window of one target section. For each mode, reports index size, build time,
+query latency, mean response size and how often the target section ranks first.
+
+    python -m benchmarks.bench_passages --sections 300 --queries 200
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from benchmarks.common import CDPS, make_section, make_vocabulary, timed
+
+MODES = [
+    ('whole sections', dict(passage_words=0, snippet_words=0)),
+    ('passages', dict(passage_words=150, passage_overlap=30, snippet_words=0)),
+    ('passages+snippets', dict(passage_words=150, passage_overlap=30, snippet_words=50)),
+]
+
+
+def write_long_corpus(path, sections_per_cdp, n_queries, seed=0):
+    """
+    Write sections of 300-3000 words and plant every query in one of them.
+    Returns ``[(query, cdp, target title)]``.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(20000, seed)
+    rng.shuffle(vocabulary)
+    # Planted terms come from the rare end of the distribution
+    rare = vocabulary[len(vocabulary) // 2:]
+
+    corpus = {cdp: [make_section(rng, vocabulary, 300, 3000) for _ in range(sections_per_cdp)] for cdp in CDPS}
+    for cdp, sections in corpus.items():
+        for i, section in enumerate(sections):
+            section['title'] = f"{cdp} section {i}"
+
+    queries = []
+    for _ in range(n_queries):
+        cdp = rng.choice(CDPS)
+        section = rng.choice(corpus[cdp])
+        terms = rng.sample(rare, 3)
+        words = section['content'].split()
+        at = rng.randrange(len(words) - 40)
+        for offset in range(0, 40, 4):
+            words[at + offset] = terms[offset % 3]
+        section['content'] = ' '.join(words)
+        queries.append((' '.join(terms), cdp, section['title']))
+
+    Path(path).mkdir(parents=True, exist_ok=True)
+    for cdp, sections in corpus.items():
+        with open(Path(path) / f"{cdp}_docs.json", 'w', encoding='utf-8') as f:
+            json.dump({"platform": cdp, "sections": sections}, f)
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=300, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        queries = write_long_corpus(docs_path, args.sections, args.queries)
+
+        print(f"{'mode':<18} {'docs':>7} {'index MiB':>10} {'build':>7} {'ms/query':>9} "
+              f"{'response bytes':>15} {'hit@1':>6}")
+        for name, options in MODES:
+            start = time.perf_counter()
+            indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / name, use_snapshot=False,
+                                      **options)
+            build = time.perf_counter() - start
+
+            snippets = bool(options['snippet_words'])
+            results, latency = timed(lambda: [indexer.search(query, cdp, snippets=snippets)
+                                              for query, cdp, _ in queries])
+            hits = 0
+            for (query, cdp, title), result in zip(queries, results):
+                # Identify the top section by title, independent of the result format
+                top = indexer.search(query, cdp, top_k=1, snippets=True)
+                hits += bool(top) and top[0]['title'] == title
+            response_bytes = [len(json.dumps(result[0]).encode('utf-8')) for result in results if result]
+
+            n_docs = sum(index.n_docs for index in indexer.doc_vectors.values())
+            index_bytes = sum(index.nbytes for index in indexer.doc_vectors.values())
+            print(f"{name:<18} {n_docs:>7} {index_bytes / 2 ** 20:>10.1f} {build:>6.1f}s "
+                  f"{latency / len(queries) * 1000:>9.3f} "
+                  f"{sum(response_bytes) / max(1, len(response_bytes)):>15.0f} {hits / len(queries):>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
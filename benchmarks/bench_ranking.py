@@ -0,0 +1,73 @@
+"""
+Compare the TF-IDF and BM25 scoring modes for relevance and latency.
+
+Relevance is measured on a labeled question set over the shipped data/docs
+corpus (benchmarks/relevance_questions.json, one expected section title per
+question): hit@1 and mean reciprocal rank of the expected section in the top 3.
+Latency is measured on a synthetic corpus of ``--sections`` sections per CDP.
+
+    python -m benchmarks.bench_ranking --bm25 1.2:0.75 0.9:0.4
+"""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from app.scoring import create_scoring
+from benchmarks.common import DOCS_PATH, make_queries, timed, write_corpus
+
+QUESTIONS_PATH = Path(__file__).parent / 'relevance_questions.json'
+
+
+def relevance(indexer, questions, top_k=3):
+    """Return (hit@1, MRR@top_k) of the expected section titles."""
+    hits = reciprocal_ranks = 0.0
+    for item in questions:
+        titles = [result['title'] for result in indexer.search(item['question'], item['cdp'], top_k=top_k,
+                                                               snippets=True)]
+        if item['title'] in titles:
+            rank = titles.index(item['title']) + 1
+            hits += rank == 1
+            reciprocal_ranks += 1 / rank
+    return hits / len(questions), reciprocal_ranks / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--bm25', nargs='+', default=['1.2:0.75'], metavar='K1:B',
+                        help='BM25 parameter pairs to evaluate')
+    parser.add_argument('--sections', type=int, default=2000, help='sections per CDP for the latency corpus')
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    with open(QUESTIONS_PATH, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+
+    modes = [('tfidf', create_scoring('tfidf'))]
+    for pair in args.bm25:
+        k1, b = (float(value) for value in pair.split(':'))
+        modes.append((f"bm25 k1={k1:g} b={b:g}", create_scoring('bm25', k1=k1, b=b)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(synthetic_path, args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        DocumentIndexer(docs_path=synthetic_path, index_path=Path(tmp) / 'index', use_snapshot=False)
+
+        print(f"{len(questions)} labeled questions, latency over {args.sections} sections/CDP")
+        print(f"{'mode':<22} {'hit@1':>6} {'MRR@3':>6} {'build':>7} {'ms/query':>9}")
+        for name, scoring in modes:
+            labeled = DocumentIndexer(docs_path=DOCS_PATH, index_path=Path(tmp) / 'labeled', use_snapshot=False,
+                                      scoring=scoring)
+            hit_rate, mrr = relevance(labeled, questions)
+
+            # Share one warm token cache so build times compare the weighting only
+            indexer, build = timed(DocumentIndexer, docs_path=synthetic_path, index_path=Path(tmp) / 'index',
+                                   use_snapshot=False, scoring=scoring)
+            _, latency = timed(lambda: [indexer.search(query, 'segment') for query in queries])
+            print(f"{name:<22} {hit_rate:>6.2f} {mrr:>6.2f} {build:>6.2f}s {latency / len(queries) * 1000:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
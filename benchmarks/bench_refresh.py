@@ -0,0 +1,124 @@
+"""
+Measure search latency while the refresh scheduler crawls and hot-reloads.
+
+A stub documentation site stands in for Segment's docs. Reader threads
+search continuously while RefreshScheduler.run_once() crawls the site and
+reloads the index: first a full crawl that replaces Segment's sections, then
+a conditional re-crawl after ``--changed`` pages were edited. Latency during
+each refresh is compared with a quiet baseline; the reloaded index must
+serve the crawled content.
+
+    python -m benchmarks.bench_refresh --mode recursive concurrent
+"""
+import argparse
+import logging
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from app.refresh import REFRESH_MODES, RefreshScheduler
+from app.scraper import DocumentScraper
+from benchmarks.common import StubDocsServer, make_queries, percentile, write_corpus
+
+
+class Readers:
+    """Threads searching in a loop, recording latencies into the current phase."""
+
+    def __init__(self, indexer, queries, count):
+        self.indexer = indexer
+        self.queries = queries
+        self.latencies = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._read, args=(seed,)) for seed in range(count)]
+
+    def _read(self, seed):
+        rng = random.Random(seed)
+        while not self._stop.is_set():
+            query = rng.choice(self.queries)
+            start = time.perf_counter()
+            self.indexer.search(query, rng.choice(['segment', 'mparticle']))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.append(elapsed)
+
+    def phase(self):
+        """Return the latencies recorded since the last call, sorted."""
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return sorted(latencies)
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def report(name, latencies, seconds=None, refresh=None):
+    reloaded = ','.join(refresh['reloaded']) if refresh else ''
+    seconds = f"{seconds:.2f}s" if seconds is not None else ''
+    print(f"{name:<22} {seconds:>7} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.2f} "
+          f"{percentile(latencies, 0.99) * 1000:>8.2f} {latencies[-1] * 1000:>8.2f}  {reloaded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', nargs='+', choices=REFRESH_MODES, default=['recursive', 'concurrent'])
+    parser.add_argument('--sections', type=int, default=1000, help='sections per CDP before the refresh')
+    parser.add_argument('--pages', type=int, default=300, help='pages on the stub documentation site')
+    parser.add_argument('--changed', type=int, default=30, help='pages edited before the second refresh')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--baseline', type=float, default=2.0, help='seconds of quiet baseline')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"{'phase':<22} {'time':>7} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  reloaded")
+    for mode in args.mode:
+        with tempfile.TemporaryDirectory() as tmp, StubDocsServer(pages=args.pages, latency=0.002) as site:
+            docs_path = Path(tmp) / 'docs'
+            vocabulary = write_corpus(docs_path, args.sections)
+            indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index')
+
+            scraper = DocumentScraper(max_workers=8, per_host_concurrency=8, requests_per_second=0)
+            scraper.docs_path = docs_path
+            scraper.manifest_path = Path(tmp) / 'crawl'
+            scraper.request_delay = 0
+            scraper.max_depth = 1
+            scraper.cdp_configs = {
+                'segment': {
+                    'base_url': site.base_url,
+                    'selectors': {'content': 'article', 'title': 'h1', 'sections': '.content'}
+                }
+            }
+            scheduler = RefreshScheduler(scraper, lambda: indexer, interval=3600, mode=mode,
+                                         lock_path=Path(tmp) / 'refresh.lock')
+
+            version = indexer.version
+            with Readers(indexer, make_queries(vocabulary, 200), args.readers) as readers:
+                time.sleep(args.baseline)
+                report(f"{mode} baseline", readers.phase())
+
+                start = time.perf_counter()
+                refresh = scheduler.run_once(force=True)
+                report(f"{mode} full refresh", readers.phase(), time.perf_counter() - start, refresh)
+
+                site.update_pages(args.changed)
+                start = time.perf_counter()
+                refresh = scheduler.run_once(force=True)
+                report(f"{mode} re-crawl", readers.phase(), time.perf_counter() - start, refresh)
+
+            sections = indexer.state.doc_contents['segment']['sections']
+            if version == indexer.version or not any(section['title'].startswith('Section ') for section in sections):
+                print(f"  {mode}: the crawled documentation was not reloaded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure startup and memory as the number of registered platforms grows.
+
+For each ``--platforms`` count a registry of that many synthetic platforms
+is written and their index snapshot built. Each mode then starts in a fresh
+process and searches the first platform, the first quarter of them and all
+of them, reporting resident memory after each step:
+
+    memory   index built in-process, all text held in memory (the reference)
+    lazy     loaded from the snapshot, text read per platform on first use
+    budget   like lazy, with at most ``--budget-mb`` of text cached; the
+             memory-mapped postings of searched platforms come on top
+
+Results of every mode are compared with the in-memory index.
+
+    python -m benchmarks.bench_registry --platforms 4 16 --sections 2000 --budget-mb 4
+"""
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.doc_store import SectionWriter, find_docs_file, iter_sections
+from app.indexer import DocumentIndexer
+from app.registry import load_registry
+from app.tokenizer import TOKENIZERS, create_tokenizer
+from benchmarks.common import make_queries, rss_bytes, write_corpus
+
+ROOT = Path(__file__).parent.parent
+
+MODES = ['memory', 'lazy', 'budget']
+
+
+def write_registry(path, count):
+    """Write a registry of ``count`` platforms shaped like data/cdps.json."""
+    platforms = [{
+        'name': f"platform{n:02d}",
+        'title': f"Platform {n}",
+        'keywords': [f"platform{n:02d}"],
+        'base_url': f"https://docs.platform{n:02d}.example/",
+        'selectors': {'content': 'article', 'title': 'h1', 'sections': '.content'}
+    } for n in range(count)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'platforms': platforms}, f, indent=2)
+
+
+def create_indexer(docs_path, cdps, mode, args):
+    return DocumentIndexer(docs_path=docs_path, index_path=docs_path.parent / 'index', use_snapshot=mode != 'memory',
+                           tokenizer=create_tokenizer(args.tokenizer), cdps=cdps,
+                           section_cache_bytes=int(args.budget_mb * 2 ** 20) if mode == 'budget' else 0)
+
+
+def child(mode, docs_path, registry, args):
+    """Run ``mode`` in this process; the parent reads the JSON from the last line."""
+    logging.getLogger().setLevel(logging.ERROR)
+    cdps = [platform.name for platform in load_registry(registry)]
+    with open(docs_path.parent / 'queries.json', 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    indexer = create_indexer(docs_path, cdps, mode, args)
+    result = {'start_seconds': time.perf_counter() - start, 'rss_bytes': {}}
+    gc.collect()
+    result['rss_bytes']['start'] = rss_bytes() - before
+
+    for step, count in (('1', 1), ('quarter', max(1, len(cdps) // 4)), ('all', len(cdps))):
+        results = [[hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+                    for content in indexer.search(query, cdp, top_k=args.top_k)]
+                   for cdp in cdps[:count] for query in queries]
+        gc.collect()
+        result['rss_bytes'][step] = rss_bytes() - before
+    result['results'] = results
+    result['cache'] = indexer.section_cache.get_stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--platforms', type=int, nargs='+', default=[4, 16], help='registered platforms')
+    parser.add_argument('--sections', type=int, default=2000, help='sections per platform')
+    parser.add_argument('--queries', type=int, default=50, help='queries searched on each platform')
+    parser.add_argument('--budget-mb', type=float, default=4, help='section cache budget of the budget mode')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--tokenizer', default='fast', choices=sorted(TOKENIZERS))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--docs', help=argparse.SUPPRESS)
+    parser.add_argument('--registry', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, Path(args.docs), args.registry, args)))
+        return
+
+    options = ['--top-k', str(args.top_k), '--tokenizer', args.tokenizer, '--budget-mb', str(args.budget_mb)]
+    print(f"{args.sections} sections/platform, {args.queries} queries/platform, budget {args.budget_mb:g} MiB")
+    print(f"{'platforms':>9} {'mode':<7} {'start s':>8} {'RSS MiB: start':>15} {'1':>7} {'quarter':>8} {'all':>7} "
+          f"{'loads':>6} {'evicted':>8} {'parity':>7}")
+    for count in args.platforms:
+        with tempfile.TemporaryDirectory() as tmp:
+            docs_path = Path(tmp) / 'docs'
+            registry = Path(tmp) / 'cdps.json'
+            write_registry(registry, count)
+            cdps = [platform.name for platform in load_registry(registry)]
+            vocabulary = write_corpus(docs_path, args.sections, cdps=cdps)
+            # Section files as the scraper writes them, read one line at a time
+            for cdp in cdps:
+                with SectionWriter(docs_path, cdp) as writer:
+                    writer.write_all(iter_sections(find_docs_file(docs_path, cdp)))
+            with open(Path(tmp) / 'queries.json', 'w', encoding='utf-8') as f:
+                json.dump(make_queries(vocabulary, args.queries), f)
+            logging.getLogger().setLevel(logging.ERROR)
+            create_indexer(docs_path, cdps, 'lazy', args)
+
+            runs = {}
+            for mode in MODES:
+                output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_registry', '--child', mode,
+                                         '--docs', str(docs_path), '--registry', str(registry)] + options,
+                                        cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True).stdout
+                runs[mode] = result = json.loads(output.strip().splitlines()[-1])
+                rss = {step: value / 2 ** 20 for step, value in result['rss_bytes'].items()}
+                print(f"{count:>9} {mode:<7} {result['start_seconds']:>8.2f} {rss['start']:>15.1f} {rss['1']:>7.1f} "
+                      f"{rss['quarter']:>8.1f} {rss['all']:>7.1f} {result['cache']['loads']:>6} "
+                      f"{result['cache']['evictions']:>8} {result['results'] == runs['memory']['results']!s:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare search_batch() and /api/chat/batch against sequential calls.
+
+    python -m benchmarks.bench_search_batch --sections 2000 --queries 1000
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from benchmarks.common import make_queries, timed, write_corpus
+
+CHAT_QUESTIONS = [
+    "How do I set up a new source in Segment?",
+    "How can I create a user profile in mParticle?",
+    "How do I build an audience segment in Lytics?",
+    "How can I integrate my data with Zeotap?",
+    "Compare audience creation between Segment and Lytics",
+    "What is the weather like today?"
+]
+
+
+def bench_indexer(sections, n_queries):
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, sections)
+        queries = make_queries(vocabulary, n_queries)
+        indexer = DocumentIndexer(docs_path=docs_path)
+
+        expected, sequential = timed(lambda: [indexer.search(query, 'segment') for query in queries])
+        actual, batched = timed(indexer.search_batch, queries, 'segment')
+        mismatches = sum(e != a for e, a in zip(expected, actual))
+
+        print(f"indexer, {sections} sections/CDP, {n_queries} queries")
+        print(f"  result mismatches: {mismatches}")
+        print(f"  sequential search: {n_queries / sequential:10.0f} queries/s")
+        print(f"  search_batch:      {n_queries / batched:10.0f} queries/s ({sequential / batched:.1f}x)")
+
+
+def bench_endpoint(n_questions):
+    # Measure batching alone: no response cache, and no question asked twice
+    os.environ['CDP_RESPONSE_CACHE_SIZE'] = '0'
+    os.environ.pop('CDP_RESPONSE_CACHE_DB', None)
+    from app import create_app
+
+    client = create_app().test_client()
+    questions = [f"{CHAT_QUESTIONS[n % len(CHAT_QUESTIONS)]} (ticket {n})" for n in range(n_questions)]
+
+    def sequential():
+        return [client.post('/api/chat', json={'question': q}).get_json()['response'] for q in questions]
+
+    def batched():
+        return client.post('/api/chat/batch', json={'questions': questions}).get_json()['responses']
+
+    expected, sequential_time = timed(sequential)
+    actual, batched_time = timed(batched)
+
+    print(f"endpoint, {n_questions} questions")
+    print(f"  response mismatches: {sum(e != a for e, a in zip(expected, actual))}")
+    print(f"  /api/chat:         {n_questions / sequential_time:10.0f} questions/s")
+    print(f"  /api/chat/batch:   {n_questions / batched_time:10.0f} questions/s "
+          f"({sequential_time / batched_time:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    bench_indexer(args.sections, args.queries)
+    bench_endpoint(args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Compare search_many() against one search() call per CDP.
+
+    python -m benchmarks.bench_search_many --sections 2000
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from app.indexer import DocumentIndexer
+from benchmarks.common import CDPS, make_queries, timed, write_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        indexer = DocumentIndexer(docs_path=docs_path)
+
+        def per_cdp():
+            return [{cdp: indexer.search(query, cdp) for cdp in CDPS} for query in queries]
+
+        def batched():
+            return [indexer.search_many(query, CDPS) for query in queries]
+
+        expected, loop_time = timed(per_cdp, repeat=3)
+        actual, many_time = timed(batched, repeat=3)
+        mismatches = sum(e != a for e, a in zip(expected, actual))
+
+        print(f"sections per CDP:   {args.sections}")
+        print(f"result mismatches:  {mismatches} / {len(queries)}")
+        print(f"search() per CDP:   {loop_time / len(queries) * 1000:.3f} ms/question")
+        print(f"search_many():      {many_time / len(queries) * 1000:.3f} ms/question")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Compare sharded scoring on worker processes with the in-process index.
+
+For each ``--shards`` count, search(), search_many() and search_batch() must
+return exactly the in-process results, before and after Segment's sections
+are updated, and again after a shard worker is killed (the pool falls back
+to in-process scoring and restarts its workers). Reports search() latency
+percentiles and throughput with ``--threads`` concurrent callers.
+
+    python -m benchmarks.bench_shards --sections 50000 --shards 2 4
+"""
+import argparse
+import logging
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.doc_store import find_docs_file, iter_sections
+from app.indexer import DocumentIndexer
+from app.shards import ShardPool
+from app.tokenizer import TOKENIZERS, create_tokenizer
+from benchmarks.common import CDPS, make_queries, make_section, percentile, write_corpus
+
+
+def all_results(indexer, queries, batch_size=16):
+    """Every search entry point over ``queries``, as one comparable list."""
+    results = [indexer.search(query, cdp) for query in queries for cdp in CDPS]
+    results += [indexer.search_many(query, CDPS) for query in queries]
+    for start in range(0, len(queries), batch_size):
+        results += [indexer.search_batch(queries[start:start + batch_size], cdp) for cdp in CDPS]
+    return results
+
+
+def latencies(indexer, queries, threads):
+    """Run search() for every query from ``threads`` threads; return (sorted latencies, seconds)."""
+    work = iter([(query, CDPS[n % len(CDPS)]) for n, query in enumerate(queries)])
+    lock = threading.Lock()
+    recorded = []
+
+    def worker():
+        local = []
+        for query, cdp in work:
+            start = time.perf_counter()
+            indexer.search(query, cdp)
+            local.append(time.perf_counter() - start)
+        with lock:
+            recorded.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sorted(recorded), time.perf_counter() - start
+
+
+def report(name, recorded, seconds):
+    print(f"{name:<12} {percentile(recorded, 0.5) * 1000:>8.3f} {percentile(recorded, 0.99) * 1000:>8.3f} "
+          f"{len(recorded) / seconds:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=50000, help='sections per CDP')
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--tokenizer', default='fast', choices=sorted(TOKENIZERS))
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        vocabulary = write_corpus(Path(tmp) / 'docs', args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        rng = random.Random(1)
+        updated = [make_section(rng, vocabulary) if rng.random() < 0.2 else section
+                   for section in iter_sections(find_docs_file(Path(tmp) / 'docs', 'segment'))]
+
+        def indexer(name, shards=None):
+            """An indexer over its own copy of the corpus, so updates stay separate."""
+            docs_path = Path(tmp) / name
+            if not docs_path.exists():
+                shutil.copytree(Path(tmp) / 'docs', docs_path)
+            return DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index',
+                                   tokenizer=create_tokenizer(args.tokenizer), shards=shards)
+
+        local = indexer('local')
+        print(f"{args.sections} sections/CDP, {local.state.doc_vectors['segment'].n_docs} passages in Segment")
+        print(f"{'engine':<12} {'p50 ms':>8} {'p99 ms':>8} {'search/s':>9}")
+        report('in-process', *latencies(local, queries, args.threads))
+        expected = all_results(local, queries)
+        local.update_documents('segment', updated)
+        expected_updated = all_results(local, queries)
+
+        checks = {}
+        for n_shards in args.shards:
+            pool = ShardPool(n_shards)
+            sharded = indexer(f"shards-{n_shards}", pool)
+            mismatches = [sum(a != b for a, b in zip(expected, all_results(sharded, queries)))]
+            report(f"{n_shards} shards", *latencies(sharded, queries, args.threads))
+
+            # Updated documents reach the workers before the new index is published
+            sharded.update_documents('segment', updated)
+            mismatches.append(sum(a != b for a, b in zip(expected_updated, all_results(sharded, queries))))
+
+            # A dead worker: failed searches are scored in-process and the workers are restarted
+            pool._workers[0].process.kill()
+            pool._workers[0].process.join()
+            mismatches.append(sum(a != b for a, b in zip(expected_updated, all_results(sharded, queries))))
+            restarted = pool.started and all(worker.alive for worker in pool._workers)
+            pool.close()
+            checks[n_shards] = mismatches, restarted
+
+        for n_shards, ((initial, after_update, after_loss), restarted) in checks.items():
+            print(f"{n_shards} shards mismatches: initial {initial}, after update {after_update}, "
+                  f"after worker loss {after_loss} (workers {'restarted' if restarted else 'NOT restarted'})")
+
+if __name__ == '__main__':
+    main()
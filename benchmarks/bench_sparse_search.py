@@ -0,0 +1,85 @@
+"""
+Compare the sparse inverted index against the original dense TF-IDF matrices.
+
+Checks that both engines return the same ranked sections, then reports memory
+and per-query latency.
+
+    python -m benchmarks.bench_sparse_search --sections 2000
+"""
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from app.indexer import DocumentIndexer
+from benchmarks.common import make_queries, timed, write_corpus
+
+
+def build_dense_vectors(indexer):
+    """Rebuild the dense float64 document matrices the indexer used to keep."""
+    dense = {}
+    for cdp, docs in indexer.doc_contents.items():
+        vectors = []
+        for section in docs['sections']:
+            vectors.append(dense_tfidf(indexer, indexer._preprocess_text(section['content'])))
+        dense[cdp] = np.array(vectors)
+    return dense
+
+
+def dense_tfidf(indexer, tokens):
+    tf = np.zeros(len(indexer.vocab))
+    for word, count in Counter(tokens).items():
+        if word in indexer.vocab:
+            tf[indexer.vocab[word]] = count
+    tfidf = tf * indexer.idf
+    norm = np.linalg.norm(tfidf)
+    return tfidf / norm if norm > 0 else tfidf
+
+
+def dense_search(indexer, dense, query, cdp, top_k=3):
+    query_vector = dense_tfidf(indexer, indexer._preprocess_text(query))
+    similarities = np.dot(dense[cdp], query_vector)
+    top_indices = np.argsort(similarities)[-top_k:][::-1]
+    return [indexer.doc_contents[cdp]['sections'][idx]['content']
+            for idx in top_indices if similarities[idx] > 0.1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        queries = make_queries(vocabulary, args.queries)
+        # The dense reference scores whole sections
+        indexer = DocumentIndexer(docs_path=docs_path, passage_words=0)
+        dense = build_dense_vectors(indexer)
+
+        mismatches = 0
+        for query in queries:
+            for cdp in indexer.doc_contents:
+                if indexer.search(query, cdp) != dense_search(indexer, dense, query, cdp):
+                    mismatches += 1
+
+        _, sparse_time = timed(lambda: [indexer.search(q, 'segment') for q in queries])
+        _, dense_time = timed(lambda: [dense_search(indexer, dense, q, 'segment') for q in queries])
+
+        dense_bytes = sum(matrix.nbytes for matrix in dense.values())
+        sparse_bytes = sum(index.nbytes for index in indexer.doc_vectors.values())
+
+        print(f"sections per CDP:   {args.sections}")
+        print(f"vocabulary size:    {len(indexer.vocab)}")
+        print(f"ranking mismatches: {mismatches} / {len(queries) * len(indexer.doc_contents)}")
+        print(f"dense memory:       {dense_bytes / 2**20:.1f} MiB")
+        print(f"sparse memory:      {sparse_bytes / 2**20:.1f} MiB")
+        print(f"dense latency:      {dense_time / len(queries) * 1000:.3f} ms/query")
+        print(f"sparse latency:     {sparse_time / len(queries) * 1000:.3f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare time-to-first-byte of /api/chat and the streaming /api/chat/stream
+for comparison questions over all four CDPs.
+
+Checks that the streamed chunks join to the non-streaming response, then
+reports mean time to the first byte and to the complete answer. The response
+cache is disabled and the chatbot searches a synthetic corpus of
+``--sections`` sections per CDP.
+
+    python -m benchmarks.bench_streaming --sections 5000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import make_queries, write_corpus
+
+
+def timed_request(client, url, question):
+    """Return (body, seconds to the first body chunk, seconds to the last)."""
+    start = time.perf_counter()
+    response = client.post(url, json={'question': question}, buffered=False)
+    body = []
+    first = None
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        body.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+    response.close()
+    return b''.join(body).decode('utf-8'), first, time.perf_counter() - start
+
+
+def streamed_text(body):
+    """Join the ``chunk`` fields of the message events in an SSE body."""
+    chunks = []
+    for event in body.split('\n\n'):
+        if event.startswith('data: '):
+            chunks.append(json.loads(event[len('data: '):])['chunk'])
+    return ''.join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=5000, help='sections per CDP')
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['CDP_RESPONSE_CACHE_SIZE'] = '0'
+    from app import create_app
+    from app.chatbot import get_chatbot
+    from app.indexer import DocumentIndexer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        vocabulary = write_corpus(docs_path, args.sections)
+        questions = [f"Compare segment, mparticle, lytics and zeotap: {query}"
+                     for query in make_queries(vocabulary, args.queries)]
+        chatbot = get_chatbot()
+        chatbot.indexer = DocumentIndexer(docs_path=docs_path, index_path=Path(tmp) / 'index',
+                                          use_snapshot=False, tokenizer=chatbot.indexer.tokenizer)
+        client = create_app().test_client()
+
+        mismatches = 0
+        totals = {'/api/chat': [0.0, 0.0], '/api/chat/stream': [0.0, 0.0]}
+        for question in questions:
+            body, first, total = timed_request(client, '/api/chat', question)
+            expected = json.loads(body)['response']
+            totals['/api/chat'][0] += first
+            totals['/api/chat'][1] += total
+
+            body, first, total = timed_request(client, '/api/chat/stream', question)
+            mismatches += streamed_text(body) != expected
+            totals['/api/chat/stream'][0] += first
+            totals['/api/chat/stream'][1] += total
+
+        print(f"sections per CDP:    {args.sections}")
+        print(f"response mismatches: {mismatches} / {len(questions)}")
+        for url, (first, total) in totals.items():
+            print(f"{url:<19} first byte {first / len(questions) * 1000:>7.2f} ms  "
+                  f"complete {total / len(questions) * 1000:>7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the NLTK tokenizer against the fast regex/translate tokenizer.
+
+Checks that both produce the same tokens for every section title and content
+in data/docs, then reports the one-off NLTK load time and tokens/sec on the
+shipped sections and on a synthetic corpus.
+
+    python -m benchmarks.bench_tokenizer --sections 2000
+"""
+import argparse
+import random
+import time
+
+from app.doc_store import find_docs_file, iter_sections
+from app.tokenizer import FastTokenizer, NltkTokenizer
+from benchmarks.common import CDPS, DOCS_PATH, make_section, make_vocabulary, timed
+
+
+def shipped_texts():
+    """Titles and contents of every section in data/docs."""
+    texts = []
+    for cdp in CDPS:
+        docs_file = find_docs_file(DOCS_PATH, cdp)
+        if docs_file:
+            for section in iter_sections(docs_file):
+                texts.extend([section['title'], section['content']])
+    return texts
+
+
+def throughput(tokenizer, texts, repeat):
+    """Return tokens per second over ``repeat`` passes of ``texts``."""
+    tokens, seconds = timed(lambda: sum(len(tokenizer(text)) for text in texts), repeat=repeat)
+    return tokens / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='synthetic sections')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    nltk_tokenizer, fast_tokenizer = NltkTokenizer(), FastTokenizer()
+    start = time.perf_counter()
+    nltk_tokenizer('warm up')
+    nltk_load = time.perf_counter() - start
+
+    texts = shipped_texts()
+    mismatches = sum(nltk_tokenizer(text) != fast_tokenizer(text) for text in texts)
+    nltk_vocab = {token for text in texts for token in nltk_tokenizer(text)}
+    fast_vocab = {token for text in texts for token in fast_tokenizer(text)}
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(20000)
+    synthetic = [make_section(rng, vocabulary)['content'] for _ in range(args.sections)]
+
+    print(f"shipped texts:        {len(texts)}")
+    print(f"token mismatches:     {mismatches} / {len(texts)}")
+    print(f"vocabulary:           nltk {len(nltk_vocab)}, fast {len(fast_vocab)}, "
+          f"identical {nltk_vocab == fast_vocab}")
+    print(f"nltk first call:      {nltk_load * 1000:.1f} ms")
+    for name, corpus in [('shipped', texts), ('synthetic', synthetic)]:
+        nltk_rate = throughput(nltk_tokenizer, corpus, args.repeat)
+        fast_rate = throughput(fast_tokenizer, corpus, args.repeat)
+        print(f"{name + ' tokens/sec:':<21} nltk {nltk_rate:>10,.0f}  fast {fast_rate:>10,.0f}  "
+              f"({fast_rate / nltk_rate:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare threshold-first selection (top_k_indices) with the full argsort.
+
+Similarities are shaped like real search scores: most sections share no term
+with the query and score 0, the rest spread over (0, 1].
+
+    python -m benchmarks.bench_top_k --sizes 1000 10000 100000
+"""
+import argparse
+
+import numpy as np
+
+from app.indexer import MIN_SIMILARITY
+from app.sparse_index import top_k_indices
+from benchmarks.common import timed
+
+
+def argsort_top_k(similarities, top_k, min_similarity):
+    """The original selection: full sort, then threshold filter."""
+    top_indices = np.argsort(similarities, kind='stable')[-top_k:][::-1]
+    return [idx for idx in top_indices if similarities[idx] > min_similarity]
+
+
+def make_similarities(rng, size, match_rate):
+    similarities = np.zeros(size)
+    matches = rng.random(size) < match_rate
+    similarities[matches] = rng.random(matches.sum()) ** 3
+    return similarities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='sections per CDP')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--match-rate', type=float, default=0.2, help='fraction of sections sharing a query term')
+    parser.add_argument('--trials', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'sections':>9} {'argsort':>11} {'top_k_indices':>14} {'speedup':>8} {'mismatches':>11}")
+    for size in args.sizes:
+        samples = [make_similarities(rng, size, args.match_rate) for _ in range(args.trials)]
+        # Coarse rounding produces ties, which must be ordered the same way
+        samples += [np.round(s, 2) for s in samples[:args.trials // 4]]
+
+        mismatches = sum(
+            list(top_k_indices(s, args.top_k, MIN_SIMILARITY)) != argsort_top_k(s, args.top_k, MIN_SIMILARITY)
+            for s in samples
+        )
+        _, old = timed(lambda: [argsort_top_k(s, args.top_k, MIN_SIMILARITY) for s in samples])
+        _, new = timed(lambda: [top_k_indices(s, args.top_k, MIN_SIMILARITY) for s in samples])
+        print(f"{size:>9} {old / len(samples) * 1e6:>9.1f}us {new / len(samples) * 1e6:>12.1f}us "
+              f"{old / new:>7.1f}x {mismatches:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import random
+import resource
+import string
+import sys
+import time
+from pathlib import Path
+
+from app.registry import load_registry
+
+CDPS = [platform.name for platform in load_registry()]
+
+# The shipped documentation
+DOCS_PATH = Path(__file__).parent.parent / 'data' / 'docs'
+
+# Share of each kind of question in question_mix()
+QUESTION_MIX = {'how_to': 0.6, 'comparison': 0.25, 'irrelevant': 0.15}
+
+HOW_TO_TEMPLATES = [
+    "How do I {terms} in {cdp}?",
+    "How can I {terms} with {cdp}?",
+    "Steps to {terms} in {cdp}",
+    "What is {terms} in {cdp}?"
+]
+COMPARISON_TEMPLATES = [
+    "How does {cdp}'s {terms} compare to {other}'s?",
+    "Compare {terms} between {cdp} and {other}",
+    "{cdp} vs {other}: {terms}",
+    "What is the difference between {cdp} and {other} for {terms}?"
+]
+IRRELEVANT_QUESTIONS = [
+    "What is the weather like today?",
+    "Who won the football game last night?",
+    "Can you recommend a good pasta recipe?",
+    "How tall is the Eiffel Tower?",
+    "Tell me a joke about cats",
+    "What time is it in Tokyo?"
+]
+
+
+def make_vocabulary(size, seed=0):
+    """Generate a deterministic list of pseudo-words."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        length = rng.randint(3, 10)
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return sorted(words)
+
+
+def make_section(rng, vocabulary, min_words=40, max_words=200):
+    """Generate one section shaped like the entries in data/docs/*_docs.json."""
+    n_words = rng.randint(min_words, max_words)
+    # Zipf-like word distribution so a few terms are common and most are rare
+    words = [vocabulary[min(int(rng.paretovariate(0.8)) - 1, len(vocabulary) - 1)] for _ in range(n_words)]
+    return {
+        "title": ' '.join(words[:3]).title(),
+        "content": ' '.join(words) + '.'
+    }
+
+
+def write_corpus(path, sections_per_cdp, vocab_size=20000, seed=0, cdps=CDPS):
+    """
+    Write a synthetic ``{cdp}_docs.json`` corpus for each of ``cdps`` into ``path``.
+
+    Sections are written as they are generated, so corpora of a million
+    sections do not have to fit in memory; the file is what ``json.dump``
+    would write for the whole document.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocab_size, seed)
+    rng.shuffle(vocabulary)
+    for cdp in cdps:
+        with open(path / f"{cdp}_docs.json", 'w', encoding='utf-8') as f:
+            f.write(f'{{"platform": {json.dumps(cdp)}, "sections": [')
+            for n in range(sections_per_cdp):
+                f.write(', ' if n else '')
+                f.write(json.dumps(make_section(rng, vocabulary)))
+            f.write(']}')
+    return vocabulary
+
+
+def make_queries(vocabulary, count, seed=0, min_terms=2, max_terms=6):
+    """Generate queries drawn from the same word distribution as the corpus."""
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        n_terms = rng.randint(min_terms, max_terms)
+        queries.append(' '.join(
+            vocabulary[min(int(rng.paretovariate(0.8)) - 1, len(vocabulary) - 1)] for _ in range(n_terms)
+        ))
+    return queries
+
+
+def question_mix(vocabulary, count, seed=0, mix=QUESTION_MIX):
+    """
+    Generate ``(kind, question)`` pairs: how-to questions about one CDP,
+    comparisons of two CDPs and questions unrelated to any CDP, in the
+    proportions of ``mix``. Topics use the corpus word distribution.
+    """
+    rng = random.Random(seed + 2)
+    topics = make_queries(vocabulary, count, seed=seed, min_terms=1, max_terms=4)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    questions = []
+    for kind, terms in zip(kinds, topics):
+        cdp, other = (name.capitalize() for name in rng.sample(CDPS, 2))
+        if kind == 'how_to':
+            question = rng.choice(HOW_TO_TEMPLATES).format(terms=terms, cdp=cdp)
+        elif kind == 'comparison':
+            question = rng.choice(COMPARISON_TEMPLATES).format(terms=terms, cdp=cdp, other=other)
+        else:
+            question = rng.choice(IRRELEVANT_QUESTIONS)
+        questions.append((kind, question))
+    return questions
+
+
+def percentile(sorted_values, fraction):
+    """Return the ``fraction`` percentile of an ascending list."""
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def rss_bytes():
+    """Current resident memory of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """Run ``func`` ``repeat`` times and return (last result, mean seconds per call)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat
+
+
+class StubDocsServer:
+    """
+    Local HTTP server serving a synthetic documentation site.
+
+    ``/docs/`` links to ``pages`` article pages under ``/docs/page-N``. Each
+    response is delayed by ``latency`` seconds to mimic a remote host, and the
+    peak number of concurrent requests is recorded. Pages carry an ETag and
+    ``If-None-Match`` requests for unchanged pages get a 304.
+    """
+
+    def __init__(self, pages=100, latency=0.05, seed=0):
+        import http.server
+        import threading
+
+        rng = random.Random(seed)
+        vocabulary = make_vocabulary(2000, seed)
+        self.pages = {
+            f"/docs/page-{i}": self._render_page(make_section(rng, vocabulary), i)
+            for i in range(pages)
+        }
+        self.pages['/docs/'] = '<html><body>' + ''.join(
+            f'<a href="/docs/page-{i}">Page {i}</a>' for i in range(pages)
+        ) + '</body></html>'
+        self.latency = latency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                    body = server.pages.get(self.path)
+                    payload = (body or 'not found').encode('utf-8')
+                    etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+                    if body is not None and self.headers.get('If-None-Match') == etag:
+                        with lock:
+                            server.not_modified += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+
+                    self.send_response(200 if body is not None else 404)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    with lock:
+                        server.bytes_sent += len(payload)
+                finally:
+                    with lock:
+                        server.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/docs/"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def update_pages(self, count, seed=1):
+        """Replace the content of ``count`` article pages."""
+        rng = random.Random(seed)
+        vocabulary = make_vocabulary(2000, seed)
+        for i in rng.sample(range(len(self.pages) - 1), count):
+            self.pages[f"/docs/page-{i}"] = self._render_page(make_section(rng, vocabulary), i)
+
+    def reset_counters(self):
+        self.requests = self.not_modified = self.bytes_sent = self.peak_in_flight = 0
+
+    @staticmethod
+    def _render_page(section, number):
+        return (f"<html><body><article><h1>{section['title']}</h1>"
+                f"<div class=\"content\"><h2>Section {number}</h2><p>{section['content']}</p></div>"
+                f"</article></body></html>")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
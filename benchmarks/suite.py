@@ -0,0 +1,271 @@
+"""
+Reproducible benchmark suite: index build, memory, query latency and
+end-to-end /api/chat throughput over synthetic corpora.
+
+Each size in ``--sizes`` is a corpus of that many sections in total, split
+evenly over the four CDPs and shaped like data/docs/*_docs.json. Every size
+runs in a fresh process, so memory figures are not inflated by earlier
+sizes, and measures:
+
+    build     cold index build, rebuild from the token cache, snapshot load
+    memory    posting array and section text bytes, resident memory added by
+              the build, peak RSS
+    search    search() latency percentiles for corpus-like queries
+    chat      process_question() latency percentiles per kind of question
+              (how-to, comparison, irrelevant), response cache disabled
+    endpoint  /api/chat throughput through the Flask test client
+
+Corpora and questions are generated from ``--seed``. Results are written as
+JSON with the commit, environment and arguments (``--output``) so runs can
+be diffed between commits; ``--compare`` prints the change of every figure
+against an earlier result file.
+
+    python -m benchmarks.suite --sizes 1000 10000 --output before.json
+    python -m benchmarks.suite --sizes 1000 10000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from app import create_app
+from app.chatbot import CDPChatbot, set_chatbot
+from app.indexer import DocumentIndexer
+from app.scoring import SCORING_MODES, create_scoring
+from app.sparse_index import PRECISIONS
+from app.tokenizer import TOKENIZERS, create_tokenizer
+from benchmarks.common import (CDPS, QUESTION_MIX, make_queries, peak_rss_bytes, percentile, question_mix,
+                               rss_bytes, write_corpus)
+
+ROOT = Path(__file__).parent.parent
+
+# Bumped when result fields change meaning, so old files are not compared blindly
+SUITE_VERSION = 1
+
+# Untimed calls before each latency measurement
+WARMUP = 10
+
+
+def latency_stats(latencies):
+    """Summarize latencies in seconds as milliseconds."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 4),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 4),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4)
+    }
+
+
+def measure(func, items):
+    """Call ``func`` on every item after a warm-up; return the latencies in seconds."""
+    for item in items[:WARMUP]:
+        func(item)
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_size(sections, args):
+    """Run every measurement on a corpus of ``sections`` sections; return the results."""
+    os.environ['CDP_RESPONSE_CACHE_SIZE'] = '0'
+    os.environ.pop('CDP_RESPONSE_CACHE_DB', None)
+    os.environ['CDP_TOKENIZER'] = args.tokenizer
+    os.environ['CDP_SCORING'] = args.scoring
+    per_cdp = max(1, sections // len(CDPS))
+    result = {'sections': per_cdp * len(CDPS), 'sections_per_cdp': per_cdp}
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / 'docs'
+        index_path = Path(tmp) / 'index'
+
+        start = time.perf_counter()
+        vocabulary = write_corpus(docs_path, per_cdp, seed=args.seed)
+        generate = time.perf_counter() - start
+
+        def build(**options):
+            start = time.perf_counter()
+            indexer = DocumentIndexer(docs_path=docs_path, index_path=index_path,
+                                      scoring=create_scoring(args.scoring),
+                                      tokenizer=create_tokenizer(args.tokenizer), precision=args.precision,
+                                      **options)
+            return indexer, time.perf_counter() - start
+
+        rss_before = rss_bytes()
+        indexer, cold = build()
+        rss_after = rss_bytes()
+        stages = dict(indexer.build_timings)
+        _, token_cache = build(use_snapshot=False)
+        _, snapshot = build()
+
+        state = indexer.state
+        result['passages'] = sum(index.n_docs for index in state.doc_vectors.values())
+        result['vocabulary'] = len(state.vocab)
+        result['build'] = {
+            'generate_s': round(generate, 4),
+            'cold_s': round(cold, 4),
+            'token_cache_s': round(token_cache, 4),
+            'snapshot_load_s': round(snapshot, 4),
+            'stages_s': {stage: round(seconds, 4) for stage, seconds in stages.items()}
+        }
+        result['memory'] = {
+            'index_bytes': int(sum(index.nbytes for index in state.doc_vectors.values())
+                               + state.idf.nbytes + state.doc_freq.nbytes),
+            'text_bytes': int(sum(docs['sections'].nbytes for docs in state.doc_contents.values())),
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None else None,
+            'peak_rss_bytes': peak_rss_bytes()
+        }
+
+        queries = [(query, CDPS[n % len(CDPS)])
+                   for n, query in enumerate(make_queries(vocabulary, args.queries, seed=args.seed))]
+        result['search'] = latency_stats(measure(lambda item: indexer.search(*item), queries))
+
+        # Answer from the synthetic corpus; data/docs and data/index are never touched
+        chatbot = set_chatbot(CDPChatbot(indexer=indexer))
+        questions = question_mix(vocabulary, args.questions, seed=args.seed)
+        result['chat'] = {}
+        for kind in QUESTION_MIX:
+            kind_questions = [question for question_kind, question in questions if question_kind == kind]
+            result['chat'][kind] = latency_stats(measure(chatbot.process_question, kind_questions))
+
+        client = create_app().test_client()
+        bodies = [{'question': question} for _, question in questions]
+        statuses = []
+        latencies = measure(lambda body: statuses.append(client.post('/api/chat', json=body).status_code), bodies)
+        result['endpoint'] = {
+            'requests': len(latencies),
+            'errors': sum(status != 200 for status in statuses[len(statuses) - len(latencies):]),
+            'requests_per_s': round(len(latencies) / sum(latencies), 2),
+            **{key: value for key, value in latency_stats(latencies).items() if key != 'count'}
+        }
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def flatten(value, prefix=''):
+    """Yield ``(dotted.key, number)`` for every numeric leaf of a result."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, current):
+    """Print every figure of ``current`` next to ``baseline`` with the relative change."""
+    if baseline.get('suite_version') != current['suite_version']:
+        print(f"baseline was written by suite version {baseline.get('suite_version')}, "
+              f"not {current['suite_version']}; figures may not be comparable")
+    old_results = {result['sections']: result for result in baseline.get('results', [])}
+    print(f"\ncompared with {baseline['environment'].get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'figure':<44} {'before':>14} {'after':>14} {'change':>9}")
+    for result in current['results']:
+        old = old_results.get(result['sections'])
+        if old is None:
+            continue
+        old_figures = dict(flatten(old))
+        for key, value in flatten(result):
+            if key in old_figures and key not in ('sections', 'sections_per_cdp'):
+                before = old_figures[key]
+                change = f"{(value - before) / before * 100:+.1f}%" if before else ''
+                print(f"{result['sections']:>8} {key:<35} {before:>14,.4g} {value:>14,.4g} {change:>9}")
+
+
+def report(result):
+    build, memory, search, endpoint = result['build'], result['memory'], result['search'], result['endpoint']
+    chat = ' '.join(f"{kind} {stats.get('p50_ms', 0):.2f}/{stats.get('p99_ms', 0):.2f}"
+                    for kind, stats in result['chat'].items())
+    print(f"{result['sections']:>8} sections  build {build['cold_s']:.2f}s (token cache {build['token_cache_s']:.2f}s, "
+          f"snapshot {build['snapshot_load_s']:.3f}s)  index {memory['index_bytes'] / 2 ** 20:.1f} MiB, "
+          f"peak RSS {memory['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+    print(f"{'':>8}           search p50/p99 {search['p50_ms']:.3f}/{search['p99_ms']:.3f} ms  "
+          f"chat p50/p99 ms: {chat}")
+    print(f"{'':>8}           /api/chat {endpoint['requests_per_s']:.0f} req/s, p99 {endpoint['p99_ms']:.2f} ms, "
+          f"{endpoint['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='total sections of each corpus (1k to 1M)')
+    parser.add_argument('--queries', type=int, default=500, help='search() queries per size')
+    parser.add_argument('--questions', type=int, default=500, help='chat questions per size')
+    parser.add_argument('--tokenizer', default='nltk', choices=sorted(TOKENIZERS))
+    parser.add_argument('--scoring', default='tfidf', choices=sorted(SCORING_MODES))
+    parser.add_argument('--precision', default='float64', choices=list(PRECISIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON result file of an earlier run to compare with')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        # One size in this process; the parent reads the JSON from the last line
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)
+        print(json.dumps(run_size(args.child, args)))
+        return
+
+    suite = {
+        'suite_version': SUITE_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'arguments': {key: value for key, value in vars(args).items()
+                      if key not in ('output', 'compare', 'child')},
+        'results': []
+    }
+    options = ['--queries', str(args.queries), '--questions', str(args.questions), '--tokenizer', args.tokenizer,
+               '--scoring', args.scoring, '--precision', args.precision, '--seed', str(args.seed)]
+    for sections in args.sizes:
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--child', str(sections)] + options,
+                               cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        if child.returncode != 0:
+            print(f"{sections:>8} sections  failed with exit code {child.returncode}")
+            continue
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        suite['results'].append(result)
+        report(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(suite, f, indent=2)
+            f.write('\n')
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), suite)
+
+
+if __name__ == '__main__':
+    main()
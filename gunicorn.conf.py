@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for production: ``gunicorn -c gunicorn.conf.py``.
+
+CDP_BIND (default 0.0.0.0:5001), CDP_WORKERS (default 2 * CPUs + 1) and
+CDP_THREADS (default 4 per worker) size the server. Workers refresh the
+documentation in the background when CDP_REFRESH_INTERVAL is set.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('CDP_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('CDP_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('CDP_THREADS', 4))
+
+# Import wsgi.py, and so build the index, once in the master before forking
+preload_app = True
+# Streamed answers keep connections open longer than a plain request
+timeout = 60
+keepalive = 5
+
+
+def when_ready(server):
+    """Freeze the preloaded objects so the workers' garbage collector leaves their pages shared."""
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Start the documentation refresh scheduler (CDP_REFRESH_INTERVAL) in each worker."""
+    from app.refresh import start_scheduler
+
+    start_scheduler()
@@ -1,8 +1,18 @@
+import os
+
 from app import create_app
+from app.chatbot import preload
+from app.refresh import start_scheduler
 
 app = create_app()
 
 if __name__ == '__main__':
+    # With debug=True the reloader runs the app in a child process; build the
+    # index and refresh there only, so /api/ready means what it does under gunicorn
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        preload()
+        start_scheduler()
+
     # Run the application with settings suitable for web-based environment
     app.run(
         host='0.0.0.0',  # Allow external access
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production, served by gunicorn with gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py
+
+The index is built here, at import, so with ``preload_app`` it is built once
+in the gunicorn master and shared copy-on-write by the forked workers.
+"""
+from app import create_app
+from app.chatbot import preload
+
+preload()
+app = create_app()